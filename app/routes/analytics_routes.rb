@@ -1,13 +1,18 @@
 # frozen_string_literal: true
 
 class RedMetersAPI < Sinatra::Base
+  ROLLUP_SUMMARY_PATH = ENV.fetch('ROLLUP_SUMMARY_PATH', './data/processed/rollups/analytics_summary.json')
+  ROLLUP_MAX_AGE = ENV.fetch('ROLLUP_MAX_AGE_SECONDS', 900).to_i
+
   # GET /api/v1/analytics/overview
   get '/api/v1/analytics/overview' do
+    rollup = rollup_summary
+
     json({
            total_meters: SmartMeter.count,
            active_meters: SmartMeter.active.count,
-           total_readings: MeterReading.count,
-           readings_today: MeterReading.where('reading_time > ?', Date.today).count,
+           total_readings: rollup ? rollup['total_readings'] : MeterReading.count,
+           readings_today: rollup ? rollup['readings_today'] : MeterReading.where('reading_time > ?', Date.today).count,
            anomalies_today: Prediction.anomalies.where('created_at > ?', Date.today).count,
            alerts_active: Alert.active.count,
            alerts_critical: Alert.active.critical.count,
@@ -18,6 +23,9 @@ class RedMetersAPI < Sinatra::Base
 
   # GET /api/v1/analytics/grid-health
   get '/api/v1/analytics/grid-health' do
+    rollup = rollup_summary
+    next json(grid_health_from_rollup(rollup)) if rollup
+
     recent_readings = MeterReading.where('reading_time > ?', 1.hour.ago)
 
     json({
@@ -95,6 +103,36 @@ class RedMetersAPI < Sinatra::Base
 
   private
 
+  # Aggregates materialized by ml/src/rollup_builder.py; nil when missing or stale
+  def rollup_summary
+    return nil unless File.exist?(ROLLUP_SUMMARY_PATH)
+    return nil if Time.now - File.mtime(ROLLUP_SUMMARY_PATH) > ROLLUP_MAX_AGE
+
+    JSON.parse(File.read(ROLLUP_SUMMARY_PATH))
+  rescue JSON::ParserError
+    nil
+  end
+
+  def grid_health_from_rollup(rollup)
+    last_hour = rollup['last_hour']
+
+    {
+      timestamp: Time.current.iso8601,
+      readings_last_hour: last_hour['readings'],
+      avg_voltage: last_hour['avg_voltage'],
+      voltage_range: {
+        min: last_hour['voltage_min'],
+        max: last_hour['voltage_max']
+      },
+      avg_power_factor: last_hour['avg_power_factor'],
+      total_consumption_kwh: last_hour['total_consumption_kwh'],
+      total_demand_kw: last_hour['total_demand_kw'],
+      anomaly_rate: last_hour['anomaly_rate'],
+      source: 'rollup',
+      rollup_as_of: rollup['as_of']
+    }
+  end
+
   def calculate_anomaly_rate(readings)
     return 0 if readings.empty?
 
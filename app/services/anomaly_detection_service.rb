@@ -5,6 +5,9 @@ require 'json'
 
 class AnomalyDetectionService
   MODEL_PATH = ENV.fetch('ML_MODELS_PATH', './ml/models')
+  SCORE_CLI = File.expand_path('../../ml/src/score_cli.py', __dir__)
+  # Thread budget for scoring, so it does not starve a concurrent training job
+  SCORE_THREADS = ENV.fetch('ML_SCORE_THREADS', '2')
 
   def detect_anomalies(meter_ids = nil)
     readings = fetch_recent_readings(meter_ids)
@@ -28,7 +31,7 @@ class AnomalyDetectionService
   def fetch_recent_readings(meter_ids)
     scope = MeterReading.where('reading_time > ?', 1.hour.ago)
     scope = scope.where(meter_id: meter_ids) if meter_ids.present?
-    scope.order(reading_time: :desc).limit(10_000)
+    scope.includes(:meter).order(reading_time: :desc).limit(10_000)
   end
 
   def ml_model_available?
@@ -37,12 +40,12 @@ class AnomalyDetectionService
 
   def detect_with_ml_model(readings)
     data = prepare_data_for_ml(readings)
-    results = call_python_model(data)
+    output = call_python_model(data)
 
-    # Create alerts for detected anomalies
-    create_alerts_for_anomalies(results)
+    # One alert per incident (flagged readings grouped by meter/transformer), not per reading
+    create_alerts_for_incidents(output[:incidents])
 
-    results
+    output[:results]
   end
 
   def detect_with_rules(readings)
@@ -134,41 +137,23 @@ class AnomalyDetectionService
         consumption_kwh: r.consumption_kwh,
         demand_kw: r.demand_kw,
         voltage: r.voltage,
-        power_factor: r.power_factor
+        power_factor: r.power_factor,
+        transformer_id: r.meter&.transformer_id
       }
     end
   end
 
   def call_python_model(data)
-    script = <<~PYTHON
-      import sys
-      import json
-      import pandas as pd
-      sys.path.insert(0, 'ml/src')
-
-      from anomaly_detector import AnomalyDetector
-
-      model = AnomalyDetector.load('#{MODEL_PATH}/anomaly_detector.joblib')
-
-      data = json.loads('''#{data.to_json}''')
-      df = pd.DataFrame(data)
-
-      results = model.predict(df)
-
-      output = []
-      for i, row in df.iterrows():
-          output.append({
-              'meter_id': int(row['meter_id']),
-              'reading_time': row['reading_time'],
-              'anomaly_score': float(results['anomaly_score'][i]),
-              'is_anomaly': bool(results['is_anomaly'][i]),
-              'detection_method': 'ml_model'
-          })
-
-      print(json.dumps(output))
-    PYTHON
-
-    stdout, stderr, status = Open3.capture3('python3', '-c', script)
+    # The batch goes to the scoring CLI on stdin rather than being
+    # interpolated into Python source, so batch size is not limited by quoting
+    stdout, stderr, status = Open3.capture3(
+      { 'REDMETERS_THREADS' => SCORE_THREADS },
+      'python3', SCORE_CLI, 'anomaly',
+      '--input', '-', '--format', 'json',
+      '--model-path', File.join(MODEL_PATH, 'anomaly_detector.joblib'),
+      '--drift', '--incidents',
+      stdin_data: data.to_json
+    )
 
     unless status.success?
       logger.error("Python ML error: #{stderr}")
@@ -178,9 +163,9 @@ class AnomalyDetectionService
     JSON.parse(stdout, symbolize_names: true)
   end
 
-  def create_alerts_for_anomalies(results)
-    results.select { |r| r[:is_anomaly] }.each do |anomaly|
-      create_anomaly_alert_from_result(anomaly)
+  def create_alerts_for_incidents(incidents)
+    incidents.each do |incident|
+      create_incident_alert(incident)
     end
   end
 
@@ -210,15 +195,25 @@ class AnomalyDetectionService
     )
   end
 
-  def create_anomaly_alert_from_result(anomaly)
+  def create_incident_alert(incident)
+    asset = incident[:asset_type] == 'transformer' ? 'transformer' : 'meter'
+    scope = incident[:meter_count] > 1 ? " across #{incident[:meter_count]} meters" : ''
+    window = if incident[:reading_count] > 1
+               "#{incident[:start_time]} to #{incident[:end_time]}"
+             else
+               incident[:start_time]
+             end
+
     Alert.create!(
-      title: 'Anomaly Detected',
-      description: "ML model detected anomaly on meter #{anomaly[:meter_id]}",
-      severity: anomaly[:anomaly_score] > 0.9 ? 'critical' : 'warning',
+      title: incident[:asset_type] == 'transformer' ? 'Transformer Anomaly Incident' : 'Anomaly Detected',
+      description: "ML model flagged #{incident[:reading_count]} reading(s) on #{asset} " \
+                   "#{incident[:asset_id]}#{scope} (#{window}); peak score #{incident[:peak_score].round(2)} " \
+                   "at #{incident[:peak_time]}",
+      severity: incident[:peak_score] > 0.9 ? 'critical' : 'warning',
       source: 'anomaly_detection',
-      confidence: (anomaly[:anomaly_score] * 100).round,
-      asset_type: 'smart_meter',
-      asset_id: anomaly[:meter_id],
+      confidence: (incident[:peak_score] * 100).round,
+      asset_type: incident[:asset_type],
+      asset_id: incident[:asset_id],
       detected_at: Time.current
     )
   end
@@ -6,6 +6,7 @@ require 'open3'
 
 class DataIngestionService
   BATCH_SIZE = 1000
+  PARQUET_LOADER = File.expand_path('../../ml/src/parquet_loader.py', __dir__)
 
   def initialize(batch_size: BATCH_SIZE)
     @batch_size = batch_size
@@ -37,40 +38,21 @@ class DataIngestionService
   def load_from_parquet(file_path)
     raise "File not found: #{file_path}" unless File.exist?(file_path)
 
-    # Use Python subprocess for Parquet reading
-    script = <<~PYTHON
-      import pandas as pd
-      import json
-      df = pd.read_parquet('#{file_path}')
-      df['reading_time'] = df['reading_time'].astype(str)
-      print(df.to_json(orient='records'))
-    PYTHON
+    # Python streams Parquet row groups straight into PostgreSQL with COPY,
+    # skipping readings that already exist for the same meter and time
+    stdout, stderr, status = Open3.capture3('python3', PARQUET_LOADER, file_path, '--json')
+    raise "Parquet load error: #{stderr}" unless status.success?
 
-    stdout, stderr, status = Open3.capture3('python3', '-c', script)
-    raise "Parquet read error: #{stderr}" unless status.success?
+    summary = JSON.parse(stdout)
+    puts "  Inserted #{summary['rows_inserted']} readings (#{summary['rows_per_sec']&.round} rows/sec)"
 
-    readings_data = JSON.parse(stdout)
-    count = 0
-
-    readings_data.each_slice(@batch_size) do |batch|
-      records = batch.map do |r|
-        {
-          meter_id: r['meter_id'],
-          reading_time: Time.parse(r['reading_time']),
-          consumption_kwh: r['consumption_kwh'],
-          demand_kw: r['demand_kw'],
-          voltage: r['voltage'],
-          power_factor: r['power_factor'],
-          quality_flag: r['quality_flag']
-        }
-      end
-
-      MeterReading.insert_all(records)
-      count += records.size
-      puts "  Inserted #{count} readings..."
-    end
-
-    { success: true, records: count, source: file_path }
+    {
+      success: true,
+      records: summary['rows_inserted'],
+      duplicates_skipped: summary['duplicates_skipped'],
+      rows_per_sec: summary['rows_per_sec'],
+      source: file_path
+    }
   end
 
   def load_customers_from_csv(file_path)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Benchmark cases for data loading and model input paths.
+"""
+
+import os
+import sqlite3
+
+from harness import BENCH_DIR, benchmark
+from synthetic_data import READINGS_PER_DAY, generate_readings, generate_transformers, transformer_count
+
+READINGS_TABLE_SQL = """
+    CREATE TABLE meter_readings (
+        id INTEGER PRIMARY KEY, meter_id BIGINT NOT NULL, reading_time TIMESTAMP NOT NULL,
+        consumption_kwh NUMERIC, demand_kw NUMERIC, voltage NUMERIC, power_factor NUMERIC,
+        quality_flag VARCHAR(20)
+    )
+"""
+
+
+# Generated input files are reused across runs (results/ is not committed)
+DATA_DIR = os.path.join(BENCH_DIR, 'results', 'data')
+
+
+def _write_parquet(size):
+    path = os.path.join(DATA_DIR, f'readings_{size}.parquet')
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        generate_readings(size).to_parquet(path, index=False)
+    return path
+
+
+@benchmark('io.parquet_load_sqlite', repeats=3)
+def bench_parquet_load(size):
+    from parquet_loader import ParquetBulkLoader
+    path = _write_parquet(size)
+
+    def run():
+        connection = sqlite3.connect(':memory:')
+        connection.execute(READINGS_TABLE_SQL)
+        connection.execute('CREATE INDEX idx_meter_time ON meter_readings (meter_id, reading_time)')
+        ParquetBulkLoader(connection).load(path, progress=False)
+        connection.close()
+    return run, size
+
+
+# =========================================================================
+# Out-of-core failure predictor training
+# =========================================================================
+
+HISTORY_DAYS = 365
+
+
+def _write_history_parquet(size):
+    """Year-long readings with transformer_id, written meter block by meter block to bound memory."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = os.path.join(DATA_DIR, f'history_{size}.parquet')
+    if os.path.exists(path):
+        return path
+    os.makedirs(DATA_DIR, exist_ok=True)
+    n_transformers = transformer_count(size, HISTORY_DAYS)
+    meters_per_block = max(1, 1_000_000 // (HISTORY_DAYS * READINGS_PER_DAY))
+    block_rows = meters_per_block * HISTORY_DAYS * READINGS_PER_DAY
+
+    writer = None
+    for i, start in enumerate(range(0, size, block_rows)):
+        block = generate_readings(min(block_rows, size - start), days_per_meter=HISTORY_DAYS, seed=i)
+        block['meter_id'] += i * meters_per_block
+        block['transformer_id'] = (block['meter_id'] - 1) % n_transformers + 1
+        table = pa.Table.from_pandas(block, preserve_index=False)
+        writer = writer or pq.ParquetWriter(path + '.tmp', table.schema)
+        writer.write_table(table)
+    writer.close()
+    os.replace(path + '.tmp', path)
+    return path
+
+
+@benchmark('failure.train_external_memory', repeats=3)
+def bench_failure_train_external(size):
+    from failure_predictor import FailurePredictor
+    path = _write_history_parquet(size)
+    transformers = generate_transformers(transformer_count(size, HISTORY_DAYS))
+    return lambda: FailurePredictor().train_external_memory(transformers, path, chunk_rows=250_000), size
+
+
+# =========================================================================
+# Scoring input paths: JSON records vs Arrow IPC
+# =========================================================================
+
+def _scoring_batch(size):
+    return generate_readings(size).drop(columns='quality_flag')
+
+
+@benchmark('io.input_json')
+def bench_input_json(size):
+    import io
+    from model_io import read_json_records
+    batch = _scoring_batch(size)
+    payload = batch.assign(reading_time=batch['reading_time'].dt.strftime('%Y-%m-%dT%H:%M:%S')).to_json(orient='records').encode()
+    return lambda: read_json_records(io.BytesIO(payload)), size
+
+
+@benchmark('io.input_arrow_mmap')
+def bench_input_arrow_mmap(size):
+    from model_io import read_arrow_file, write_arrow_file
+    path = os.path.join(DATA_DIR, f'scoring_batch_{size}.arrow')
+    os.makedirs(DATA_DIR, exist_ok=True)
+    write_arrow_file(_scoring_batch(size), path)
+    return lambda: read_arrow_file(path, memory_map=True), size
+
+
+@benchmark('io.input_arrow_stream')
+def bench_input_arrow_stream(size):
+    import pyarrow as pa
+    from model_io import read_arrow_stream
+    table = pa.Table.from_pandas(_scoring_batch(size), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    payload = sink.getvalue()
+    return lambda: read_arrow_stream(pa.BufferReader(payload)), size
+
+
+# =========================================================================
+# Historical archive vs Parquet (size, write and read speed)
+# =========================================================================
+
+def _archive_readings(size):
+    return generate_readings(size).sort_values(['meter_id', 'reading_time'], ignore_index=True)
+
+
+@benchmark('archive.write', repeats=3)
+def bench_archive_write(size):
+    from reading_archive import write_archive
+    readings = _archive_readings(size)
+    path = os.path.join(DATA_DIR, f'archive_{size}.rma')
+    os.makedirs(DATA_DIR, exist_ok=True)
+    write_archive(readings, path)
+    return lambda: write_archive(readings, path), size, {'bytes': os.path.getsize(path)}
+
+
+@benchmark('archive.parquet_write', repeats=3)
+def bench_archive_parquet_write(size):
+    readings = _archive_readings(size)
+    path = os.path.join(DATA_DIR, f'archive_{size}.parquet')
+    os.makedirs(DATA_DIR, exist_ok=True)
+    readings.to_parquet(path, index=False)
+    return lambda: readings.to_parquet(path, index=False), size, {'bytes': os.path.getsize(path)}
+
+
+def _check_archive_round_trip(readings, path):
+    """Raise unless the archive gives back exactly the readings written, including sub-second, tz-aware times."""
+    import numpy as np
+    import pandas as pd
+    from reading_archive import read_archive, write_archive
+    offsets = np.random.default_rng(0).integers(0, 10 ** 6, len(readings))
+    local = (readings['reading_time'] + pd.to_timedelta(offsets, unit='us')).dt.tz_localize('Australia/Sydney',
+                                                                                             ambiguous='NaT',
+                                                                                             nonexistent='NaT')
+    for frame in (readings, readings.assign(reading_time=local)[local.notna().to_numpy()]):
+        write_archive(frame, path)
+        decoded = read_archive(path)
+        frame = frame.sort_values(['meter_id', 'reading_time'], ignore_index=True)
+        if not decoded['reading_time'].equals(frame['reading_time']):
+            raise AssertionError('archive round trip changed reading_time')
+        for column in frame.columns.drop(['reading_time', 'quality_flag'], errors='ignore'):
+            if not np.array_equal(decoded[column].to_numpy(), frame[column].to_numpy(), equal_nan=True):
+                raise AssertionError(f'archive round trip changed {column}')
+
+
+@benchmark('archive.read', repeats=3)
+def bench_archive_read(size):
+    from reading_archive import read_arrays, write_archive
+    path = os.path.join(DATA_DIR, f'archive_{size}.rma')
+    os.makedirs(DATA_DIR, exist_ok=True)
+    readings = _archive_readings(size)
+    _check_archive_round_trip(readings, path)
+    write_archive(readings, path)
+    return lambda: read_arrays(path), size, {'bytes': os.path.getsize(path)}
+
+
+@benchmark('archive.parquet_read', repeats=3)
+def bench_archive_parquet_read(size):
+    import pyarrow.parquet as pq
+    path = os.path.join(DATA_DIR, f'archive_{size}.parquet')
+    os.makedirs(DATA_DIR, exist_ok=True)
+    _archive_readings(size).to_parquet(path, index=False)
+    return lambda: {name: column.to_numpy() for name, column in pq.read_table(path).to_pandas().items()}, size, \
+        {'bytes': os.path.getsize(path)}
+
+
+# =========================================================================
+# Reading quality (gap detection and imputation)
+# =========================================================================
+
+def _gappy_readings(size):
+    """Readings with ~1% of intervals missing at random, as left by comms outages."""
+    import numpy as np
+    readings = generate_readings(size)
+    return readings[np.random.default_rng(42).random(len(readings)) > 0.01].reset_index(drop=True)
+
+
+@benchmark('quality.gap_statistics', repeats=3)
+def bench_gap_statistics(size):
+    from reading_quality import gap_statistics
+    readings = _gappy_readings(size)
+    return lambda: gap_statistics(readings), len(readings)
+
+
+@benchmark('quality.fill_gaps', repeats=3)
+def bench_fill_gaps(size):
+    from reading_quality import fill_gaps
+    readings = _gappy_readings(size)
+    return lambda: fill_gaps(readings), len(readings)
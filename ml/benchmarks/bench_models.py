@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Benchmark cases for data generation, feature preparation, training and
+scoring of the four platform models.
+"""
+
+from harness import benchmark
+from synthetic_data import generate_customers, generate_readings, generate_transformers, transformer_count
+
+# Models are trained on at most this many readings when a case only times scoring
+SCORING_TRAIN_ROWS = 50_000
+
+
+@benchmark('data.generate_readings', repeats=3)
+def bench_generate_readings(size):
+    return lambda: generate_readings(size), size
+
+
+# =========================================================================
+# Anomaly Detector
+# =========================================================================
+
+@benchmark('anomaly.prepare_features')
+def bench_anomaly_features(size):
+    from anomaly_detector import AnomalyDetector
+    readings = generate_readings(size)
+    detector = AnomalyDetector()
+    return lambda: detector.prepare_features(readings), size
+
+
+@benchmark('anomaly.train', repeats=3)
+def bench_anomaly_train(size):
+    from anomaly_detector import AnomalyDetector
+    readings = generate_readings(size)
+    return lambda: AnomalyDetector().train(readings), size
+
+
+@benchmark('anomaly.score')
+def bench_anomaly_score(size):
+    from anomaly_detector import AnomalyDetector
+    readings = generate_readings(size)
+    detector = AnomalyDetector().train(readings.head(SCORING_TRAIN_ROWS))
+    return lambda: detector.score(readings), size
+
+
+@benchmark('anomaly.refresh', repeats=3)
+def bench_anomaly_refresh(size):
+    """Replace 10% of the trees with trees grown on the latest day (at least 256 readings)."""
+    import pandas as pd
+    from anomaly_detector import AnomalyDetector
+    readings = generate_readings(size).sort_values('reading_time', ignore_index=True)
+    detector = AnomalyDetector().train(readings)
+    reading_time = pd.to_datetime(readings['reading_time'])
+    latest_day = int((reading_time > reading_time.max() - pd.Timedelta(days=1)).sum())
+    recent = readings.tail(max(latest_day, 256))
+    return lambda: detector.refresh(recent), len(recent)
+
+
+@benchmark('anomaly.incidents')
+def bench_anomaly_incidents(size):
+    """Group the ~2% flagged readings of a scored batch into meter/transformer incidents."""
+    import numpy as np
+    from incident_builder import build_incidents
+    readings = generate_readings(size, n_transformers=transformer_count(size))
+    flagged = readings[readings['quality_flag'] == 'anomaly'].assign(
+        anomaly_score=lambda df: np.random.default_rng(42).uniform(0.5, 1.0, len(df)))
+    return lambda: build_incidents(flagged), size
+
+
+# =========================================================================
+# Customer Segmenter
+# =========================================================================
+
+@benchmark('segmenter.prepare_features')
+def bench_segmenter_features(size):
+    from customer_segmenter import CustomerSegmenter
+    readings = generate_readings(size)
+    segmenter = CustomerSegmenter()
+    return lambda: segmenter.prepare_features(readings), size
+
+
+@benchmark('segmenter.train', repeats=3)
+def bench_segmenter_train(size):
+    from customer_segmenter import CustomerSegmenter
+    readings = generate_readings(size)
+    n_meters = readings['meter_id'].nunique()
+    return lambda: CustomerSegmenter(n_clusters=min(12, n_meters)).train(readings), size
+
+
+@benchmark('segmenter.score')
+def bench_segmenter_score(size):
+    from customer_segmenter import CustomerSegmenter
+    readings = generate_readings(size)
+    n_meters = readings['meter_id'].nunique()
+    segmenter = CustomerSegmenter(n_clusters=min(12, n_meters)).train(readings)
+    return lambda: segmenter.score(readings), size
+
+
+@benchmark('segmenter.assign_segments')
+def bench_segmenter_assign(size):
+    from customer_segmenter import CustomerSegmenter
+    readings = generate_readings(size)
+    n_meters = readings['meter_id'].nunique()
+    segmenter = CustomerSegmenter(n_clusters=min(12, n_meters)).train(readings)
+    meter_ids = segmenter.profiles.index.to_numpy()
+    return lambda: segmenter.assign_segments(meter_ids), len(meter_ids)
+
+
+# =========================================================================
+# Failure Predictor
+# =========================================================================
+
+def _failure_inputs(size):
+    n_transformers = transformer_count(size)
+    return generate_transformers(n_transformers), generate_readings(size, n_transformers=n_transformers)
+
+
+@benchmark('failure.prepare_features')
+def bench_failure_features(size):
+    from failure_predictor import FailurePredictor
+    transformers, readings = _failure_inputs(size)
+    predictor = FailurePredictor()
+
+    def run():
+        predictor.clear_feature_cache()
+        predictor.prepare_features(transformers, readings)
+    return run, size
+
+
+@benchmark('failure.train', repeats=3)
+def bench_failure_train(size):
+    from failure_predictor import FailurePredictor
+    transformers, readings = _failure_inputs(size)
+
+    def run():
+        FailurePredictor().train(transformers, readings)
+    return run, size
+
+
+@benchmark('failure.score')
+def bench_failure_score(size):
+    from failure_predictor import FailurePredictor
+    transformers, readings = _failure_inputs(size)
+    predictor = FailurePredictor().train(transformers, readings)
+
+    def run():
+        predictor.clear_feature_cache()
+        predictor.score(transformers, readings)
+    return run, size
+
+
+@benchmark('failure.score_cache_overflow')
+def bench_failure_score_cache_overflow(size):
+    """Score overlapping batches with more unique equipment than the feature cache holds."""
+    import numpy as np
+    from failure_predictor import FailurePredictor
+    transformers, readings = _failure_inputs(size)
+    predictor = FailurePredictor().train(transformers, readings)
+    expected = predictor.score(transformers, readings)['failure_probability']
+    predictor.FEATURE_CACHE_SIZE = max(2, len(transformers) // 3)
+    half = len(transformers) // 2
+
+    def run():
+        predictor.clear_feature_cache()
+        predictor.score(transformers.iloc[:half], readings)
+        # The cache overflows mid-call while earlier rows of this batch are cache hits
+        scored = predictor.score(transformers, readings)['failure_probability']
+        if not np.allclose(scored, expected):
+            raise AssertionError('feature cache eviction changed failure scores')
+    return run, len(transformers) + half
+
+
+@benchmark('failure.tune', repeats=1, warmup=False)
+def bench_failure_tune(size):
+    from hyperparameter_search import tune_failure_predictor
+    transformers, readings = _failure_inputs(size)
+    timings = {}
+
+    def run():
+        tuning = tune_failure_predictor(transformers, readings, n_candidates=8).tuning
+        timings.update({k: tuning[k] for k in ('prepare_seconds', 'search_seconds', 'candidate_seconds', 'fit_seconds')})
+    return run, size, timings
+
+
+# =========================================================================
+# Demand Forecaster
+# =========================================================================
+
+@benchmark('forecaster.prepare_data')
+def bench_forecaster_prepare(size):
+    from demand_forecaster import DemandForecaster
+    readings = generate_readings(size)
+    forecaster = DemandForecaster()
+    return lambda: forecaster.prepare_data(readings), size
+
+
+@benchmark('forecaster.train', repeats=3)
+def bench_forecaster_train(size):
+    from demand_forecaster import DemandForecaster
+    readings = generate_readings(size)
+    return lambda: DemandForecaster().train(readings), size
+
+
+@benchmark('forecaster.forecast')
+def bench_forecaster_forecast(size):
+    from demand_forecaster import DemandForecaster
+    readings = generate_readings(size)
+    forecaster = DemandForecaster().train(readings.head(SCORING_TRAIN_ROWS))
+    return lambda: forecaster.forecast(periods=72), 72
+
+
+# =========================================================================
+# Quantile Sketches
+# =========================================================================
+
+@benchmark('sketch.update')
+def bench_sketch_update(size):
+    from quantile_sketch import QuantileSketchStore
+    readings = generate_readings(size)
+    return lambda: QuantileSketchStore().update(readings), size
+
+
+@benchmark('sketch.quantiles')
+def bench_sketch_quantiles(size):
+    from quantile_sketch import QuantileSketchStore
+    store = QuantileSketchStore().update(generate_readings(size))
+    return lambda: store.quantiles('meter', 'demand_kw'), size
+
+
+# =========================================================================
+# Concurrent workloads (resource governor)
+# =========================================================================
+
+CONCURRENT_SCORE_BATCHES = 20
+CONCURRENT_SCORE_ROWS = 10_000
+
+
+def _train_and_score(size, governed):
+    """Train an anomaly detector while another thread scores batches with a trained one."""
+    import threading
+    from anomaly_detector import AnomalyDetector
+    from customer_segmenter import CustomerSegmenter
+    from resource_governor import governor
+
+    readings = generate_readings(size)
+    batch = readings.head(CONCURRENT_SCORE_ROWS)
+    scorer = AnomalyDetector().train(readings.head(SCORING_TRAIN_ROWS))
+    score_threads = max(1, governor.total_threads // 4)
+
+    def train():
+        if governed:
+            with governor.task('bench.train', threads=governor.total_threads - score_threads):
+                AnomalyDetector().train(readings)
+                CustomerSegmenter(n_clusters=8).train(readings)
+        else:
+            AnomalyDetector().train(readings)
+            CustomerSegmenter(n_clusters=8).train(readings)
+
+    def score():
+        for _ in range(CONCURRENT_SCORE_BATCHES):
+            if governed:
+                with governor.task('bench.score', threads=score_threads):
+                    scorer.score(batch)
+            else:
+                scorer.score(batch)
+
+    def run():
+        workers = [threading.Thread(target=train), threading.Thread(target=score)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    return run, size + CONCURRENT_SCORE_BATCHES * CONCURRENT_SCORE_ROWS
+
+
+@benchmark('concurrency.train_score_ungoverned', repeats=3)
+def bench_train_score_ungoverned(size):
+    return _train_and_score(size, governed=False)
+
+
+@benchmark('concurrency.train_score_governed', repeats=3)
+def bench_train_score_governed(size):
+    return _train_and_score(size, governed=True)
+
+
+# =========================================================================
+# Demand-response scenarios
+# =========================================================================
+
+DR_SCENARIOS = 10_000
+DR_HORIZON = 72
+
+
+@benchmark('demand_response.profiles', repeats=3)
+def bench_demand_response_profiles(size):
+    from demand_response import customer_profiles
+    readings = generate_readings(size)
+    return lambda: customer_profiles(readings), size
+
+
+@benchmark('demand_response.evaluate', repeats=3)
+def bench_demand_response_evaluate(size):
+    """DR_SCENARIOS random scenarios over `size` customers; rows are customer-scenario pairs."""
+    import numpy as np
+    import pandas as pd
+    from demand_response import DemandResponseEngine, event_windows
+
+    rng = np.random.default_rng(42)
+    customers = generate_customers(size)
+    tou = np.where((np.arange(24) >= 17) & (np.arange(24) < 21), 1.5, 0.8)
+    profiles = pd.DataFrame(rng.uniform(0.2, 2.0, (size, 1)) * tou * rng.normal(1, 0.1, (size, 24)),
+                            index=pd.Index(customers['id'], name='meter_id'))
+    forecast = DemandResponseEngine(customers, profiles).fleet_forecast(
+        pd.date_range('2025-03-01', periods=DR_HORIZON, freq='h'))
+    n_groups = customers['segment_id'].nunique()
+    depth = rng.uniform(0, 0.3, (DR_SCENARIOS, n_groups)) * (rng.random((DR_SCENARIOS, n_groups)) < 0.5)
+    hours = event_windows(DR_HORIZON, rng.integers(0, DR_HORIZON - 4, DR_SCENARIOS), rng.integers(1, 5, DR_SCENARIOS))
+
+    def run():
+        DemandResponseEngine(customers, profiles).evaluate(forecast, depth, hours)
+    return run, size * DR_SCENARIOS
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the Red Energy Meters ML models.
+
+Benchmark cases register themselves with @benchmark. A case function takes a
+dataset size (number of meter readings) and returns (run, rows): a zero-arg
+callable to time and the number of rows one call processes. Setup work done
+in the case function itself is not timed. A case may return a third element,
+a dict of extra measurements (e.g. bytes on disk), stored as 'metrics'.
+
+Each (case, size) pair runs in a fresh process so peak RSS is attributable
+to that case alone. One untimed warm-up call precedes the timed repeats so
+lazy imports and first-call allocation do not skew the latency percentiles.
+"""
+
+import contextlib
+import fnmatch
+import importlib
+import io
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Callable, Dict, Any, List, Tuple
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, '..', 'src')
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, SRC_DIR)
+
+# Modules whose import registers benchmark cases
+CASE_MODULES = ['bench_models', 'bench_io']
+
+# name -> (function, repeats, max_size, warmup)
+REGISTRY: Dict[str, Tuple[Callable[[int], Tuple[Callable[[], Any], int]], int, int, bool]] = {}
+
+
+def benchmark(name: str, repeats: int = 5, max_size: int = None, warmup: bool = True):
+    """
+    Register a benchmark case.
+
+    Args:
+        name: Dotted case name, e.g. 'anomaly.score'
+        repeats: Timed runs per size (latency percentiles come from these)
+        max_size: Skip sizes above this (for cases that do not scale)
+        warmup: Make one untimed call before the timed repeats
+    """
+    def decorator(func):
+        REGISTRY[name] = (func, repeats, max_size, warmup)
+        return func
+    return decorator
+
+
+def load_cases() -> Dict[str, Tuple]:
+    for module in CASE_MODULES:
+        importlib.import_module(module)
+    return REGISTRY
+
+
+def select_cases(patterns: List[str] = None) -> List[str]:
+    """Return registered case names matching any of the glob patterns."""
+    names = sorted(load_cases())
+    if not patterns:
+        return names
+    return [n for n in names if any(fnmatch.fnmatch(n, p) for p in patterns)]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if platform.system() == 'Darwin' else peak / 1024
+
+
+def run_case(name: str, size: int) -> Dict[str, Any]:
+    """Set up and time one case at one size. Runs inside a worker process."""
+    func, repeats, _, warmup = load_cases()[name]
+    quiet = io.StringIO()
+
+    with contextlib.redirect_stdout(quiet), contextlib.redirect_stderr(quiet):
+        setup_start = time.perf_counter()
+        run, rows, *extra = func(size)
+        setup_seconds = time.perf_counter() - setup_start
+
+        if warmup:
+            run()
+
+        latencies = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run()
+            latencies.append(time.perf_counter() - start)
+
+    latencies = np.array(latencies)
+    p50 = float(np.percentile(latencies, 50))
+    result = {
+        'case': name,
+        'size': size,
+        'rows': rows,
+        'repeats': repeats,
+        'setup_seconds': round(setup_seconds, 4),
+        'latency_p50': round(p50, 6),
+        'latency_p95': round(float(np.percentile(latencies, 95)), 6),
+        'latency_p99': round(float(np.percentile(latencies, 99)), 6),
+        'throughput_rows_per_sec': round(rows / p50, 1) if p50 > 0 else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1)
+    }
+    if extra:
+        result['metrics'] = extra[0]
+    return result
+
+
+def run_isolated(name: str, size: int) -> Dict[str, Any]:
+    """Run a case in a fresh process; report errors instead of raising."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+        try:
+            return pool.submit(run_case, name, size).result()
+        except Exception as e:
+            return {'case': name, 'size': size, 'error': f'{type(e).__name__}: {e}'}
+
+
+def run_suite(cases: List[str], sizes: List[int], on_result: Callable[[Dict], None] = None) -> Dict[str, Any]:
+    """Run every selected case at every size it supports."""
+    registry = load_cases()
+    results = []
+
+    for name in cases:
+        max_size = registry[name][2]
+        for size in sizes:
+            if max_size is not None and size > max_size:
+                continue
+            result = run_isolated(name, size)
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+    return {
+        'generated_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'sizes': sizes,
+        'results': results
+    }
+
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any],
+                        tolerance: float = 0.2) -> List[Dict[str, Any]]:
+    """
+    Find regressions against a stored baseline.
+    A regression is throughput falling, or peak RSS rising, by more than tolerance.
+    """
+    expected = {(r['case'], r['size']): r for r in baseline.get('results', []) if 'error' not in r}
+    regressions = []
+
+    for result in report['results']:
+        base = expected.get((result['case'], result['size']))
+        if base is None:
+            continue
+        if 'error' in result:
+            regressions.append({'case': result['case'], 'size': result['size'],
+                                'metric': 'error', 'baseline': None, 'current': result['error']})
+            continue
+
+        current_tp, base_tp = result['throughput_rows_per_sec'], base['throughput_rows_per_sec']
+        if base_tp and current_tp is not None and current_tp < base_tp * (1 - tolerance):
+            regressions.append({'case': result['case'], 'size': result['size'],
+                                'metric': 'throughput_rows_per_sec', 'baseline': base_tp, 'current': current_tp})
+
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append({'case': result['case'], 'size': result['size'],
+                                'metric': 'peak_rss_mb', 'baseline': base['peak_rss_mb'],
+                                'current': result['peak_rss_mb']})
+
+    return regressions
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Run the ML benchmark suite and compare against the stored baseline.
+
+Usage:
+    python benchmarks/run_benchmarks.py                          # default sizes, all cases
+    python benchmarks/run_benchmarks.py --cases 'anomaly.*' --sizes 1000 10000000
+    python benchmarks/run_benchmarks.py --save-baseline          # record a new baseline
+
+Exits with status 1 when any case regresses beyond the tolerance.
+
+benchmarks/baseline.json is committed. It was recorded with --save-baseline
+at the default sizes; its header records the machine, platform, CPU count
+and sizes. Throughput depends on the host, so a run on different hardware
+warns before comparing. Record a local baseline there first. On shared or
+single-CPU hosts small cases vary by more than the default tolerance between
+runs; re-run a flagged case, or raise --tolerance, before treating it as a regression.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from harness import BENCH_DIR, select_cases, run_suite, compare_to_baseline
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+RESULTS_PATH = os.path.join(BENCH_DIR, 'results', 'latest.json')
+
+
+def print_result(result):
+    if 'error' in result:
+        print(f"   ❌ {result['case']:<28} {result['size']:>12,}  {result['error']}")
+        return
+    print(f"   {result['case']:<28} {result['size']:>12,}  "
+          f"p50 {result['latency_p50']:>9.4f}s  p95 {result['latency_p95']:>9.4f}s  "
+          f"{result['throughput_rows_per_sec'] or 0:>14,.0f} rows/s  "
+          f"{result['peak_rss_mb']:>8.1f} MB")
+    for metric, value in result.get('metrics', {}).items():
+        print(f"      {metric}: {value:,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the ML benchmark suite')
+    parser.add_argument('--cases', nargs='+', help="Case name globs, e.g. 'anomaly.*' (default: all)")
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES,
+                        help='Dataset sizes in meter readings')
+    parser.add_argument('--output', default=RESULTS_PATH, help='Where to write the JSON results')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Write these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed fractional throughput drop / RSS growth before flagging')
+    parser.add_argument('--list', action='store_true', help='List benchmark cases and exit')
+    args = parser.parse_args()
+
+    cases = select_cases(args.cases)
+    if args.list:
+        print("\n".join(cases))
+        return
+    if not cases:
+        print(f"❌ No benchmark cases match: {' '.join(args.cases)}")
+        sys.exit(1)
+
+    print("=" * 70)
+    print("   RED ENERGY METERS - ML BENCHMARKS")
+    print("=" * 70)
+    print(f"\nCases: {len(cases)}  Sizes: {', '.join(f'{s:,}' for s in args.sizes)}\n")
+
+    report = run_suite(cases, args.sizes, on_result=print_result)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📁 Results saved to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📌 Baseline updated: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("⚠️  No baseline found - run with --save-baseline to record one")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    host = ('machine', 'platform', 'cpu_count')
+    if any(baseline.get(k) != report.get(k) for k in host):
+        print(f"⚠️  Baseline was recorded on {', '.join(str(baseline.get(k)) for k in host)}; "
+              f"this run is on {', '.join(str(report.get(k)) for k in host)}")
+
+    regressions = compare_to_baseline(report, baseline, args.tolerance)
+    if not regressions:
+        print(f"✅ No regressions against baseline (tolerance {args.tolerance:.0%})")
+        return
+
+    print(f"\n❌ {len(regressions)} regression(s) against baseline:")
+    for r in regressions:
+        print(f"   {r['case']} @ {r['size']:,}: {r['metric']} {r['baseline']} -> {r['current']}")
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
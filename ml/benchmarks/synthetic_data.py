@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Vectorized synthetic data generator for benchmarks.
+Produces the same shape of data as src/generate_sample_data.py at any size.
+"""
+
+import numpy as np
+import pandas as pd
+
+READINGS_PER_DAY = 48  # 30-minute intervals
+
+
+def generate_readings(n_readings: int, days_per_meter: int = 28, seed: int = 42,
+                      n_transformers: int = None) -> pd.DataFrame:
+    """
+    Generate n_readings meter readings with time-of-use patterns and ~2% anomalies.
+    Readings are laid out meter by meter, each meter covering days_per_meter days.
+    """
+    rng = np.random.default_rng(seed)
+    per_meter = days_per_meter * READINGS_PER_DAY
+    num_meters = max(1, -(-n_readings // per_meter))
+
+    idx = np.arange(n_readings)
+    meter_id = idx // per_meter + 1
+    slot = idx % per_meter
+    start = pd.Timestamp('2025-01-06')
+    reading_time = start + pd.to_timedelta(slot * 30, unit='min')
+    hour = (slot % READINGS_PER_DAY) // 2
+    day = slot // READINGS_PER_DAY
+
+    # Time-of-use pattern matching generate_sample_data.py
+    peak_factor = np.select(
+        [((hour >= 6) & (hour < 9)) | ((hour >= 17) & (hour < 21)), (hour >= 9) & (hour < 17)],
+        [1.5, 0.8],
+        default=0.5
+    )
+    base = rng.uniform(5, 25, num_meters)[meter_id - 1]
+    seasonal = 1 + 0.2 * np.sin(2 * np.pi * day / 365)
+    consumption = np.maximum(0, (base / READINGS_PER_DAY) * peak_factor * seasonal * rng.normal(1, 0.15, n_readings))
+    voltage = rng.normal(230, 5, n_readings)
+
+    is_anomaly = rng.random(n_readings) < 0.02
+    anomaly_type = rng.integers(0, 3, n_readings)  # 0 voltage, 1 consumption, 2 both
+    voltage_hit = is_anomaly & (anomaly_type != 1)
+    consumption_hit = is_anomaly & (anomaly_type != 0)
+    voltage = np.where(voltage_hit, rng.choice([195.0, 260.0], n_readings), voltage)
+    consumption = np.where(consumption_hit, consumption * rng.choice([3.0, 5.0], n_readings), consumption)
+
+    readings = pd.DataFrame({
+        'meter_id': meter_id,
+        'reading_time': reading_time,
+        'consumption_kwh': consumption.round(4),
+        'demand_kw': (consumption * 2).round(4),
+        'voltage': voltage.round(2),
+        'power_factor': rng.uniform(0.85, 0.99, n_readings).round(4),
+        'quality_flag': np.where(is_anomaly, 'anomaly', 'normal')
+    })
+
+    if n_transformers:
+        readings['transformer_id'] = (meter_id - 1) % n_transformers + 1
+
+    return readings
+
+
+SEGMENT_WEIGHTS = {
+    'early_morning_industrial': 3, 'business_hours_commercial': 8, 'evening_residential_peak': 22,
+    'solar_battery_households': 7, 'ev_charging_households': 9, 'efficiency_optimizers': 5,
+    'high_consumption_all_day': 6, 'seasonal_variation_heavy': 12, 'weekend_shift_users': 8,
+    'night_owl_households': 6, 'retired_home_all_day': 9, 'low_use_minimal': 5
+}
+
+
+def generate_customers(n_customers: int, seed: int = 42) -> pd.DataFrame:
+    """Generate customer records (ids match generate_readings meter ids) like src/generate_sample_data.py."""
+    rng = np.random.default_rng(seed)
+    segments = np.array(list(SEGMENT_WEIGHTS))
+    weights = np.array(list(SEGMENT_WEIGHTS.values())) / 100
+    segment = rng.choice(segments, n_customers, p=weights)
+
+    return pd.DataFrame({
+        'id': np.arange(1, n_customers + 1),
+        'segment_id': segment,
+        'tariff_type': rng.choice(['flat', 'tou', 'demand'], n_customers),
+        'solar_installed': (segment == 'solar_battery_households') | (rng.random(n_customers) < 0.15),
+        'ev_charging': (segment == 'ev_charging_households') | (rng.random(n_customers) < 0.1),
+        'demand_response_opted_in': rng.random(n_customers) < 0.3
+    })
+
+
+def generate_transformers(n_transformers: int, seed: int = 42) -> pd.DataFrame:
+    """Generate transformer records matching src/generate_sample_data.py."""
+    rng = np.random.default_rng(seed)
+    age = rng.uniform(1, 30, n_transformers)
+    failure_risk = np.minimum(0.95, 0.1 + (age / 30) * 0.5 + rng.uniform(0, 0.2, n_transformers))
+
+    return pd.DataFrame({
+        'id': np.arange(1, n_transformers + 1),
+        'transformer_number': [f'TRF{i:04d}' for i in range(1, n_transformers + 1)],
+        'capacity_kva': rng.choice([100, 200, 500, 1000], n_transformers),
+        'age_years': age.round(1),
+        'status': 'operational',
+        'failure_risk': failure_risk.round(3)
+    })
+
+
+def transformer_count(n_readings: int, days_per_meter: int = 28) -> int:
+    """Scale the transformer fleet with the number of meters (about 20 meters each)."""
+    num_meters = max(1, -(-n_readings // (days_per_meter * READINGS_PER_DAY)))
+    return max(50, num_meters // 20)
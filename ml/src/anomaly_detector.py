@@ -6,23 +6,35 @@ Uses Isolation Forest algorithm for unsupervised anomaly detection.
 
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
 import joblib
+import copy
 import os
-from typing import Dict, Any
+from datetime import datetime
+from typing import Dict, Any, List
+
+from scoring import ANOMALY_DECISION_THRESHOLD, normalize_anomaly_scores, check_batch
+from instrumentation import stage
+from resource_governor import current_threads
+from drift_monitor import FeatureDriftMonitor, feature_histogram, rescale_histogram
 
 
 class AnomalyDetector:
     """Isolation Forest based anomaly detector for meter readings."""
     
     def __init__(self):
+        from sklearn.preprocessing import StandardScaler
+        
         self.model = None
         self.scaler = StandardScaler()
         self.feature_columns = [
             'consumption_kwh', 'demand_kw', 'voltage', 
             'power_factor', 'hour', 'day_of_week'
         ]
+        # Training distribution of scaled features, the drift monitor's reference
+        self.reference_histogram: np.ndarray = None
+        self.drift_monitor: FeatureDriftMonitor = None
+        # Data window each tree was grown on, aligned with model.estimators_ (oldest first)
+        self.tree_provenance: List[Dict[str, Any]] = []
     
     def prepare_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Engineer features for anomaly detection."""
@@ -41,11 +53,16 @@ class AnomalyDetector:
     
     def train(self, df: pd.DataFrame, contamination: float = 0.02) -> 'AnomalyDetector':
         """Train Isolation Forest model."""
+        from sklearn.ensemble import IsolationForest
+        
         print("Preparing features...")
-        features = self.prepare_features(df)
+        with stage('anomaly_detector', 'train.prepare_features', len(df)):
+            features = self.prepare_features(df)
         
         print("Scaling features...")
-        scaled_features = self.scaler.fit_transform(features)
+        with stage('anomaly_detector', 'train.scale', len(features)):
+            scaled_features = self.scaler.fit_transform(features)
+            self.reference_histogram = feature_histogram(scaled_features)
         
         print("Training Isolation Forest...")
         self.model = IsolationForest(
@@ -53,37 +70,176 @@ class AnomalyDetector:
             n_estimators=200,
             max_samples='auto',
             random_state=42,
-            n_jobs=-1,
+            n_jobs=current_threads(),
             verbose=1
         )
-        self.model.fit(scaled_features)
+        with stage('anomaly_detector', 'train.fit', len(scaled_features)):
+            self.model.fit(scaled_features)
+        self.tree_provenance = [self._data_window(df)] * len(self.model.estimators_)
         
-        # Calculate scores for training data
-        scores = self.model.decision_function(scaled_features)
-        predictions = self.model.predict(scaled_features)
+        # Calculate scores for training data (single inference pass)
+        with stage('anomaly_detector', 'train.inference', len(scaled_features)):
+            scores = self.model.decision_function(scaled_features)
         
-        n_anomalies = (predictions == -1).sum()
+        n_anomalies = (scores < ANOMALY_DECISION_THRESHOLD).sum()
         print(f"\n✅ Training complete!")
         print(f"   Found {n_anomalies} anomalies ({n_anomalies/len(df)*100:.2f}%)")
         
         return self
     
-    def predict(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Predict anomalies for new data."""
-        features = self.prepare_features(df)
-        scaled_features = self.scaler.transform(features)
+    def refresh(self, df: pd.DataFrame, fraction: float = 0.1, contamination: float = 0.02,
+                calibration_rows: int = 100_000, random_state: int = None) -> 'AnomalyDetector':
+        """
+        Replace the oldest fraction of trees with trees grown on recent readings.
+        
+        The scaler is updated online (partial_fit) and the split thresholds of
+        the kept trees are moved into the new scaled space, so they partition
+        the raw readings exactly as before. offset_ is recalibrated on (a sample
+        of) the new window so `contamination` holds on current data.
+        
+        The scaler fingerprint changes, so drift state recorded under the old
+        scaling no longer resumes. The reference histogram and any attached
+        drift monitor are moved into the new space here (the monitor in place,
+        so references from monitor_drift() stay valid); persisted state is
+        carried over with drift_monitor.carry_over_state() (the CLI does this).
+        
+        Args:
+            df: Recent readings, e.g. the latest day
+            fraction: Share of trees to replace
+            contamination: Expected anomaly rate used to recalibrate offset_
+            calibration_rows: Rows of df sampled to recalibrate offset_
+            random_state: Seed for the new trees
+        """
+        from sklearn.ensemble import IsolationForest
+        
+        if self.model is None:
+            raise ValueError("Model must be trained before it can be refreshed")
+        n_trees = len(self.model.estimators_)
+        n_new = min(n_trees, max(1, int(round(fraction * n_trees))))
         
-        # Get anomaly scores and predictions
-        scores = self.model.decision_function(scaled_features)
-        predictions = self.model.predict(scaled_features)
+        with stage('anomaly_detector', 'refresh.prepare_features', len(df)):
+            features = self.prepare_features(df)
+        if len(features) < self.model.max_samples_:
+            raise ValueError(f"Refresh needs at least {self.model.max_samples_} readings, got {len(features)}")
         
-        # Convert scores to 0-1 range (higher = more anomalous)
-        anomaly_scores = 1 - (scores - scores.min()) / (scores.max() - scores.min() + 1e-10)
-        is_anomaly = predictions == -1
+        with stage('anomaly_detector', 'refresh.scale', len(features)):
+            old_scaler = copy.deepcopy(self.scaler)
+            old_mean, old_scale = old_scaler.mean_, old_scaler.scale_
+            self.scaler.partial_fit(features)
+            kept = slice(n_new, None)
+            self._rescale_trees(self.model.estimators_[kept], self.model.estimators_features_[kept],
+                                (old_mean, old_scale), (self.scaler.mean_, self.scaler.scale_))
+            scaled_features = self.scaler.transform(features)
+            # Like the scaler, the reference now describes training plus every refresh window
+            if self.reference_histogram is not None:
+                self.reference_histogram = rescale_histogram(
+                    self.reference_histogram, (old_mean, old_scale), (self.scaler.mean_, self.scaler.scale_)
+                ) + feature_histogram(scaled_features)
+            if self.drift_monitor is not None:
+                self.drift_monitor.rescale(self.scaler, self.reference_histogram)
         
+        print(f"Growing {n_new} of {n_trees} trees on {len(features):,} recent readings...")
+        update = IsolationForest(
+            n_estimators=n_new,
+            max_samples=self.model.max_samples_,
+            max_features=self.model.max_features,
+            contamination='auto',
+            random_state=random_state,
+            n_jobs=current_threads()
+        )
+        with stage('anomaly_detector', 'refresh.fit', len(scaled_features)):
+            update.fit(scaled_features)
+        
+        # Oldest trees come first; drop them and append the new ones
+        model = self.model
+        model.estimators_ = model.estimators_[kept] + update.estimators_
+        model.estimators_features_ = model.estimators_features_[kept] + update.estimators_features_
+        model._seeds = np.concatenate([model._seeds[kept], update._seeds])
+        model._average_path_length_per_tree = model._average_path_length_per_tree[kept] + update._average_path_length_per_tree
+        model._decision_path_lengths = model._decision_path_lengths[kept] + update._decision_path_lengths
+        self.tree_provenance = self.tree_provenance[kept] + [self._data_window(df)] * n_new
+        
+        model.n_jobs = current_threads()
+        model.contamination = contamination
+        sample = scaled_features
+        if len(sample) > calibration_rows:
+            sample = sample[np.random.default_rng(random_state).choice(len(sample), calibration_rows, replace=False)]
+        with stage('anomaly_detector', 'refresh.calibrate', len(sample)):
+            model.offset_ = np.percentile(model.score_samples(sample), 100.0 * contamination)
+        
+        print(f"✅ Refreshed {n_new} trees ({len(self.tree_windows())} data windows in the forest)")
+        return self
+    
+    @staticmethod
+    def _rescale_trees(trees: list, tree_features: list, old: tuple, new: tuple) -> None:
+        """Move split thresholds from the old (mean, scale) space into the new one, in place."""
+        (old_mean, old_scale), (new_mean, new_scale) = old, new
+        for tree, features in zip(trees, tree_features):
+            split = tree.tree_.feature >= 0
+            column = np.asarray(features)[tree.tree_.feature[split]]
+            threshold = tree.tree_.threshold
+            raw = threshold[split] * old_scale[column] + old_mean[column]
+            threshold[split] = (raw - new_mean[column]) / new_scale[column]
+    
+    def tree_windows(self) -> List[Dict[str, Any]]:
+        """Data windows in the forest with the number of trees grown on each, oldest first."""
+        windows = []
+        for window in self.tree_provenance:
+            if windows and windows[-1]['window'] == window:
+                windows[-1]['trees'] += 1
+            else:
+                windows.append({'window': window, 'trees': 1})
+        return [{**w['window'], 'trees': w['trees']} for w in windows]
+    
+    @staticmethod
+    def _data_window(df: pd.DataFrame) -> Dict[str, Any]:
+        reading_time = pd.to_datetime(df['reading_time'])
         return {
-            'anomaly_score': anomaly_scores,
-            'is_anomaly': is_anomaly
+            'window_start': reading_time.min().isoformat(),
+            'window_end': reading_time.max().isoformat(),
+            'rows': len(df),
+            'fitted_at': datetime.now().isoformat(timespec='seconds')
+        }
+    
+    def score(self, df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """
+        Score a batch of readings with a single inference pass.
+        
+        Returns row-aligned arrays (see scoring.py for the batch contract):
+            decision_score: raw IsolationForest decision_function values
+            anomaly_score: decision scores rescaled to 0-1 (higher = more anomalous)
+            is_anomaly: decision_score below the model's threshold
+        """
+        with stage('anomaly_detector', 'score.prepare_features', len(df)):
+            features = self.prepare_features(df)
+        with stage('anomaly_detector', 'score.scale', len(features)):
+            scaled_features = self.scaler.transform(features)
+        if self.drift_monitor is not None:
+            self.drift_monitor.observe(scaled_features)
+        
+        # decision_function is the only model call; labels are derived from it
+        self.model.n_jobs = current_threads()
+        with stage('anomaly_detector', 'score.inference', len(scaled_features)):
+            scores = self.model.decision_function(scaled_features)
+        
+        return check_batch({
+            'decision_score': scores,
+            'anomaly_score': normalize_anomaly_scores(scores),
+            'is_anomaly': scores < ANOMALY_DECISION_THRESHOLD
+        }, len(df))
+    
+    def monitor_drift(self, **options) -> FeatureDriftMonitor:
+        """Attach a drift monitor that observes the scaled features of every score() call."""
+        self.drift_monitor = FeatureDriftMonitor('anomaly_detector', self.scaler, self.reference_histogram, **options)
+        return self.drift_monitor
+    
+    def predict(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Predict anomalies for new data."""
+        results = self.score(df)
+        
+        return {
+            'anomaly_score': results['anomaly_score'],
+            'is_anomaly': results['is_anomaly']
         }
     
     def save(self, path: str = 'models/anomaly_detector.joblib') -> None:
@@ -92,7 +248,9 @@ class AnomalyDetector:
         joblib.dump({
             'model': self.model,
             'scaler': self.scaler,
-            'feature_columns': self.feature_columns
+            'feature_columns': self.feature_columns,
+            'reference_histogram': self.reference_histogram,
+            'tree_provenance': self.tree_provenance
         }, path)
         print(f"✅ Model saved to {path}")
     
@@ -104,17 +262,28 @@ class AnomalyDetector:
         detector.model = data['model']
         detector.scaler = data['scaler']
         detector.feature_columns = data['feature_columns']
+        detector.reference_histogram = data.get('reference_histogram')
+        # Artifacts saved before refreshes existed carry no window information
+        detector.tree_provenance = data.get('tree_provenance') or [{}] * len(detector.model.estimators_)
         return detector
 
 
 if __name__ == '__main__':
-    # Training script
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Train or refresh the anomaly detector')
+    parser.add_argument('--refresh-days', type=float,
+                        help='Refresh the saved model with trees grown on the latest N days instead of retraining')
+    parser.add_argument('--fraction', type=float, default=0.1, help='Share of trees replaced by a refresh')
+    args = parser.parse_args()
+    
     print("=" * 60)
-    print("ANOMALY DETECTOR TRAINING")
+    print("ANOMALY DETECTOR " + ("REFRESH" if args.refresh_days else "TRAINING"))
     print("=" * 60)
     
     # Load sample data
     data_path = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'sample', 'meter_readings.parquet')
+    model_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'anomaly_detector.joblib')
     
     if not os.path.exists(data_path):
         print(f"❌ Data file not found: {data_path}")
@@ -125,12 +294,24 @@ if __name__ == '__main__':
     df = pd.read_parquet(data_path)
     print(f"   Loaded {len(df):,} readings")
     
-    # Train model
-    detector = AnomalyDetector()
-    detector.train(df)
+    if args.refresh_days:
+        from drift_monitor import carry_over_state
+        
+        detector = AnomalyDetector.load(model_path)
+        scaler_before = copy.deepcopy(detector.scaler)
+        reading_time = pd.to_datetime(df['reading_time'])
+        recent = df[reading_time > reading_time.max() - pd.Timedelta(days=args.refresh_days)]
+        detector.refresh(recent, fraction=args.fraction)
+        if carry_over_state('anomaly_detector', scaler_before, detector.scaler, detector.reference_histogram):
+            print("   Drift monitor state carried over to the refreshed scaling")
+        for window in detector.tree_windows():
+            print(f"   {window.get('window_start')} .. {window.get('window_end')}: {window['trees']} trees")
+    else:
+        # Train model
+        detector = AnomalyDetector()
+        detector.train(df)
     
     # Save model
-    model_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'anomaly_detector.joblib')
     detector.save(model_path)
     
     # Test prediction
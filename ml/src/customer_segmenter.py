@@ -6,12 +6,15 @@ Uses K-means clustering to identify customer usage patterns.
 
 import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
 import joblib
 import os
 from typing import Dict, Any, List
 
+from scoring import check_batch
+from instrumentation import stage
+from drift_monitor import FeatureDriftMonitor, feature_histogram
+from reading_quality import GAP_FEATURES, fill_gaps, gap_statistics, slot_index
+
 
 class CustomerSegmenter:
     """K-means based customer segmentation model."""
@@ -31,14 +34,35 @@ class CustomerSegmenter:
         11: 'low_use_minimal'
     }
     
-    def __init__(self, n_clusters: int = 12):
+    def __init__(self, n_clusters: int = 12, n_init: int = 20):
+        from sklearn.preprocessing import StandardScaler
+        
         self.n_clusters = n_clusters
+        self.n_init = n_init
+        # Winning configuration and timings of the search that chose n_clusters/n_init, if any
+        self.tuning: Dict[str, Any] = None
         self.model = None
         self.scaler = StandardScaler()
+        
+        # Unscaled feature profile per meter, set by train() and replaced per meter by update_profiles()
+        self.profiles: pd.DataFrame = None
+        # Mean training distance of each cluster's members to its centroid
+        self.centroid_radius: np.ndarray = None
+        self._centroid_index = None
+        # Training distribution of scaled features, the drift monitor's reference
+        self.reference_histogram: np.ndarray = None
+        self.drift_monitor: FeatureDriftMonitor = None
     
     def prepare_features(self, readings_df: pd.DataFrame) -> pd.DataFrame:
-        """Create customer usage profile from meter readings."""
-        readings_df = readings_df.copy()
+        """
+        Create customer usage profile from meter readings.
+        
+        Missing intervals are imputed from each meter's hourly profile before
+        aggregating, and the meter's gap statistics are added as features.
+        """
+        index = slot_index(readings_df)
+        gaps = gap_statistics(readings_df, index=index)
+        readings_df = fill_gaps(readings_df, index=index)
         
         # Extract time features
         readings_df['reading_time'] = pd.to_datetime(readings_df['reading_time'])
@@ -73,31 +97,47 @@ class CustomerSegmenter:
         )
         
         # Combine features
-        features = hourly_pct.join(agg).join(weekend_ratio.rename('weekend_ratio'))
+        features = hourly_pct.join(agg).join(weekend_ratio.rename('weekend_ratio')).join(gaps[GAP_FEATURES])
         
         return features.fillna(0)
     
     def train(self, readings_df: pd.DataFrame) -> 'CustomerSegmenter':
         """Train K-means clustering model."""
         print("Preparing customer features...")
-        features = self.prepare_features(readings_df)
+        with stage('customer_segmenter', 'train.prepare_features', len(readings_df)):
+            features = self.prepare_features(readings_df)
         print(f"   Created features for {len(features)} meters")
         
         print("Scaling features...")
-        scaled = self.scaler.fit_transform(features)
+        with stage('customer_segmenter', 'train.scale', len(features)):
+            scaled = self.scaler.fit_transform(features)
+            self.reference_histogram = feature_histogram(scaled)
+        
+        return self.fit_features(features, scaled)
+    
+    def fit_features(self, features: pd.DataFrame, scaled: np.ndarray) -> 'CustomerSegmenter':
+        """Cluster already prepared features (scaled with self.scaler) into n_clusters segments."""
+        from sklearn.cluster import KMeans
         
         print(f"Training K-means with {self.n_clusters} clusters...")
         self.model = KMeans(
             n_clusters=self.n_clusters,
             random_state=42,
-            n_init=20,
+            n_init=self.n_init,
             max_iter=500,
             verbose=1
         )
-        self.model.fit(scaled)
+        with stage('customer_segmenter', 'train.fit', len(scaled)):
+            self.model.fit(scaled)
         
         # Display cluster distribution
         labels = self.model.labels_
+        self._centroid_index = None
+        self.profiles = features
+        distances = np.linalg.norm(scaled - self.model.cluster_centers_[labels], axis=1)
+        counts = np.bincount(labels, minlength=self.n_clusters)
+        self.centroid_radius = np.bincount(labels, weights=distances, minlength=self.n_clusters) / np.maximum(counts, 1)
+        
         print(f"\n✅ Training complete!")
         print("\nCluster distribution:")
         for i in range(self.n_clusters):
@@ -107,17 +147,132 @@ class CustomerSegmenter:
         
         return self
     
+    def segment_names(self, labels: np.ndarray) -> np.ndarray:
+        """Map cluster labels to segment names with a single array lookup."""
+        names = np.array([self.SEGMENT_NAMES.get(i, f'cluster_{i}') for i in range(self.n_clusters)])
+        return names[labels]
+    
+    def score(self, readings_df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """
+        Score all meters in a batch of readings with a single inference pass.
+        Scoring leaves the cached profiles untouched; use update_profiles() to refresh them.
+        
+        Returns arrays aligned with the meters found in the readings
+        (see scoring.py for the batch contract):
+            meter_id: meter identifiers
+            cluster: assigned cluster label
+            segment_id: segment name for each cluster label
+        """
+        with stage('customer_segmenter', 'score.prepare_features', len(readings_df)):
+            features = self._align(self.prepare_features(readings_df))
+        with stage('customer_segmenter', 'score.scale', len(features)):
+            scaled = self.scaler.transform(features)
+        if self.drift_monitor is not None:
+            self.drift_monitor.observe(scaled)
+        
+        with stage('customer_segmenter', 'score.inference', len(scaled)):
+            labels = self.model.predict(scaled)
+        
+        return check_batch({
+            'meter_id': features.index.to_numpy(),
+            'cluster': labels,
+            'segment_id': self.segment_names(labels)
+        }, len(features))
+    
+    def monitor_drift(self, **options) -> FeatureDriftMonitor:
+        """Attach a drift monitor that observes the scaled features of every score() call."""
+        self.drift_monitor = FeatureDriftMonitor('customer_segmenter', self.scaler, self.reference_histogram, **options)
+        return self.drift_monitor
+    
+    @property
+    def feature_columns(self) -> List[str]:
+        return list(self.scaler.feature_names_in_)
+    
+    def _align(self, features: pd.DataFrame) -> pd.DataFrame:
+        """Match the training feature layout (hours with no readings become 0)."""
+        return features.reindex(columns=self.feature_columns, fill_value=0)
+    
+    def _cache_profiles(self, features: pd.DataFrame) -> None:
+        if self.profiles is None:
+            self.profiles = features
+        else:
+            self.profiles = pd.concat([self.profiles.drop(features.index, errors='ignore'), features])
+    
+    def _centroids(self):
+        """Centroid matrix and squared norms, precomputed once per trained model."""
+        if self._centroid_index is None:
+            centroids = np.ascontiguousarray(self.model.cluster_centers_, dtype=np.float64)
+            self._centroid_index = (centroids, np.einsum('ij,ij->i', centroids, centroids))
+        return self._centroid_index
+    
+    def update_profiles(self, readings_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Recompute and cache profiles for the meters present in readings_df only.
+        
+        Each meter's profile is rebuilt from just the readings passed in and
+        replaces its cached one; it is not merged with the meter's history,
+        so pass the full window the profile should describe.
+        """
+        with stage('customer_segmenter', 'assign.update_profiles', len(readings_df)):
+            features = self._align(self.prepare_features(readings_df))
+        self._cache_profiles(features)
+        return features
+    
+    def assign_segments(self, meter_ids, readings_df: pd.DataFrame = None) -> Dict[str, np.ndarray]:
+        """
+        Assign segments for a subset of meters from their cached profiles.
+        
+        Uses one vectorized nearest-centroid computation instead of rebuilding
+        features for the whole fleet.
+        
+        Args:
+            meter_ids: Meters to assign
+            readings_df: Optional new readings for changed meters; their
+                profiles are rebuilt from these readings alone before assignment
+        
+        Returns arrays aligned with meter_ids:
+            meter_id, cluster, segment_id,
+            distance: Euclidean distance to the assigned centroid (scaled space)
+            distance_ratio: distance relative to the cluster's mean training
+                distance; values well above 1 indicate drift
+        """
+        if readings_df is not None:
+            self.update_profiles(readings_df)
+        if self.profiles is None:
+            raise ValueError("No cached profiles - train or update_profiles first")
+        
+        meter_ids = np.asarray(meter_ids)
+        missing = pd.Index(meter_ids).difference(self.profiles.index)
+        if len(missing):
+            raise KeyError(f"No cached profile for meters: {missing.tolist()[:10]}")
+        
+        with stage('customer_segmenter', 'assign.inference', len(meter_ids)):
+            profiles = self.profiles.loc[meter_ids].to_numpy(dtype=np.float64)
+            scaled = (profiles - self.scaler.mean_) / self.scaler.scale_
+            centroids, centroid_sq = self._centroids()
+            
+            # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2 for all meters and centroids at once
+            sq_dist = np.einsum('ij,ij->i', scaled, scaled)[:, None] - 2 * scaled @ centroids.T + centroid_sq
+            labels = sq_dist.argmin(axis=1)
+            distance = np.sqrt(np.maximum(sq_dist[np.arange(len(labels)), labels], 0))
+        
+        radius = self.centroid_radius if self.centroid_radius is not None else np.ones(self.n_clusters)
+        return check_batch({
+            'meter_id': meter_ids,
+            'cluster': labels,
+            'segment_id': self.segment_names(labels),
+            'distance': distance,
+            'distance_ratio': distance / np.maximum(radius[labels], 1e-10)
+        }, len(meter_ids))
+    
     def predict(self, readings_df: pd.DataFrame) -> Dict[str, Any]:
         """Assign customers to segments."""
-        features = self.prepare_features(readings_df)
-        scaled = self.scaler.transform(features)
-        
-        labels = self.model.predict(scaled)
+        results = self.score(readings_df)
         
         return {
-            'meter_id': features.index.tolist(),
-            'segment_id': [self.SEGMENT_NAMES.get(l, f'cluster_{l}') for l in labels],
-            'cluster': labels.tolist()
+            'meter_id': results['meter_id'].tolist(),
+            'segment_id': results['segment_id'].tolist(),
+            'cluster': results['cluster'].tolist()
         }
     
     def save(self, path: str = 'models/customer_segmenter.joblib') -> None:
@@ -126,7 +281,12 @@ class CustomerSegmenter:
         joblib.dump({
             'model': self.model,
             'scaler': self.scaler,
-            'n_clusters': self.n_clusters
+            'n_clusters': self.n_clusters,
+            'n_init': self.n_init,
+            'tuning': self.tuning,
+            'profiles': self.profiles,
+            'centroid_radius': self.centroid_radius,
+            'reference_histogram': self.reference_histogram
         }, path)
         print(f"✅ Model saved to {path}")
     
@@ -134,9 +294,13 @@ class CustomerSegmenter:
     def load(cls, path: str = 'models/customer_segmenter.joblib') -> 'CustomerSegmenter':
         """Load model from disk."""
         data = joblib.load(path)
-        segmenter = cls(n_clusters=data['n_clusters'])
+        segmenter = cls(n_clusters=data['n_clusters'], n_init=data.get('n_init', 20))
         segmenter.model = data['model']
         segmenter.scaler = data['scaler']
+        segmenter.profiles = data.get('profiles')
+        segmenter.centroid_radius = data.get('centroid_radius')
+        segmenter.reference_histogram = data.get('reference_histogram')
+        segmenter.tuning = data.get('tuning')
         return segmenter
 
 
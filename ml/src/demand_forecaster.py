@@ -6,12 +6,15 @@ Uses Facebook Prophet for time series forecasting.
 
 import pandas as pd
 import numpy as np
-from prophet import Prophet
 import joblib
 import os
 from typing import Dict, Any, List
 from datetime import datetime, timedelta
 import warnings
+
+from instrumentation import stage
+from reading_quality import fill_gaps
+
 warnings.filterwarnings('ignore')
 
 
@@ -21,13 +24,36 @@ class DemandForecaster:
     def __init__(self):
         self.model = None
         self.aggregation_interval = 'H'  # Hourly aggregation
+        # Historical p90 of fleet hourly peak demand (kW) from QuantileSketchStore;
+        # predict_peak_hours falls back to the forecast's own top 10% without it
+        self.peak_threshold: float = None
     
-    def prepare_data(self, readings_df: pd.DataFrame) -> pd.DataFrame:
+    def prepare_data(self, readings_df: pd.DataFrame, fill_missing: bool = True) -> pd.DataFrame:
         """
         Prepare data for Prophet.
         Prophet requires columns named 'ds' (datetime) and 'y' (value).
+        
+        Accepts raw readings, a fleet hourly rollup from
+        RollupBuilder.read('fleet', 'hourly'), which skips the resample, or
+        a ds/y frame already returned by this method, which passes through.
+        Raw readings have missing intervals imputed from per-meter hourly
+        profiles first (fill_missing), so meter outages do not look like
+        drops in fleet demand.
         """
-        readings = readings_df.copy()
+        if 'ds' in readings_df.columns and 'y' in readings_df.columns:
+            return readings_df[['ds', 'y']].copy()
+        
+        if 'bucket_start' in readings_df.columns and 'demand_kw_max' in readings_df.columns:
+            prophet_data = pd.DataFrame({
+                'ds': pd.to_datetime(readings_df['bucket_start']),
+                'y': readings_df['demand_kw_max']
+            })
+            return prophet_data.sort_values('ds').dropna().reset_index(drop=True)
+        
+        if fill_missing and 'meter_id' in readings_df.columns:
+            readings = fill_gaps(readings_df, columns=['consumption_kwh', 'demand_kw'])
+        else:
+            readings = readings_df.copy()
         
         # Ensure datetime format
         readings['reading_time'] = pd.to_datetime(readings['reading_time'])
@@ -48,8 +74,11 @@ class DemandForecaster:
     
     def train(self, readings_df: pd.DataFrame) -> 'DemandForecaster':
         """Train Prophet model for demand forecasting."""
+        from prophet import Prophet
+        
         print("Preparing time series data...")
-        data = self.prepare_data(readings_df)
+        with stage('demand_forecaster', 'train.prepare_data', len(readings_df)):
+            data = self.prepare_data(readings_df)
         print(f"   Prepared {len(data)} hourly data points")
         print(f"   Date range: {data['ds'].min()} to {data['ds'].max()}")
         
@@ -73,7 +102,8 @@ class DemandForecaster:
         )
         
         # Fit the model
-        self.model.fit(data)
+        with stage('demand_forecaster', 'train.fit', len(data)):
+            self.model.fit(data)
         
         print(f"\n✅ Training complete!")
         print(f"   Model changepoints: {len(self.model.changepoints)}")
@@ -94,7 +124,8 @@ class DemandForecaster:
         future = self.model.make_future_dataframe(periods=periods, freq='H')
         
         # Generate forecast
-        forecast = self.model.predict(future)
+        with stage('demand_forecaster', 'forecast.inference', len(future)):
+            forecast = self.model.predict(future)
         
         # Get only future predictions
         future_forecast = forecast.tail(periods)
@@ -109,8 +140,16 @@ class DemandForecaster:
             'generated_at': datetime.now().isoformat()
         }
     
-    def predict_peak_hours(self, periods: int = 24) -> List[Dict[str, Any]]:
-        """Predict peak demand hours for the next N periods."""
+    def predict_peak_hours(self, periods: int = 24, threshold: float = None) -> List[Dict[str, Any]]:
+        """
+        Predict peak demand hours for the next N periods.
+        
+        Args:
+            periods: Number of hours to forecast
+            threshold: Peak demand threshold in kW. Defaults to peak_threshold
+                (historical p90 of fleet hourly peaks), or to the top 10% of
+                the forecast when the model has none.
+        """
         forecast = self.forecast(periods)
         
         # Create dataframe for analysis
@@ -119,8 +158,11 @@ class DemandForecaster:
             'demand': forecast['predicted_demand_kw']
         })
         
-        # Find peak hours (top 10%)
-        threshold = df['demand'].quantile(0.9)
+        # Find peak hours (top 10% unless a historical threshold is known)
+        if threshold is None:
+            threshold = self.peak_threshold
+        if threshold is None:
+            threshold = df['demand'].quantile(0.9)
         peaks = df[df['demand'] >= threshold].copy()
         
         return peaks.to_dict('records')
@@ -151,7 +193,8 @@ class DemandForecaster:
         # Prophet models need special handling
         joblib.dump({
             'model': self.model,
-            'aggregation_interval': self.aggregation_interval
+            'aggregation_interval': self.aggregation_interval,
+            'peak_threshold': self.peak_threshold
         }, path)
         print(f"✅ Model saved to {path}")
     
@@ -162,6 +205,7 @@ class DemandForecaster:
         forecaster = cls()
         forecaster.model = data['model']
         forecaster.aggregation_interval = data['aggregation_interval']
+        forecaster.peak_threshold = data.get('peak_threshold')
         return forecaster
 
 
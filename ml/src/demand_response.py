@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Vectorized demand-response scenario engine.
+
+A scenario curtails the opted-in customers of some segments by a fraction
+of their load during some forecast hours. Customers are reduced once to a
+(segments x 24) matrix of load shares: the part of fleet load at each hour
+of day that comes from each segment's opted-in customers. A batch of
+scenarios is then two arrays,
+
+    depth   (scenarios x segments)   curtailment fraction per segment
+    hours   (scenarios x horizon)    forecast hours the event is active
+
+and the reduced load for every scenario and hour is one matrix product:
+
+    reduction = (depth @ share[:, hour_of_day]) * forecast * hours
+
+The forecast must be fleet-total demand in kW (the sum over all meters),
+the quantity the shares are fractions of. DemandForecaster predicts the
+hourly maximum of single readings, which curtailing a segment's aggregate
+load does not scale, so it is not a valid baseline; fleet_forecast() builds
+one from the fleet's hour-of-day load profile instead.
+
+Usage:
+    python src/demand_response.py data/sample/customers.csv data/sample/meter_readings.parquet --top 10
+"""
+
+import argparse
+import os
+from typing import Dict, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from scoring import check_batch
+from instrumentation import stage
+
+HOURS_PER_DAY = 24
+OPT_IN_COLUMN = 'demand_response_opted_in'
+
+
+def customer_profiles(readings: pd.DataFrame, column: str = 'demand_kw') -> pd.DataFrame:
+    """
+    Mean load per meter and hour of day, shape (meters, 24).
+    Hours a meter never reported are filled with that meter's overall mean.
+    """
+    valid = readings[column].notna().to_numpy()
+    meter_codes, meters = pd.factorize(readings['meter_id'].to_numpy()[valid])
+    hour = pd.to_datetime(readings['reading_time']).dt.hour.to_numpy()[valid]
+    values = readings[column].to_numpy(dtype=float)[valid]
+
+    bins = meter_codes * HOURS_PER_DAY + hour
+    size = len(meters) * HOURS_PER_DAY
+    sums = np.bincount(bins, weights=values, minlength=size).reshape(-1, HOURS_PER_DAY)
+    counts = np.bincount(bins, minlength=size).reshape(-1, HOURS_PER_DAY)
+    overall = sums.sum(axis=1) / np.maximum(counts.sum(axis=1), 1)
+    profiles = np.where(counts > 0, sums / np.maximum(counts, 1), overall[:, None])
+    return pd.DataFrame(profiles, index=pd.Index(meters, name='meter_id'), columns=range(HOURS_PER_DAY))
+
+
+def forecast_arrays(forecast: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """Load and hour of day per forecast hour, from a timestamp-indexed Series of fleet-total kW."""
+    if not isinstance(forecast, pd.Series):
+        raise TypeError("forecast must be a timestamp-indexed Series of fleet-total kW "
+                        "(DemandForecaster.forecast() predicts single-reading peaks, not fleet load)")
+    return forecast.to_numpy(dtype=float), pd.DatetimeIndex(pd.to_datetime(forecast.index)).hour.to_numpy()
+
+
+def event_windows(horizon: int, start: Sequence[int], duration: Sequence[int]) -> np.ndarray:
+    """Boolean (scenarios x horizon) mask of contiguous events starting at `start` forecast hours."""
+    start = np.asarray(start)[:, None]
+    hours = np.arange(horizon)
+    return (hours >= start) & (hours < start + np.asarray(duration)[:, None])
+
+
+class DemandResponseEngine:
+    """Evaluates batches of curtailment scenarios against a demand forecast."""
+
+    def __init__(self, customers: pd.DataFrame, profiles: pd.DataFrame, group_by: str = 'segment_id'):
+        """
+        Args:
+            customers: customers.csv rows (id or meter_id, group_by, demand_response_opted_in)
+            profiles: customer_profiles() for the fleet; meters without a customer
+                record still count towards fleet load
+            group_by: Customer column scenarios curtail by
+        """
+        if 'meter_id' not in customers.columns:
+            customers = customers.rename(columns={'id': 'meter_id'})
+        opted_in = customers[OPT_IN_COLUMN].astype(str).str.lower().isin(['true', '1', 't']).to_numpy()
+
+        codes, groups = pd.factorize(customers[group_by], sort=True)
+        self.group_by = group_by
+        self.groups = np.asarray(groups)
+        self.opted_in_counts = np.bincount(codes[opted_in], minlength=len(groups))
+
+        load = profiles.reindex(customers['meter_id'].to_numpy()[opted_in]).fillna(0).to_numpy()
+        bins = (codes[opted_in][:, None] * HOURS_PER_DAY + np.arange(HOURS_PER_DAY)).ravel()
+        self.group_load = np.bincount(bins, weights=load.ravel(),
+                                      minlength=len(groups) * HOURS_PER_DAY).reshape(-1, HOURS_PER_DAY)
+        # Mean fleet-total kW at each hour of day
+        self.fleet_load = profiles.to_numpy().sum(axis=0)
+        # Share of fleet load at each hour of day that each group's opted-in customers carry
+        self.load_share = self.group_load / np.where(self.fleet_load > 0, self.fleet_load, np.inf)
+
+    @classmethod
+    def from_readings(cls, customers: pd.DataFrame, readings: pd.DataFrame, group_by: str = 'segment_id') -> 'DemandResponseEngine':
+        with stage('demand_response', 'profiles', len(readings)):
+            profiles = customer_profiles(readings)
+        return cls(customers, profiles, group_by)
+
+    def fleet_forecast(self, timestamps) -> pd.Series:
+        """Fleet-total kW baseline for the given hours: the fleet's mean load at each hour of day."""
+        timestamps = pd.DatetimeIndex(pd.to_datetime(timestamps))
+        return pd.Series(self.fleet_load[timestamps.hour.to_numpy()], index=timestamps, name='fleet_kw')
+
+    def depth_matrix(self, depth: Union[pd.DataFrame, np.ndarray, float]) -> np.ndarray:
+        """(scenarios x groups) curtailment fractions; DataFrame columns are group names, missing groups are 0."""
+        if isinstance(depth, pd.DataFrame):
+            depth = depth.reindex(columns=self.groups, fill_value=0).to_numpy(dtype=float)
+        depth = np.asarray(depth, dtype=float)
+        if depth.ndim < 2:
+            depth = np.broadcast_to(depth, (1, len(self.groups))) if depth.ndim == 0 else depth[None, :]
+        if depth.shape[1] != len(self.groups):
+            raise ValueError(f"depth has {depth.shape[1]} groups, expected {len(self.groups)}")
+        return np.clip(depth, 0, 1)
+
+    def evaluate(self, forecast: pd.Series, depth, hours,
+                 rebound: float = 0.0, chunk_size: int = 10_000) -> Dict[str, np.ndarray]:
+        """
+        Peak reduction for a batch of scenarios.
+
+        Args:
+            forecast: Fleet-total kW per forecast hour, a timestamp-indexed Series
+                (e.g. fleet_forecast())
+            depth: Curtailment fraction per group, (scenarios x groups), (groups,)
+                or a DataFrame with group-name columns
+            hours: Active forecast hours, boolean (scenarios x horizon) or (horizon,)
+            rebound: Fraction of curtailed load paid back in the hour after
+            chunk_size: Scenarios evaluated per matrix product (bounds memory)
+
+        Returns row-aligned arrays, one entry per scenario (see scoring.py):
+            peak_before_kw, peak_after_kw, peak_reduction_kw, peak_reduction_pct,
+            curtailed_kwh, peak_hour (forecast index of the new peak)
+        """
+        load, hour_of_day = forecast_arrays(forecast)
+        depth = self.depth_matrix(depth)
+        hours = np.asarray(hours, dtype=bool)
+        if hours.ndim == 1:
+            hours = hours[None, :]
+        if hours.shape[1] != len(load):
+            raise ValueError(f"hours covers {hours.shape[1]} forecast hours, forecast has {len(load)}")
+        n_scenarios = max(len(depth), len(hours))
+        depth = np.broadcast_to(depth, (n_scenarios, depth.shape[1]))
+        hours = np.broadcast_to(hours, (n_scenarios, hours.shape[1]))
+
+        # Curtailable load per group for every forecast hour, (groups x horizon)
+        share = self.load_share[:, hour_of_day] * load
+        peak_after = np.empty(n_scenarios)
+        peak_hour = np.empty(n_scenarios, dtype=np.int64)
+        curtailed = np.empty(n_scenarios)
+
+        with stage('demand_response', 'evaluate', n_scenarios):
+            for start in range(0, n_scenarios, chunk_size):
+                rows = slice(start, start + chunk_size)
+                reduction = (depth[rows] @ share) * hours[rows]
+                adjusted = load - reduction
+                if rebound:
+                    adjusted[:, 1:] += rebound * reduction[:, :-1]
+                peak_hour[rows] = adjusted.argmax(axis=1)
+                peak_after[rows] = np.take_along_axis(adjusted, peak_hour[rows, None], axis=1)[:, 0]
+                curtailed[rows] = reduction.sum(axis=1)
+
+        peak_before = np.full(n_scenarios, load.max())
+        reduction_kw = peak_before - peak_after
+        return check_batch({
+            'peak_before_kw': peak_before,
+            'peak_after_kw': peak_after,
+            'peak_reduction_kw': reduction_kw,
+            'peak_reduction_pct': 100 * reduction_kw / np.where(peak_before != 0, peak_before, np.inf),
+            'curtailed_kwh': curtailed,
+            'peak_hour': peak_hour
+        }, n_scenarios)
+
+    def scenario_grid(self, horizon: int, durations: Sequence[int] = (1, 2, 3, 4),
+                      depths: Sequence[float] = (0.1, 0.2, 0.3)) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+        """
+        Every (group, start hour, duration, depth) single-group event plus the
+        same events across all groups. Returns (description, depth, hours).
+        """
+        n_groups = len(self.groups)
+        targets = np.arange(n_groups + 1)  # n_groups = all groups
+        target, start, duration, level = (a.ravel() for a in np.meshgrid(
+            targets, np.arange(horizon), np.asarray(durations), np.asarray(depths), indexing='ij'))
+
+        depth = np.zeros((len(target), n_groups))
+        single = target < n_groups
+        depth[np.flatnonzero(single), target[single]] = level[single]
+        depth[~single] = level[~single, None]
+
+        description = pd.DataFrame({
+            self.group_by: np.append(self.groups, 'all')[target],
+            'start_hour': start,
+            'duration_hours': duration,
+            'depth': level
+        })
+        return description, depth, event_windows(horizon, start, duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate demand-response scenarios against fleet-total load')
+    parser.add_argument('customers', help='customers.csv')
+    parser.add_argument('readings', help='Parquet or CSV file of readings (for load profiles)')
+    parser.add_argument('--forecast', help='CSV of timestamp, fleet-total kW (default: profile baseline after the last reading)')
+    parser.add_argument('--periods', type=int, default=24, help='Hours to plan over with the profile baseline')
+    parser.add_argument('--group-by', default='segment_id')
+    parser.add_argument('--rebound', type=float, default=0.0)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    for path in (args.customers, args.readings, args.forecast):
+        if path and not os.path.exists(path):
+            print(f"❌ File not found: {path}")
+            exit(1)
+
+    customers = pd.read_csv(args.customers)
+    readings = pd.read_parquet(args.readings) if args.readings.endswith('.parquet') else pd.read_csv(args.readings)
+    engine = DemandResponseEngine.from_readings(customers, readings, args.group_by)
+    print(f"   {engine.opted_in_counts.sum():,} opted-in customers across {len(engine.groups)} groups")
+
+    if args.forecast:
+        frame = pd.read_csv(args.forecast)
+        forecast = pd.Series(frame.iloc[:, 1].to_numpy(dtype=float), index=pd.to_datetime(frame.iloc[:, 0]))
+    else:
+        start = pd.to_datetime(readings['reading_time']).max().floor('h') + pd.Timedelta(hours=1)
+        forecast = engine.fleet_forecast(pd.date_range(start, periods=args.periods, freq='h'))
+        print(f"   Baseline: fleet hour-of-day profile, peak {forecast.max():,.1f} kW")
+    description, depth, hours = engine.scenario_grid(len(forecast))
+    results = engine.evaluate(forecast, depth, hours, rebound=args.rebound)
+    print(f"   Evaluated {len(description):,} scenarios")
+
+    ranked = description.assign(**{k: results[k] for k in ('peak_reduction_kw', 'peak_reduction_pct', 'curtailed_kwh')})
+    ranked['start'] = forecast.index[ranked['start_hour']]
+    ranked = ranked.sort_values(['peak_reduction_kw', 'curtailed_kwh'], ascending=[False, True]).head(args.top)
+    print(ranked.drop(columns='start_hour').to_string(index=False, float_format=lambda v: f'{v:,.2f}'))
+
+
+if __name__ == '__main__':
+    main()
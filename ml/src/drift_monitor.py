@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Online feature drift monitoring against training scaler statistics.
+
+Every model scales its features with a StandardScaler fitted at training
+time, so scaled live features should keep mean 0 and variance 1. The
+monitor accumulates running moments and a fixed-edge histogram of the
+scaled features batch by batch; its state is O(features x bins) no matter
+how many rows it has seen. Drift scores compare the live moments with the
+scaler and, when the artifact carries one, the live histogram with the
+training histogram (population stability index).
+
+Calendar features (hour, day_of_week, ...) are reported but never count as
+drift: a scoring batch covers one slice of the calendar, so their live
+distribution differs from training by construction.
+
+Monitor state can be persisted between scoring runs, and the per-model
+reports it writes carry a retrain_recommended flag for the retraining job.
+Concurrent scoring runs fold their batches in with commit(), which holds a
+lock file while it reads, merges and rewrites the state.
+
+Usage:
+    python src/drift_monitor.py status            # exit code 2 if any model should be retrained
+    python src/drift_monitor.py reset anomaly_detector
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable
+
+import numpy as np
+
+DRIFT_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'processed', 'drift')
+
+# Histogram edges in standardized (scaled) units, shared by training and live data
+Z_EDGES = np.array([-3.0, -2.0, -1.5, -1.0, -0.5, 0.0, 0.5, 1.0, 1.5, 2.0, 3.0])
+
+PSI_THRESHOLD = 0.2
+MEAN_SHIFT_THRESHOLD = 0.5
+VARIANCE_RATIO_BOUNDS = (0.5, 2.0)
+MIN_ROWS = 500
+# Excluded from drift scoring: constant or near-constant within a scoring batch
+CALENDAR_FEATURES = frozenset({'hour', 'day_of_week', 'day_of_year', 'month', 'is_weekend'})
+
+
+def feature_histogram(scaled: np.ndarray) -> np.ndarray:
+    """Per-feature bin counts of scaled features over Z_EDGES, shape (features, bins)."""
+    scaled = np.asarray(scaled, dtype=float)
+    n_features, n_bins = scaled.shape[1], len(Z_EDGES) + 1
+    bins = np.searchsorted(Z_EDGES, scaled, side='right') + np.arange(n_features) * n_bins
+    return np.bincount(bins.ravel(), minlength=n_features * n_bins).reshape(n_features, n_bins)
+
+
+def rescale_histogram(histogram: np.ndarray, old: tuple, new: tuple) -> np.ndarray:
+    """
+    Re-bin feature_histogram() counts from one scaling (mean, scale) into another.
+    Counts are spread uniformly within each bin; the open tail bins are taken
+    to be one standard deviation wide.
+    """
+    (old_mean, old_scale), (new_mean, new_scale) = old, new
+    histogram = np.asarray(histogram, dtype=float)
+    old_edges = np.concatenate([[Z_EDGES[0] - 1], Z_EDGES, [Z_EDGES[-1] + 1]])
+    new_lo = np.concatenate([[-np.inf], Z_EDGES])
+    new_hi = np.concatenate([Z_EDGES, [np.inf]])
+    result = np.empty_like(histogram)
+    for f in range(len(histogram)):
+        mapped = (old_edges * old_scale[f] + old_mean[f] - new_mean[f]) / new_scale[f]
+        lo, hi = mapped[:-1, None], mapped[1:, None]
+        overlap = np.clip(np.minimum(hi, new_hi) - np.maximum(lo, new_lo), 0, None) / (hi - lo)
+        result[f] = histogram[f] @ overlap
+    return result
+
+
+def population_stability_index(expected: np.ndarray, actual: np.ndarray, eps: float = 1e-4) -> np.ndarray:
+    """PSI per feature between two count histograms of shape (features, bins)."""
+    p = np.maximum(expected / np.maximum(expected.sum(axis=1, keepdims=True), 1), eps)
+    q = np.maximum(actual / np.maximum(actual.sum(axis=1, keepdims=True), 1), eps)
+    return ((q - p) * np.log(q / p)).sum(axis=1)
+
+
+def scaler_fingerprint(scaler) -> str:
+    """Identifies the training run a monitor state belongs to."""
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(np.asarray(scaler.mean_, dtype=float).tobytes())
+    digest.update(np.asarray(scaler.var_, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+class FeatureDriftMonitor:
+    """Accumulates scaled-feature statistics for one model and scores drift."""
+
+    def __init__(self, model_name: str, scaler, reference_histogram: np.ndarray = None,
+                 psi_threshold: float = PSI_THRESHOLD, mean_shift_threshold: float = MEAN_SHIFT_THRESHOLD,
+                 min_rows: int = MIN_ROWS, half_life_rows: int = None,
+                 exclude_features: Iterable[str] = CALENDAR_FEATURES):
+        """
+        Args:
+            model_name: Name used in reports (e.g. 'anomaly_detector')
+            scaler: The model's fitted StandardScaler
+            reference_histogram: Training histogram from feature_histogram(), if saved
+            psi_threshold: PSI above which a feature counts as drifted
+            mean_shift_threshold: |live mean - training mean| in training standard deviations
+            min_rows: Rows needed before a retrain can be recommended
+            half_life_rows: Exponentially forget older rows so that a row's weight
+                halves after this many newer rows (default: never forget)
+            exclude_features: Features reported but never flagged as drifted
+        """
+        self.model_name = model_name
+        self.feature_names = [str(c) for c in getattr(scaler, 'feature_names_in_', range(len(scaler.mean_)))]
+        self.training_mean = np.asarray(scaler.mean_, dtype=float)
+        self.training_scale = np.asarray(scaler.scale_, dtype=float)
+        # Constant training features have no meaningful variance ratio
+        self.constant = np.asarray(scaler.var_, dtype=float) == 0
+        self.options = {'psi_threshold': psi_threshold, 'mean_shift_threshold': mean_shift_threshold,
+                        'min_rows': min_rows, 'half_life_rows': half_life_rows,
+                        'exclude_features': exclude_features}
+        self.excluded = np.isin(self.feature_names, list(exclude_features or ()))
+        self.fingerprint = scaler_fingerprint(scaler)
+        self.reference_histogram = reference_histogram
+        self.psi_threshold = psi_threshold
+        self.mean_shift_threshold = mean_shift_threshold
+        self.min_rows = min_rows
+        self.half_life_rows = half_life_rows
+        self.reset()
+
+    def reset(self) -> None:
+        n_features = len(self.feature_names)
+        self.count = 0.0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.histogram = np.zeros((n_features, len(Z_EDGES) + 1))
+
+    def observe(self, scaled: np.ndarray) -> None:
+        """Fold a batch of scaled features into the running statistics."""
+        scaled = np.asarray(scaled, dtype=float)
+        n = len(scaled)
+        if n == 0:
+            return
+        batch_mean = scaled.mean(axis=0)
+        self._combine(n, batch_mean, ((scaled - batch_mean) ** 2).sum(axis=0), feature_histogram(scaled))
+
+    def _combine(self, n: float, batch_mean: np.ndarray, batch_m2: np.ndarray, batch_histogram: np.ndarray) -> None:
+        """Fold the moments and histogram of n newer rows into the running statistics."""
+        if self.half_life_rows:
+            decay = 0.5 ** (n / self.half_life_rows)
+            self.count *= decay
+            self.m2 *= decay
+            self.histogram *= decay
+
+        # Chan et al. parallel combination of (count, mean, M2)
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + batch_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        self.histogram += batch_histogram
+
+    def scores(self) -> Dict[str, Any]:
+        """
+        Drift scores per feature and overall.
+
+        mean_shift is in training standard deviations, variance_ratio is live
+        over training variance and psi compares histograms (None without a
+        training histogram). drift_score is the largest PSI, or the largest
+        mean shift when PSI is unavailable.
+        """
+        variance = self.m2 / self.count if self.count else np.full(len(self.feature_names), np.nan)
+        mean_shift = np.abs(self.mean)
+        psi = None
+        if self.reference_histogram is not None and self.count:
+            psi = population_stability_index(self.reference_histogram, self.histogram)
+
+        low, high = VARIANCE_RATIO_BOUNDS
+        drifted = (mean_shift > self.mean_shift_threshold) | (~self.constant & ((variance < low) | (variance > high)))
+        if psi is not None:
+            drifted |= psi > self.psi_threshold
+        drifted &= ~self.excluded
+
+        features = []
+        for i, name in enumerate(self.feature_names):
+            features.append({
+                'feature': name,
+                'training_mean': float(self.training_mean[i]),
+                'live_mean': float(self.mean[i] * self.training_scale[i] + self.training_mean[i]),
+                'mean_shift': round(float(mean_shift[i]), 4),
+                'variance_ratio': round(float(variance[i]), 4),
+                'psi': round(float(psi[i]), 4) if psi is not None else None,
+                'drifted': bool(drifted[i]) if self.count else False,
+                'excluded': bool(self.excluded[i])
+            })
+
+        scored = ~self.excluded
+        if not scored.any() or not self.count:
+            drift_score = 0.0
+        else:
+            drift_score = float(psi[scored].max()) if psi is not None else float(mean_shift[scored].max())
+        return {
+            'model': self.model_name,
+            'fingerprint': self.fingerprint,
+            'rows_observed': int(round(self.count)),
+            'drift_score': round(drift_score, 4),
+            'drifted_features': [f['feature'] for f in features if f['drifted']],
+            'retrain_recommended': bool(self.count >= self.min_rows and drifted.any()),
+            'features': features,
+            'generated_at': datetime.now().isoformat()
+        }
+
+    def rescale(self, scaler, reference_histogram: np.ndarray = None) -> 'FeatureDriftMonitor':
+        """
+        Move this monitor's statistics, in place, into the space of a re-fitted
+        scaler (e.g. after AnomalyDetector.refresh), so they carry over instead
+        of being discarded for the new fingerprint. Moments transform exactly;
+        the histogram is re-binned. Returns self.
+        """
+        old = (self.training_mean, self.training_scale)
+        new = (np.asarray(scaler.mean_, dtype=float), np.asarray(scaler.scale_, dtype=float))
+        self.mean = (self.mean * old[1] + old[0] - new[0]) / new[1]
+        self.m2 = self.m2 * (old[1] / new[1]) ** 2
+        self.histogram = rescale_histogram(self.histogram, old, new)
+        self.training_mean, self.training_scale = new
+        self.constant = np.asarray(scaler.var_, dtype=float) == 0
+        self.fingerprint = scaler_fingerprint(scaler)
+        self.reference_histogram = reference_histogram
+        return self
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            'model': self.model_name,
+            'fingerprint': self.fingerprint,
+            'count': float(self.count),
+            'mean': self.mean.tolist(),
+            'm2': self.m2.tolist(),
+            'histogram': self.histogram.tolist()
+        }
+
+    def restore(self, state: Dict[str, Any]) -> bool:
+        """Resume from a saved state; ignored (returns False) if it belongs to another training run."""
+        if state.get('fingerprint') != self.fingerprint:
+            return False
+        self.count = state['count']
+        self.mean = np.asarray(state['mean'], dtype=float)
+        self.m2 = np.asarray(state['m2'], dtype=float)
+        self.histogram = np.asarray(state['histogram'], dtype=float)
+        return True
+
+    def write(self, directory: str = DRIFT_DIR) -> str:
+        """Persist state and the current report as {directory}/{model}.json (atomically replaced)."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{self.model_name}.json')
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=f'.{self.model_name}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'state': self.state(), 'report': self.scores()}, f, indent=2)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return path
+
+    def commit(self, directory: str = DRIFT_DIR) -> Dict[str, Any]:
+        """
+        Merge the rows observed since the last resume/commit into the persisted
+        state and write it back, holding the model's lock so concurrent scoring
+        runs do not overwrite each other. Returns the merged report.
+        """
+        with state_lock(directory, self.model_name):
+            batch = self.state()
+            self.reset()
+            self.resume(directory)
+            if batch['count']:
+                self._combine(batch['count'], np.asarray(batch['mean']), np.asarray(batch['m2']),
+                              np.asarray(batch['histogram']))
+            self.write(directory)
+        return self.scores()
+
+    def resume(self, directory: str = DRIFT_DIR) -> bool:
+        """Restore state written by write(), if present and still valid."""
+        path = os.path.join(directory, f'{self.model_name}.json')
+        if not os.path.exists(path):
+            return False
+        with open(path) as f:
+            return self.restore(json.load(f)['state'])
+
+
+@contextmanager
+def state_lock(directory: str, model_name: str):
+    """Exclusive lock on a model's drift state, shared by every process using the directory."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f'.{model_name}.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def carry_over_state(model_name: str, old_scaler, new_scaler, reference_histogram: np.ndarray = None,
+                     directory: str = DRIFT_DIR) -> bool:
+    """Rescale a model's persisted state from old_scaler to new_scaler; False if there was none to carry."""
+    with state_lock(directory, model_name):
+        monitor = FeatureDriftMonitor(model_name, old_scaler)
+        if not monitor.resume(directory):
+            return False
+        monitor.rescale(new_scaler, reference_histogram).write(directory)
+    return True
+
+
+def read_reports(directory: str = DRIFT_DIR) -> Dict[str, Dict[str, Any]]:
+    reports = {}
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.json'):
+                with open(os.path.join(directory, name)) as f:
+                    reports[name[:-len('.json')]] = json.load(f)['report']
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect feature drift reports')
+    parser.add_argument('command', choices=['status', 'reset'])
+    parser.add_argument('model', nargs='?', help='Model to reset (required for reset)')
+    parser.add_argument('--dir', default=DRIFT_DIR)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    if args.command == 'reset':
+        if not args.model:
+            parser.error('reset needs the model whose drift state to clear')
+        path = os.path.join(args.dir, f'{args.model}.json')
+        with state_lock(args.dir, args.model):
+            if os.path.exists(path):
+                os.remove(path)
+        print(f"✅ Drift state reset for {args.model}")
+        return
+
+    reports = read_reports(args.dir)
+    retrain = [name for name, report in reports.items() if report['retrain_recommended']]
+    if args.json:
+        print(json.dumps({'reports': reports, 'retrain': retrain}))
+    else:
+        if not reports:
+            print("No drift reports found")
+        for name, report in reports.items():
+            flag = '⚠️ ' if report['retrain_recommended'] else '✅'
+            drifted = ', '.join(report['drifted_features']) or 'none'
+            print(f"{flag} {name}: drift score {report['drift_score']:.3f} over "
+                  f"{report['rows_observed']:,} rows (drifted: {drifted})")
+    sys.exit(2 if retrain else 0)
+
+
+if __name__ == '__main__':
+    main()
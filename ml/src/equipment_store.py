@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Equipment Attribute Store for transformers.
+Holds maintenance log and failure history attributes with deterministic defaults.
+
+Maintenance is kept as the date of the last visit; months since maintenance
+are computed at lookup time, so a store pickled into a model artifact keeps
+ageing with the calendar instead of freezing at the training date.
+"""
+
+import pandas as pd
+import numpy as np
+import hashlib
+from datetime import datetime
+from typing import Optional
+
+
+def fingerprint_hashes(row_hashes: np.ndarray) -> np.uint64:
+    """Collapse an array of per-row hashes into a single 64-bit fingerprint."""
+    digest = hashlib.blake2b(np.ascontiguousarray(row_hashes).tobytes(), digest_size=8).digest()
+    return np.uint64(int.from_bytes(digest, 'little'))
+
+
+class EquipmentAttributeStore:
+    """Per-transformer maintenance and failure history attributes."""
+
+    ATTRIBUTE_COLUMNS = ['maintenance_months_ago', 'failure_history_count']
+    # Stored per transformer; maintenance_months_ago is derived from last_maintenance in lookup()
+    STORED_COLUMNS = ['last_maintenance', 'failure_history_count']
+    DAYS_PER_MONTH = 30.44
+
+    # Used for transformers with no maintenance log or failure history entry
+    DEFAULTS = {
+        'maintenance_months_ago': 12.0,
+        'failure_history_count': 0
+    }
+
+    def __init__(self, attributes: pd.DataFrame = None, as_of: Optional[datetime] = None):
+        """
+        Args:
+            attributes: One row per transformer with a 'transformer_id' column and
+                either 'maintenance_months_ago' or 'last_maintenance_date', plus
+                'failure_history_count'. Missing columns fall back to DEFAULTS.
+            as_of: Fixed reference date for months since maintenance (default:
+                the current date at each lookup). Rows given as
+                'maintenance_months_ago' are anchored to the date the store is built.
+        """
+        self.as_of = pd.Timestamp(as_of).normalize() if as_of is not None else None
+        self.attributes = self._normalize(attributes)
+        self.fingerprint = self._fingerprint(self.attributes)
+
+    def reference_date(self) -> pd.Timestamp:
+        """Date months since maintenance are measured from."""
+        return self.as_of if self.as_of is not None else pd.Timestamp(datetime.now()).normalize()
+
+    def _normalize(self, attributes: pd.DataFrame) -> pd.DataFrame:
+        """Reduce raw store input to one row (last maintenance date, failure count) per transformer_id."""
+        if attributes is None or len(attributes) == 0:
+            return pd.DataFrame({'last_maintenance': pd.Series(dtype='datetime64[ns]'),
+                                 'failure_history_count': pd.Series(dtype=float)},
+                                index=pd.Index([], name='transformer_id'))
+
+        attrs = attributes.copy()
+        if 'transformer_id' not in attrs.columns and 'id' in attrs.columns:
+            attrs = attrs.rename(columns={'id': 'transformer_id'})
+
+        if 'last_maintenance_date' in attrs.columns:
+            attrs['last_maintenance'] = pd.to_datetime(attrs['last_maintenance_date'])
+        elif 'maintenance_months_ago' in attrs.columns:
+            attrs['last_maintenance'] = self._months_to_date(attrs['maintenance_months_ago'], self.reference_date())
+        else:
+            attrs['last_maintenance'] = pd.NaT
+
+        if 'failure_history_count' not in attrs.columns:
+            attrs['failure_history_count'] = self.DEFAULTS['failure_history_count']
+        attrs['failure_history_count'] = attrs['failure_history_count'].fillna(self.DEFAULTS['failure_history_count'])
+
+        # Latest entry wins when the log has several rows for a transformer
+        attrs = attrs.drop_duplicates('transformer_id', keep='last')
+        return attrs.set_index('transformer_id')[self.STORED_COLUMNS].sort_index()
+
+    @classmethod
+    def _months_to_date(cls, months: pd.Series, as_of: pd.Timestamp) -> pd.Series:
+        return as_of - pd.to_timedelta(months.astype(float) * cls.DAYS_PER_MONTH, unit='D')
+
+    def __setstate__(self, state):
+        # Stores pickled before maintenance dates were kept hold months as of their build date
+        if 'maintenance_months_ago' in state['attributes'].columns:
+            attrs = state['attributes'].copy()
+            attrs['last_maintenance'] = self._months_to_date(attrs['maintenance_months_ago'], state['as_of'])
+            state['attributes'] = attrs[self.STORED_COLUMNS]
+            state['as_of'] = None
+        self.__dict__.update(state)
+
+    @staticmethod
+    def _fingerprint(attributes: pd.DataFrame) -> np.uint64:
+        """Stable hash of the store contents, used to key feature caches."""
+        if len(attributes) == 0:
+            return np.uint64(0)
+        row_hashes = pd.util.hash_pandas_object(attributes, index=True).values
+        return fingerprint_hashes(row_hashes)
+
+    def lookup(self, transformer_ids, as_of: Optional[datetime] = None) -> pd.DataFrame:
+        """
+        Return ATTRIBUTE_COLUMNS rows aligned with transformer_ids, using defaults for unknown ids.
+        Months since maintenance are measured from as_of (default: reference_date()).
+        """
+        as_of = pd.Timestamp(as_of).normalize() if as_of is not None else self.reference_date()
+        found = self.attributes.reindex(pd.Index(transformer_ids))
+        months = (as_of - found['last_maintenance']) / pd.Timedelta(days=1) / self.DAYS_PER_MONTH
+        return pd.DataFrame({
+            'maintenance_months_ago': months.fillna(self.DEFAULTS['maintenance_months_ago']).astype(float).to_numpy(),
+            'failure_history_count': found['failure_history_count'].astype(float)
+                .fillna(self.DEFAULTS['failure_history_count']).to_numpy()
+        })
+
+    def __len__(self) -> int:
+        return len(self.attributes)
+
+    @classmethod
+    def load(cls, path: str, as_of: Optional[datetime] = None) -> 'EquipmentAttributeStore':
+        """Load attributes from a CSV or Parquet file."""
+        if path.endswith('.parquet'):
+            attributes = pd.read_parquet(path)
+        else:
+            attributes = pd.read_csv(path)
+        return cls(attributes, as_of=as_of)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Out-of-core training data for the failure predictor.
+
+Readings are reduced chunk by chunk to per-transformer-per-day partial
+aggregates (counts, sums, maxima), which are spilled to disk by period.
+Each period is then combined into transformer-day feature rows and saved
+as one feature chunk, and XGBoost reads the chunks through a DataIter into
+an external-memory matrix. Neither the readings nor the feature matrix is
+ever held in memory whole, and readings do not need to arrive in time order.
+"""
+
+import glob
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import xgboost
+
+NS_PER_DAY = 24 * 60 * 60 * 1_000_000_000
+
+READING_COLUMNS = ['transformer_id', 'reading_time', 'consumption_kwh', 'voltage', 'power_factor', 'quality_flag']
+
+# Partial aggregates per (transformer_id, day) and how partials for the same key combine
+DAY_AGGREGATES = {
+    'reading_count': 'sum',
+    'consumption_sum': 'sum',
+    'consumption_max': 'max',
+    'voltage_sum': 'sum',
+    'voltage_sumsq': 'sum',
+    'power_factor_sum': 'sum',
+    'anomaly_count': 'sum',
+}
+
+
+def iter_reading_chunks(source: Union[str, pd.DataFrame, Iterable[pd.DataFrame]],
+                        chunk_rows: int = 1_000_000) -> Iterator[pd.DataFrame]:
+    """Yield readings in chunks from a Parquet path, a DataFrame or an iterable of DataFrames."""
+    if isinstance(source, str):
+        parquet = pq.ParquetFile(source)
+        if 'transformer_id' not in parquet.schema_arrow.names:
+            raise ValueError(f"{source} has no transformer_id column")
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=READING_COLUMNS):
+            yield batch.to_pandas()
+    elif isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunk_rows):
+            yield source.iloc[start:start + chunk_rows]
+    else:
+        yield from source
+
+
+def day_index(reading_time) -> np.ndarray:
+    """Days since the Unix epoch for each timestamp."""
+    return pd.to_datetime(reading_time).to_numpy(dtype='datetime64[ns]').astype(np.int64) // NS_PER_DAY
+
+
+def daily_partials(readings: pd.DataFrame) -> pd.DataFrame:
+    """Reduce a chunk of readings to partial aggregates per (transformer_id, day)."""
+    voltage = readings['voltage'].to_numpy(dtype=float)
+    partial = pd.DataFrame({
+        'transformer_id': readings['transformer_id'].to_numpy(),
+        'day': day_index(readings['reading_time']),
+        'reading_count': np.ones(len(readings), dtype=np.int64),
+        'consumption_sum': readings['consumption_kwh'].to_numpy(dtype=float),
+        'consumption_max': readings['consumption_kwh'].to_numpy(dtype=float),
+        'voltage_sum': voltage,
+        'voltage_sumsq': voltage ** 2,
+        'power_factor_sum': readings['power_factor'].to_numpy(dtype=float),
+        'anomaly_count': (readings['quality_flag'] == 'anomaly').to_numpy().astype(np.int64),
+    })
+    return combine_partials(partial)
+
+
+def combine_partials(partials: pd.DataFrame) -> pd.DataFrame:
+    return partials.groupby(['transformer_id', 'day'], sort=True).agg(DAY_AGGREGATES).reset_index()
+
+
+def day_statistics(partials: pd.DataFrame) -> pd.DataFrame:
+    """Per transformer-day usage statistics matching FailurePredictor's reading features."""
+    count = partials['reading_count'].to_numpy(dtype=float)
+    voltage_var = (partials['voltage_sumsq'] - partials['voltage_sum'] ** 2 / count) / np.maximum(count - 1, 1)
+    return pd.DataFrame({
+        'transformer_id': partials['transformer_id'].to_numpy(),
+        'day': partials['day'].to_numpy(),
+        'avg_load': partials['consumption_sum'].to_numpy() / count,
+        'max_load': partials['consumption_max'].to_numpy(),
+        'voltage_variance': np.sqrt(np.maximum(voltage_var.to_numpy(), 0)),
+        'power_factor_avg': partials['power_factor_sum'].to_numpy() / count,
+        'anomaly_rate': partials['anomaly_count'].to_numpy() / count,
+    })
+
+
+def spill_partials(chunks: Iterable[pd.DataFrame], directory: str, period_days: int = 31) -> int:
+    """
+    Aggregate each chunk and append its partials to on-disk period partitions.
+    Returns the number of readings processed.
+    """
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        rows += len(chunk)
+        partials = daily_partials(chunk)
+        for period, part in partials.groupby(partials['day'].to_numpy() // period_days):
+            period_dir = os.path.join(directory, f'period={period:06d}')
+            os.makedirs(period_dir, exist_ok=True)
+            part.to_parquet(os.path.join(period_dir, f'chunk-{i:06d}.parquet'), index=False)
+    return rows
+
+
+def iter_periods(directory: str) -> Iterator[pd.DataFrame]:
+    """Yield fully combined partials one period at a time, oldest first."""
+    for period_dir in sorted(glob.glob(os.path.join(directory, 'period=*'))):
+        files = sorted(glob.glob(os.path.join(period_dir, '*.parquet')))
+        yield combine_partials(pd.concat([pd.read_parquet(f) for f in files], ignore_index=True))
+
+
+def save_feature_chunk(path: str, features: np.ndarray, labels: np.ndarray, days: np.ndarray) -> None:
+    np.savez(path, features=features.astype(np.float32), labels=labels.astype(np.float32), days=days)
+
+
+def load_feature_chunk(path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    with np.load(path) as chunk:
+        return chunk['features'], chunk['labels'], chunk['days']
+
+
+def validation_cutoff(day_counts: Dict[int, int], fraction: float) -> int:
+    """First day of the validation period, so that about `fraction` of rows come last in time."""
+    days = np.array(sorted(day_counts))
+    counts = np.array([day_counts[d] for d in days])
+    position = np.searchsorted(np.cumsum(counts), (1 - fraction) * counts.sum(), side='right')
+    return int(days[min(position, len(days) - 1)])
+
+
+class FeatureChunkIter(xgboost.DataIter):
+    """Feeds saved feature chunks to XGBoost, restricted to a day range and transformed on the fly."""
+
+    def __init__(self, paths: List[str], first_day: int, end_day: int,
+                 transform: Callable[[np.ndarray], np.ndarray], cache_prefix: str):
+        self.paths = paths
+        self.first_day = first_day
+        self.end_day = end_day
+        self.transform = transform
+        self._position = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data: Callable) -> bool:
+        while self._position < len(self.paths):
+            features, labels, days = load_feature_chunk(self.paths[self._position])
+            self._position += 1
+            mask = (days >= self.first_day) & (days < self.end_day)
+            if mask.any():
+                input_data(data=self.transform(features[mask]).astype(np.float32), label=labels[mask])
+                return True
+        return False
+
+    def reset(self) -> None:
+        self._position = 0
+
+
+def external_memory_matrix(iterator: FeatureChunkIter, reference=None, max_bin: int = 256, nthread: int = None):
+    """
+    Build an external-memory matrix for the hist tree method.
+    XGBoost 3 has a dedicated quantile matrix; 2.x uses a paged DMatrix.
+    """
+    if hasattr(xgboost, 'ExtMemQuantileDMatrix'):
+        return xgboost.ExtMemQuantileDMatrix(iterator, max_bin=max_bin, ref=reference, nthread=nthread)
+    return xgboost.DMatrix(iterator, nthread=nthread)
@@ -6,32 +6,82 @@ Uses XGBoost for supervised learning to predict equipment failure probability.
 
 import pandas as pd
 import numpy as np
-from xgboost import XGBClassifier
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
 import joblib
 import os
-from typing import Dict, Any, Tuple
+import shutil
+import tempfile
+from typing import Dict, Any, Tuple, Union, Iterable
+
+from scoring import FAILURE_THRESHOLD, risk_levels, check_batch
+from equipment_store import EquipmentAttributeStore, fingerprint_hashes
+from instrumentation import stage
+from resource_governor import current_threads
+from drift_monitor import FeatureDriftMonitor, feature_histogram
 
 
 class FailurePredictor:
     """XGBoost based failure prediction model for equipment."""
     
-    def __init__(self):
+    # Feature vectors memoized per (equipment row, readings, attribute store) fingerprint
+    FEATURE_CACHE_SIZE = 100_000
+    
+    # Reading columns that feed the per-transformer usage statistics
+    READINGS_FEATURE_SOURCE = ['transformer_id', 'consumption_kwh', 'voltage', 'power_factor', 'quality_flag']
+    
+    # XGBoost settings used unless a tuned configuration is supplied (see hyperparameter_search.py)
+    DEFAULT_PARAMS = {
+        'n_estimators': 200,
+        'max_depth': 6,
+        'learning_rate': 0.1,
+        'subsample': 0.8,
+        'colsample_bytree': 0.8
+    }
+    
+    def __init__(self, attribute_store: EquipmentAttributeStore = None, params: Dict[str, Any] = None):
+        from sklearn.preprocessing import StandardScaler
+        
         self.model = None
+        self.params = {**self.DEFAULT_PARAMS, **(params or {})}
+        # Winning configuration and timings of the search that produced params, if any
+        self.tuning: Dict[str, Any] = None
         self.scaler = StandardScaler()
+        self.attribute_store = attribute_store or EquipmentAttributeStore()
         self.feature_columns = [
             'age_years', 'capacity_kva', 'avg_load_pct', 'max_load_pct',
             'voltage_variance', 'power_factor_avg', 'anomaly_rate',
             'maintenance_months_ago', 'failure_history_count'
         ]
+        self._feature_cache: Dict[int, np.ndarray] = {}
+        # Training distribution of scaled features, the drift monitor's reference
+        self.reference_histogram: np.ndarray = None
+        self.drift_monitor: FeatureDriftMonitor = None
     
-    def prepare_features(self, equipment_df: pd.DataFrame, readings_df: pd.DataFrame = None) -> pd.DataFrame:
-        """Prepare features for failure prediction."""
+    def _uses_readings(self, readings_df: pd.DataFrame) -> bool:
+        return readings_df is not None and 'transformer_id' in readings_df.columns
+    
+    def feature_fingerprints(self, equipment_df: pd.DataFrame, readings_df: pd.DataFrame = None) -> np.ndarray:
+        """
+        Fingerprint each equipment row together with everything its features depend on.
+        Identical inputs always produce identical fingerprints, so they can key a cache.
+        """
+        # Months since maintenance depend on the date features are built
+        context = [self.attribute_store.fingerprint, np.uint64(self.attribute_store.reference_date().value)]
+        if self._uses_readings(readings_df):
+            source = readings_df[[c for c in self.READINGS_FEATURE_SOURCE if c in readings_df.columns]]
+            context.append(fingerprint_hashes(pd.util.hash_pandas_object(source, index=False).values))
+        context_hash = fingerprint_hashes(np.array(context, dtype=np.uint64))
+        
+        row_hashes = pd.util.hash_pandas_object(equipment_df, index=False).values
+        return pd.util.hash_array(row_hashes ^ context_hash)
+    
+    def _build_features(self, equipment_df: pd.DataFrame, readings_df: pd.DataFrame = None) -> pd.DataFrame:
+        """Compute feature rows for equipment that missed the feature cache."""
         features = equipment_df.copy()
         
         # If readings provided, calculate usage statistics per transformer
-        if readings_df is not None and 'transformer_id' in readings_df.columns:
+        if self._uses_readings(readings_df):
+            if 'id' in features.columns:
+                readings_df = readings_df[readings_df['transformer_id'].isin(features['id'])]
             readings_agg = readings_df.groupby('transformer_id').agg({
                 'consumption_kwh': ['mean', 'max', 'std'],
                 'voltage': ['std'],
@@ -43,6 +93,14 @@ class FailurePredictor:
             
             features = features.merge(readings_agg, left_on='id', right_index=True, how='left')
         
+        return self._complete_features(features)
+    
+    def _complete_features(self, features: pd.DataFrame) -> pd.DataFrame:
+        """Add attribute store columns and defaults, and select the model's feature columns."""
+        # Maintenance and failure history come from the attribute store
+        ids = features['id'] if 'id' in features.columns else pd.Series([np.nan] * len(features))
+        attributes = self.attribute_store.lookup(ids)
+        
         # Fill missing columns with defaults
         for col in self.feature_columns:
             if col not in features.columns:
@@ -50,15 +108,36 @@ class FailurePredictor:
                     features[col] = features.get('avg_load', 50) / features.get('capacity_kva', 1) * 100
                 elif col == 'max_load_pct':
                     features[col] = features.get('max_load', 80) / features.get('capacity_kva', 1) * 100
-                elif col == 'maintenance_months_ago':
-                    features[col] = np.random.uniform(1, 24, len(features))
-                elif col == 'failure_history_count':
-                    features[col] = np.random.poisson(0.5, len(features))
+                elif col in attributes.columns:
+                    features[col] = attributes[col].to_numpy()
                 elif col not in features.columns:
                     features[col] = 0
         
         return features[self.feature_columns].fillna(0)
     
+    def prepare_features(self, equipment_df: pd.DataFrame, readings_df: pd.DataFrame = None) -> pd.DataFrame:
+        """Prepare features for failure prediction, reusing memoized rows where possible."""
+        keys = self.feature_fingerprints(equipment_df, readings_df)
+        missing = np.array([k not in self._feature_cache for k in keys.tolist()], dtype=bool)
+        
+        # Assemble the batch before evicting, so a full cache cannot drop this call's hits
+        matrix = np.empty((len(keys), len(self.feature_columns)))
+        if (~missing).any():
+            matrix[~missing] = np.vstack([self._feature_cache[k] for k in keys[~missing].tolist()])
+        if missing.any():
+            computed = self._build_features(equipment_df[missing], readings_df).to_numpy(dtype=float)
+            matrix[missing] = computed
+            if len(self._feature_cache) + int(missing.sum()) > self.FEATURE_CACHE_SIZE:
+                self._feature_cache.clear()
+            keep = self.FEATURE_CACHE_SIZE
+            self._feature_cache.update(zip(keys[missing].tolist()[:keep], computed[:keep]))
+        
+        return pd.DataFrame(matrix, columns=self.feature_columns, index=equipment_df.index)
+    
+    def clear_feature_cache(self) -> None:
+        """Drop memoized feature rows (e.g. after replacing the attribute store)."""
+        self._feature_cache.clear()
+    
     def generate_training_labels(self, equipment_df: pd.DataFrame) -> np.ndarray:
         """
         Generate synthetic failure labels based on equipment characteristics.
@@ -80,7 +159,8 @@ class FailurePredictor:
               labels: np.ndarray = None) -> 'FailurePredictor':
         """Train XGBoost classifier for failure prediction."""
         print("Preparing features...")
-        features = self.prepare_features(equipment_df, readings_df)
+        with stage('failure_predictor', 'train.prepare_features', len(equipment_df)):
+            features = self.prepare_features(equipment_df, readings_df)
         
         # Generate labels if not provided
         if labels is None:
@@ -91,7 +171,16 @@ class FailurePredictor:
         
         # Scale features
         print("Scaling features...")
-        scaled_features = self.scaler.fit_transform(features)
+        with stage('failure_predictor', 'train.scale', len(features)):
+            scaled_features = self.scaler.fit_transform(features)
+            self.reference_histogram = feature_histogram(scaled_features)
+        
+        return self.fit_features(scaled_features, labels)
+    
+    def fit_features(self, scaled_features: np.ndarray, labels: np.ndarray) -> 'FailurePredictor':
+        """Fit the classifier with self.params on already prepared and scaled features."""
+        from sklearn.model_selection import train_test_split
+        from xgboost import XGBClassifier
         
         # Split for validation
         X_train, X_val, y_train, y_val = train_test_split(
@@ -102,23 +191,21 @@ class FailurePredictor:
         print(f"   Training samples: {len(X_train)}, Validation samples: {len(X_val)}")
         
         self.model = XGBClassifier(
-            n_estimators=200,
-            max_depth=6,
-            learning_rate=0.1,
-            subsample=0.8,
-            colsample_bytree=0.8,
+            **self.params,
             random_state=42,
             use_label_encoder=False,
             eval_metric='logloss',
             early_stopping_rounds=20,
+            n_jobs=current_threads(),
             verbosity=1
         )
         
-        self.model.fit(
-            X_train, y_train,
-            eval_set=[(X_val, y_val)],
-            verbose=True
-        )
+        with stage('failure_predictor', 'train.fit', len(X_train)):
+            self.model.fit(
+                X_train, y_train,
+                eval_set=[(X_val, y_val)],
+                verbose=True
+            )
         
         # Evaluate
         train_acc = self.model.score(X_train, y_train)
@@ -136,23 +223,175 @@ class FailurePredictor:
         
         return self
     
+    def train_external_memory(self, equipment_df: pd.DataFrame,
+                              readings: Union[str, pd.DataFrame, Iterable[pd.DataFrame]],
+                              labels_df: pd.DataFrame = None, validation_fraction: float = 0.2,
+                              chunk_rows: int = 1_000_000, work_dir: str = None,
+                              num_boost_round: int = None) -> 'FailurePredictor':
+        """
+        Train on one row per transformer per day without holding readings or
+        features in memory (see external_memory.py).
+        
+        Args:
+            equipment_df: Transformer records ('id', 'age_years', 'capacity_kva', ...)
+            readings: Parquet path, DataFrame or iterable of reading chunks with transformer_id
+            labels_df: Optional failure labels (transformer_id, date, failed); synthetic
+                labels are generated per transformer-day when omitted
+            validation_fraction: Share of rows, taken from the most recent days, held out
+            chunk_rows: Readings per chunk when reading a Parquet file or DataFrame
+            work_dir: Directory for spilled aggregates, feature chunks and XGBoost
+                page caches (default: a temporary directory removed afterwards)
+            num_boost_round: Boosting rounds (default: params['n_estimators'])
+        """
+        import xgboost
+        from xgboost import XGBClassifier
+        from external_memory import (
+            iter_reading_chunks, spill_partials, iter_periods, day_statistics, day_index,
+            save_feature_chunk, load_feature_chunk, validation_cutoff, FeatureChunkIter,
+            external_memory_matrix
+        )
+        
+        owns_work_dir = work_dir is None
+        work_dir = work_dir or tempfile.mkdtemp(prefix='failure_predictor_')
+        partials_dir = os.path.join(work_dir, 'partials')
+        chunks_dir = os.path.join(work_dir, 'features')
+        os.makedirs(chunks_dir, exist_ok=True)
+        
+        equipment = equipment_df.drop(columns=['avg_load', 'max_load', 'voltage_variance',
+                                               'power_factor_avg', 'anomaly_rate'], errors='ignore')
+        if labels_df is not None:
+            labels_df = labels_df.assign(day=day_index(labels_df['date']))[['transformer_id', 'day', 'failed']]
+        
+        try:
+            print("Aggregating readings to transformer-days...")
+            with stage('failure_predictor', 'train.prepare_features') as record:
+                record['rows'] = spill_partials(iter_reading_chunks(readings, chunk_rows), partials_dir)
+                
+                chunk_paths, day_counts, positives = [], {}, 0
+                for i, partials in enumerate(iter_periods(partials_dir)):
+                    rows = day_statistics(partials).merge(equipment, left_on='transformer_id', right_on='id')
+                    features = self._complete_features(rows)
+                    if labels_df is not None:
+                        labels = rows[['transformer_id', 'day']].merge(labels_df, how='left')['failed'].fillna(0).to_numpy()
+                    else:
+                        labels = self.generate_training_labels(rows)
+                    
+                    path = os.path.join(chunks_dir, f'chunk-{i:06d}.npz')
+                    save_feature_chunk(path, features.to_numpy(dtype=float), labels, rows['day'].to_numpy())
+                    chunk_paths.append(path)
+                    positives += int(labels.sum())
+                    for day, count in rows['day'].value_counts().items():
+                        day_counts[day] = day_counts.get(day, 0) + count
+            
+            n_rows = sum(day_counts.values())
+            cutoff = validation_cutoff(day_counts, validation_fraction)
+            print(f"   {n_rows:,} transformer-day rows in {len(chunk_paths)} chunks, {positives:,} positive")
+            print(f"   Validation period starts {pd.Timestamp(cutoff, unit='D').date()}")
+            
+            def training_rows():
+                for path in chunk_paths:
+                    features, _, days = load_feature_chunk(path)
+                    if (days < cutoff).any():
+                        yield pd.DataFrame(features[days < cutoff], columns=self.feature_columns)
+            
+            def transform(features: np.ndarray) -> np.ndarray:
+                return self.scaler.transform(pd.DataFrame(features, columns=self.feature_columns))
+            
+            # Tree splits do not need scaling, but score() applies the scaler
+            print("Fitting scaler incrementally...")
+            with stage('failure_predictor', 'train.scale', n_rows):
+                for features in training_rows():
+                    self.scaler.partial_fit(features)
+                self.reference_histogram = sum(feature_histogram(self.scaler.transform(f)) for f in training_rows())
+            
+            cache = os.path.join(work_dir, 'xgboost-cache')
+            train_iter = FeatureChunkIter(chunk_paths, np.iinfo(np.int64).min, cutoff, transform, cache + '-train')
+            val_iter = FeatureChunkIter(chunk_paths, cutoff, np.iinfo(np.int64).max, transform, cache + '-val')
+            
+            print("Training XGBoost from external memory (hist)...")
+            with stage('failure_predictor', 'train.fit', n_rows):
+                dtrain = external_memory_matrix(train_iter, nthread=current_threads())
+                dval = external_memory_matrix(val_iter, reference=dtrain, nthread=current_threads())
+                booster = xgboost.train(
+                    {
+                        'objective': 'binary:logistic',
+                        'eval_metric': 'logloss',
+                        'tree_method': 'hist',
+                        'max_depth': self.params['max_depth'],
+                        'learning_rate': self.params['learning_rate'],
+                        'subsample': self.params['subsample'],
+                        'colsample_bytree': self.params['colsample_bytree'],
+                        'nthread': current_threads(),
+                        'seed': 42
+                    },
+                    dtrain,
+                    num_boost_round=num_boost_round or self.params['n_estimators'],
+                    evals=[(dtrain, 'train'), (dval, 'validation')],
+                    early_stopping_rounds=20,
+                    verbose_eval=25
+                )
+        finally:
+            # Release XGBoost's page caches before their directory is removed
+            dtrain = dval = train_iter = val_iter = None
+            if owns_work_dir:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        
+        # Wrap the booster so score()/predict() work exactly as for in-memory training
+        self.model = XGBClassifier()
+        self.model.load_model(bytearray(booster.save_raw('ubj')))
+        self.clear_feature_cache()
+        
+        print(f"\n✅ Training complete!")
+        print(f"   Best iteration: {booster.best_iteration}, validation logloss: {booster.best_score:.4f}")
+        
+        importance = dict(zip(self.feature_columns, self.model.feature_importances_))
+        print("\nFeature importance:")
+        for feat, imp in sorted(importance.items(), key=lambda x: -x[1])[:5]:
+            print(f"   {feat}: {imp:.3f}")
+        
+        return self
+    
+    def score(self, equipment_df: pd.DataFrame, readings_df: pd.DataFrame = None) -> Dict[str, np.ndarray]:
+        """
+        Score a batch of equipment with a single inference pass.
+        
+        Returns row-aligned arrays (see scoring.py for the batch contract):
+            failure_probability: probability of the failure class
+            will_fail: probability above the classification threshold
+            risk_level: risk band label for each probability
+        """
+        with stage('failure_predictor', 'score.prepare_features', len(equipment_df)):
+            features = self.prepare_features(equipment_df, readings_df)
+        with stage('failure_predictor', 'score.scale', len(features)):
+            scaled_features = self.scaler.transform(features)
+        if self.drift_monitor is not None:
+            self.drift_monitor.observe(scaled_features)
+        
+        # predict_proba is the only model call; labels are derived from it
+        self.model.set_params(n_jobs=current_threads())
+        with stage('failure_predictor', 'score.inference', len(scaled_features)):
+            probabilities = self.model.predict_proba(scaled_features)[:, 1]
+        
+        return check_batch({
+            'failure_probability': probabilities,
+            'will_fail': (probabilities > FAILURE_THRESHOLD).astype(int),
+            'risk_level': risk_levels(probabilities)
+        }, len(equipment_df))
+    
+    def monitor_drift(self, **options) -> FeatureDriftMonitor:
+        """Attach a drift monitor that observes the scaled features of every score() call."""
+        self.drift_monitor = FeatureDriftMonitor('failure_predictor', self.scaler, self.reference_histogram, **options)
+        return self.drift_monitor
+    
     def predict(self, equipment_df: pd.DataFrame, readings_df: pd.DataFrame = None) -> Dict[str, Any]:
         """Predict failure probability for equipment."""
-        features = self.prepare_features(equipment_df, readings_df)
-        scaled_features = self.scaler.transform(features)
-        
-        # Get probability predictions
-        probabilities = self.model.predict_proba(scaled_features)[:, 1]
-        predictions = self.model.predict(scaled_features)
+        results = self.score(equipment_df, readings_df)
         
         return {
             'equipment_id': equipment_df['id'].tolist() if 'id' in equipment_df.columns else list(range(len(equipment_df))),
-            'failure_probability': probabilities.tolist(),
-            'will_fail': predictions.tolist(),
-            'risk_level': [
-                'critical' if p > 0.8 else 'high' if p > 0.6 else 'medium' if p > 0.4 else 'low'
-                for p in probabilities
-            ]
+            'failure_probability': results['failure_probability'].tolist(),
+            'will_fail': results['will_fail'].tolist(),
+            'risk_level': results['risk_level'].tolist()
         }
     
     def save(self, path: str = 'models/failure_predictor.joblib') -> None:
@@ -161,7 +400,11 @@ class FailurePredictor:
         joblib.dump({
             'model': self.model,
             'scaler': self.scaler,
-            'feature_columns': self.feature_columns
+            'feature_columns': self.feature_columns,
+            'attribute_store': self.attribute_store,
+            'reference_histogram': self.reference_histogram,
+            'params': self.params,
+            'tuning': self.tuning
         }, path)
         print(f"✅ Model saved to {path}")
     
@@ -169,10 +412,12 @@ class FailurePredictor:
     def load(cls, path: str = 'models/failure_predictor.joblib') -> 'FailurePredictor':
         """Load model from disk."""
         data = joblib.load(path)
-        predictor = cls()
+        predictor = cls(attribute_store=data.get('attribute_store'), params=data.get('params'))
         predictor.model = data['model']
         predictor.scaler = data['scaler']
         predictor.feature_columns = data['feature_columns']
+        predictor.reference_histogram = data.get('reference_histogram')
+        predictor.tuning = data.get('tuning')
         return predictor
 
 
@@ -185,6 +430,7 @@ if __name__ == '__main__':
     # Load sample data
     data_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'sample')
     transformers_path = os.path.join(data_dir, 'transformers.csv')
+    attributes_path = os.path.join(data_dir, 'equipment_attributes.csv')
     readings_path = os.path.join(data_dir, 'meter_readings.parquet')
     
     if not os.path.exists(transformers_path):
@@ -202,8 +448,14 @@ if __name__ == '__main__':
         readings = pd.read_parquet(readings_path)
         print(f"   Loaded {len(readings):,} readings")
     
+    attribute_store = None
+    if os.path.exists(attributes_path):
+        print(f"Loading equipment attributes from {attributes_path}...")
+        attribute_store = EquipmentAttributeStore.load(attributes_path)
+        print(f"   Loaded attributes for {len(attribute_store)} transformers")
+    
     # Train model
-    predictor = FailurePredictor()
+    predictor = FailurePredictor(attribute_store)
     predictor.train(transformers, readings)
     
     # Save model
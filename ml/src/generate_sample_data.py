@@ -135,6 +135,19 @@ def generate_transformers(num_transformers: int = 50) -> pd.DataFrame:
     return pd.DataFrame(transformers)
 
 
+def generate_equipment_attributes(transformers: pd.DataFrame) -> pd.DataFrame:
+    """Generate maintenance log and failure history per transformer."""
+    
+    today = pd.Timestamp(datetime.now().date())
+    months_ago = np.random.uniform(1, 24, len(transformers))
+    
+    return pd.DataFrame({
+        'transformer_id': transformers['id'],
+        'last_maintenance_date': (today - pd.to_timedelta(months_ago * 30.44, unit='D')).date,
+        'failure_history_count': np.random.poisson(0.5, len(transformers))
+    })
+
+
 def main():
     print("=" * 60)
     print("RED ENERGY METERS - SAMPLE DATA GENERATION")
@@ -166,6 +179,13 @@ def main():
     print(f"   ✅ Generated {len(transformers):,} transformers")
     print(f"   Saved to: {transformers_path}")
     
+    print("\n4. Generating equipment attributes...")
+    attributes = generate_equipment_attributes(transformers)
+    attributes_path = os.path.join(output_dir, 'equipment_attributes.csv')
+    attributes.to_csv(attributes_path, index=False)
+    print(f"   ✅ Generated attributes for {len(attributes):,} transformers")
+    print(f"   Saved to: {attributes_path}")
+    
     print("\n" + "=" * 60)
     print("SAMPLE DATA GENERATION COMPLETE")
     print("=" * 60)
@@ -173,6 +193,7 @@ def main():
     print(f"  - meter_readings.parquet ({len(readings):,} readings)")
     print(f"  - customers.csv ({len(customers):,} customers)")
     print(f"  - transformers.csv ({len(transformers):,} transformers)")
+    print(f"  - equipment_attributes.csv ({len(attributes):,} transformers)")
     
     # Show summary statistics
     print("\n📊 Data Summary:")
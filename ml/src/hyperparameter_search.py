@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Hyperparameter search for FailurePredictor and CustomerSegmenter.
+
+Features are prepared and scaled once, then copied into shared memory so
+every worker of the process pool reads the same matrices without pickling
+or re-preparing them. Candidate configurations are compared by successive
+halving: every candidate is fitted on a small stratified share of the
+training rows, the best 1/eta move on to a share eta times larger, and so
+on until the survivors are fitted on all rows and the best one wins.
+
+    rung 0: 16 candidates on 1/9 of the rows  -> keep 6
+    rung 1:  6 candidates on 1/3 of the rows  -> keep 2
+    rung 2:  2 candidates on all rows         -> winner
+
+The winner is refitted on the cached features and saved; the search
+(candidates, rung scores, timings) is stored in the artifact's 'tuning'.
+
+Metrics: validation log-loss for the failure predictor (lower is better),
+silhouette on a fixed sample of meters for the segmenter (higher is better).
+
+The segmenter keeps its cluster count unless --tune-clusters is given:
+segment names are assigned per cluster index, and silhouette tends to favour
+fewer clusters, so a tuned count changes the segment taxonomy.
+
+Usage:
+    python src/hyperparameter_search.py failure --candidates 16 --workers 4
+    python src/hyperparameter_search.py segmenter
+    python src/hyperparameter_search.py segmenter --tune-clusters --candidates 12
+"""
+
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context, shared_memory
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+from resource_governor import current_threads, governor, task
+
+SEARCH_SPACES = {
+    'failure': {
+        'n_estimators': [100, 200, 400],
+        'max_depth': [3, 4, 6, 8],
+        'learning_rate': [0.05, 0.1, 0.2],
+        'subsample': [0.8, 1.0]
+    },
+    'segmenter': {
+        'n_init': [5, 10, 20, 40]
+    }
+}
+# Cluster counts tried when the segmenter search may change the taxonomy
+CLUSTER_COUNTS = [8, 10, 12, 14, 16]
+METRICS = {'failure': ('logloss', False), 'segmenter': ('silhouette', True)}
+
+DEFAULT_CANDIDATES = 16
+DEFAULT_ETA = 3
+# Smallest share of rows a first-rung fit may use
+MIN_ROWS = 200
+# Meters the silhouette is computed on (it is quadratic in rows)
+SILHOUETTE_ROWS = 5_000
+
+# Views of the shared matrices inside a worker process
+_arrays: Dict[str, np.ndarray] = {}
+_blocks: List[shared_memory.SharedMemory] = []
+_threads = 1
+
+
+@contextmanager
+def shared_arrays(arrays: Dict[str, np.ndarray]):
+    """Copy arrays into shared memory; yields the (name, shape, dtype) specs workers attach to."""
+    blocks, specs = [], {}
+    try:
+        for key, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            specs[key] = (block.name, array.shape, array.dtype.str)
+        yield specs
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _attach(specs: Dict[str, tuple], threads: int) -> None:
+    """Pool initializer: map the shared matrices into this worker."""
+    global _threads
+    _threads = threads
+    for key, (name, shape, dtype) in specs.items():
+        # Spawned workers share the parent's resource tracker, so the parent's unlink covers them
+        block = shared_memory.SharedMemory(name=name)
+        _blocks.append(block)
+        _arrays[key] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+
+
+def stratified_order(labels: np.ndarray, seed: int = 42) -> np.ndarray:
+    """Row permutation whose every prefix keeps the label proportions of the whole."""
+    rng = np.random.default_rng(seed)
+    codes, counts = np.unique(labels, return_inverse=True, return_counts=True)[1:]
+    rank = np.empty(len(labels))
+    for code in range(len(counts)):
+        rows = np.flatnonzero(codes == code)
+        rank[rows] = (rng.permutation(len(rows)) + rng.random(len(rows))) / len(rows)
+    return np.argsort(rank, kind='stable')
+
+
+def sample_candidates(space: Dict[str, Sequence], n_candidates: int, defaults: Dict[str, Any],
+                      seed: int = 42) -> List[Dict[str, Any]]:
+    """The default configuration plus up to n_candidates - 1 distinct random ones from the grid."""
+    from sklearn.model_selection import ParameterGrid
+
+    grid = list(ParameterGrid(space))
+    rng = np.random.default_rng(seed)
+    default = {k: defaults[k] for k in space if k in defaults}
+    candidates = [default] if default else []
+    for i in rng.permutation(len(grid)):
+        if len(candidates) >= n_candidates:
+            break
+        if grid[i] != default:
+            candidates.append(grid[i])
+    return candidates
+
+
+def rung_schedule(n_candidates: int, eta: int, n_rows: int) -> List[Dict[str, float]]:
+    """Candidates and row share per rung; the last rung uses every row."""
+    counts = [n_candidates]
+    while counts[-1] > 1:
+        counts.append(math.ceil(counts[-1] / eta))
+    counts = counts[:-1] or [1]
+    floor = min(1.0, MIN_ROWS / max(n_rows, 1))
+    last = len(counts) - 1
+    return [{'candidates': n, 'fraction': max(floor, float(eta) ** (r - last))} for r, n in enumerate(counts)]
+
+
+def evaluate_failure(params: Dict[str, Any], n_rows: int) -> float:
+    """Validation log-loss of an XGBoost fit on the first n_rows training rows."""
+    from sklearn.metrics import log_loss
+    from xgboost import XGBClassifier
+
+    X, y = _arrays['X_train'][:n_rows], _arrays['y_train'][:n_rows]
+    model = XGBClassifier(**params, random_state=42, eval_metric='logloss', early_stopping_rounds=20,
+                          n_jobs=current_threads(), verbosity=0)
+    model.fit(X, y, eval_set=[(_arrays['X_val'], _arrays['y_val'])], verbose=False)
+    return float(log_loss(_arrays['y_val'], model.predict_proba(_arrays['X_val'])[:, 1], labels=[0, 1]))
+
+
+def evaluate_segmenter(params: Dict[str, Any], n_rows: int) -> float:
+    """Silhouette of the fixed evaluation sample under a K-means fit on the first n_rows meters."""
+    from sklearn.cluster import KMeans
+    from sklearn.metrics import silhouette_score
+
+    model = KMeans(**params, random_state=42, max_iter=500).fit(_arrays['X'][:n_rows])
+    labels = model.predict(_arrays['X_eval'])
+    if len(np.unique(labels)) < 2:
+        return -1.0
+    return float(silhouette_score(_arrays['X_eval'], labels))
+
+
+EVALUATORS = {'failure': evaluate_failure, 'segmenter': evaluate_segmenter}
+
+
+def _evaluate(kind: str, params: Dict[str, Any], n_rows: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    with task(f'hyperparameter_search.{kind}', _threads):
+        value = EVALUATORS[kind](params, n_rows)
+    return {'metric': value, 'seconds': round(time.perf_counter() - start, 4)}
+
+
+def successive_halving(kind: str, arrays: Dict[str, np.ndarray], candidates: List[Dict[str, Any]],
+                       n_rows: int, eta: int = DEFAULT_ETA, workers: int = None) -> Dict[str, Any]:
+    """
+    Race candidates on growing row shares, keeping the best 1/eta each rung.
+
+    Args:
+        kind: 'failure' or 'segmenter' (picks evaluator and metric)
+        arrays: Cached matrices the evaluator reads; rows are pre-shuffled so
+            that every prefix is a fair sample
+        candidates: Parameter dicts to compare
+        n_rows: Training rows available to the last rung
+        eta: Survivors are divided (and row shares multiplied) by eta per rung
+        workers: Pool processes (default: the governor's thread allowance);
+            each gets an equal share of the threads
+
+    Returns the tuning record: best_params, metric, candidates with per-rung
+    scores, rung timings and total search_seconds.
+    """
+    metric, maximize = METRICS[kind]
+    workers = max(1, min(workers or governor.total_threads, len(candidates)))
+    threads = max(1, governor.total_threads // workers)
+    history = [{'params': params, 'scores': []} for params in candidates]
+    alive = list(range(len(candidates)))
+    rungs = []
+
+    start = time.perf_counter()
+    with shared_arrays(arrays) as specs:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                                 initializer=_attach, initargs=(specs, threads)) as pool:
+            for rung, plan in enumerate(rung_schedule(len(candidates), eta, n_rows)):
+                rows = max(1, int(round(plan['fraction'] * n_rows)))
+                rung_start = time.perf_counter()
+                results = list(pool.map(_evaluate, [kind] * len(alive),
+                                        [history[i]['params'] for i in alive], [rows] * len(alive)))
+                for i, result in zip(alive, results):
+                    history[i]['scores'].append({'rung': rung, 'rows': rows, **result})
+
+                values = np.array([result['metric'] for result in results])
+                ranked = np.argsort(-values if maximize else values, kind='stable')
+                best = results[ranked[0]]['metric']
+                rungs.append({'rung': rung, 'rows': rows, 'candidates': len(alive), 'best_metric': best,
+                              'seconds': round(time.perf_counter() - rung_start, 4)})
+                print(f"   Rung {rung}: {len(alive)} candidates on {rows:,} rows, best {metric} {best:.4f} "
+                      f"({rungs[-1]['seconds']:.1f}s)")
+                alive = [alive[j] for j in ranked[:max(1, math.ceil(len(alive) / eta))]]
+
+    winner = history[alive[0]]
+    return {
+        'best_params': winner['params'],
+        'best_metric': winner['scores'][-1]['metric'],
+        'metric': metric,
+        'eta': eta,
+        'workers': workers,
+        'threads_per_worker': threads,
+        'candidates': history,
+        'rungs': rungs,
+        'candidate_seconds': round(sum(s['seconds'] for h in history for s in h['scores']), 4),
+        'search_seconds': round(time.perf_counter() - start, 4)
+    }
+
+
+def tune_failure_predictor(equipment_df: pd.DataFrame, readings_df: pd.DataFrame = None,
+                           labels: np.ndarray = None, attribute_store=None,
+                           n_candidates: int = DEFAULT_CANDIDATES, eta: int = DEFAULT_ETA,
+                           workers: int = None, space: Dict[str, Sequence] = None):
+    """Search XGBoost settings on features prepared once; returns the predictor refitted with the winner."""
+    from sklearn.model_selection import train_test_split
+    from failure_predictor import FailurePredictor
+    from drift_monitor import feature_histogram
+
+    predictor = FailurePredictor(attribute_store)
+    start = time.perf_counter()
+    with stage('hyperparameter_search', 'failure.prepare_features', len(equipment_df)):
+        features = predictor.prepare_features(equipment_df, readings_df)
+        scaled = predictor.scaler.fit_transform(features)
+        predictor.reference_histogram = feature_histogram(scaled)
+    if labels is None:
+        labels = predictor.generate_training_labels(equipment_df)
+    labels = np.asarray(labels)
+    prepare_seconds = time.perf_counter() - start
+
+    # Same split as FailurePredictor.fit_features, so the search scores the held-out rows it will use
+    X_train, X_val, y_train, y_val = train_test_split(scaled, labels, test_size=0.2, random_state=42, stratify=labels)
+    order = stratified_order(y_train)
+    arrays = {'X_train': X_train[order], 'y_train': y_train[order], 'X_val': X_val, 'y_val': y_val}
+
+    candidates = sample_candidates(space or SEARCH_SPACES['failure'], n_candidates, predictor.params)
+    print(f"Searching {len(candidates)} XGBoost configurations on {len(X_train):,} training rows...")
+    with stage('hyperparameter_search', 'failure.search', len(X_train)):
+        tuning = successive_halving('failure', arrays, candidates, len(X_train), eta, workers)
+
+    predictor.params.update(tuning['best_params'])
+    fit_start = time.perf_counter()
+    with stage('hyperparameter_search', 'failure.fit', len(scaled)):
+        predictor.fit_features(scaled, labels)
+    predictor.tuning = {**tuning, 'prepare_seconds': round(prepare_seconds, 4),
+                        'fit_seconds': round(time.perf_counter() - fit_start, 4)}
+    return predictor
+
+
+def tune_customer_segmenter(readings_df: pd.DataFrame, n_candidates: int = DEFAULT_CANDIDATES,
+                            eta: int = DEFAULT_ETA, workers: int = None, space: Dict[str, Sequence] = None,
+                            tune_clusters: bool = False):
+    """
+    Search K-means settings on features prepared once; returns the segmenter refitted with the winner.
+    n_clusters stays at the segmenter's default unless tune_clusters is set; the
+    tuning record's segment_names_apply is False when the count moves off SEGMENT_NAMES.
+    """
+    from customer_segmenter import CustomerSegmenter
+    from drift_monitor import feature_histogram
+
+    segmenter = CustomerSegmenter()
+    start = time.perf_counter()
+    with stage('hyperparameter_search', 'segmenter.prepare_features', len(readings_df)):
+        features = segmenter.prepare_features(readings_df)
+        scaled = segmenter.scaler.fit_transform(features)
+        segmenter.reference_histogram = feature_histogram(scaled)
+    prepare_seconds = time.perf_counter() - start
+
+    shuffled = scaled[np.random.default_rng(42).permutation(len(scaled))]
+    arrays = {'X': shuffled, 'X_eval': shuffled[:SILHOUETTE_ROWS]}
+
+    space = dict(space or SEARCH_SPACES['segmenter'])
+    if tune_clusters:
+        space.setdefault('n_clusters', CLUSTER_COUNTS)
+    else:
+        space.pop('n_clusters', None)
+    if 'n_clusters' in space:
+        space['n_clusters'] = [k for k in space['n_clusters'] if k < len(scaled)] or [min(2, len(scaled))]
+    defaults = {'n_clusters': segmenter.n_clusters, 'n_init': segmenter.n_init}
+    candidates = sample_candidates(space, n_candidates, defaults)
+    candidates = [c for c in candidates if c.get('n_clusters', segmenter.n_clusters) < len(scaled)]
+    print(f"Searching {len(candidates)} K-means configurations on {len(scaled):,} meters...")
+    with stage('hyperparameter_search', 'segmenter.search', len(scaled)):
+        tuning = successive_halving('segmenter', arrays, candidates, len(scaled), eta, workers)
+
+    best = {**defaults, **tuning['best_params']}
+    segmenter.n_clusters, segmenter.n_init = best['n_clusters'], best['n_init']
+    fit_start = time.perf_counter()
+    with stage('hyperparameter_search', 'segmenter.fit', len(scaled)):
+        segmenter.fit_features(features, scaled)
+    names_apply = segmenter.n_clusters == len(CustomerSegmenter.SEGMENT_NAMES)
+    if not names_apply:
+        print(f"⚠️  {segmenter.n_clusters} clusters instead of {len(CustomerSegmenter.SEGMENT_NAMES)}: "
+              f"segment names no longer describe the clusters")
+    segmenter.tuning = {**tuning, 'prepare_seconds': round(prepare_seconds, 4),
+                        'fit_seconds': round(time.perf_counter() - fit_start, 4),
+                        'segment_names_apply': names_apply}
+    return segmenter
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune model hyperparameters by successive halving')
+    parser.add_argument('model', choices=['failure', 'segmenter'])
+    parser.add_argument('--candidates', type=int, default=DEFAULT_CANDIDATES)
+    parser.add_argument('--eta', type=int, default=DEFAULT_ETA)
+    parser.add_argument('--workers', type=int, help='Pool processes (default: available threads)')
+    parser.add_argument('--tune-clusters', action='store_true',
+                        help='Also search the segmenter cluster count (changes the segment taxonomy)')
+    parser.add_argument('--data-dir', default=os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'sample'))
+    parser.add_argument('--models-dir', default=os.path.join(os.path.dirname(__file__), '..', 'models'))
+    args = parser.parse_args()
+
+    readings_path = os.path.join(args.data_dir, 'meter_readings.parquet')
+    readings = pd.read_parquet(readings_path) if os.path.exists(readings_path) else None
+
+    if args.model == 'failure':
+        from equipment_store import EquipmentAttributeStore
+
+        transformers_path = os.path.join(args.data_dir, 'transformers.csv')
+        if not os.path.exists(transformers_path):
+            print(f"❌ Data file not found: {transformers_path}")
+            exit(1)
+        attributes_path = os.path.join(args.data_dir, 'equipment_attributes.csv')
+        attribute_store = EquipmentAttributeStore.load(attributes_path) if os.path.exists(attributes_path) else None
+        model = tune_failure_predictor(pd.read_csv(transformers_path), readings, attribute_store=attribute_store,
+                                       n_candidates=args.candidates, eta=args.eta, workers=args.workers)
+        path = os.path.join(args.models_dir, 'failure_predictor.joblib')
+    else:
+        if readings is None:
+            print(f"❌ Data file not found: {readings_path}")
+            exit(1)
+        model = tune_customer_segmenter(readings, n_candidates=args.candidates, eta=args.eta, workers=args.workers,
+                                        tune_clusters=args.tune_clusters)
+        path = os.path.join(args.models_dir, 'customer_segmenter.joblib')
+
+    tuning = model.tuning
+    print(f"\n✅ Best {tuning['metric']} {tuning['best_metric']:.4f} with {tuning['best_params']}")
+    print(f"⏱️  prepare {tuning['prepare_seconds']:.1f}s, search {tuning['search_seconds']:.1f}s "
+          f"({tuning['candidate_seconds']:.1f}s of fits on {tuning['workers']} workers), fit {tuning['fit_seconds']:.1f}s")
+    model.save(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Collapse flagged readings into incidents.
+
+A voltage event on a feeder flags many consecutive readings on many meters.
+Instead of one alert per flagged reading, flagged readings are grouped into
+incidents: runs of readings on the same asset where consecutive readings
+are at most `max_gap` apart. Runs are found on sorted arrays, with no
+per-row Python:
+
+    sort by (asset, time) -> a run starts where the asset changes or the
+    time step exceeds max_gap -> reduceat over run boundaries
+
+Readings with a transformer_id are also grouped per transformer. A
+transformer run that spans several meters becomes one transformer incident
+and absorbs the meter incidents inside it; every other meter run stays a
+meter incident.
+
+Usage:
+    python src/incident_builder.py scored.parquet --meter-map meter_transformers.csv
+"""
+
+import argparse
+import os
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_GAP = '30min'
+MIN_TRANSFORMER_METERS = 2
+
+INCIDENT_COLUMNS = ['asset_type', 'asset_id', 'start_time', 'end_time', 'peak_time',
+                    'peak_score', 'mean_score', 'reading_count', 'meter_count']
+
+
+def find_runs(keys: np.ndarray, times: np.ndarray, max_gap_ns: int):
+    """
+    Sort by (key, time) and split into runs.
+    Returns (order, run_starts, run_id): the sort order, the sorted position
+    where each run begins and the run of every sorted row.
+    """
+    by_time = np.argsort(times, kind='stable')
+    order = by_time[np.argsort(keys[by_time], kind='stable')]
+    keys, times = keys[order], times[order]
+    boundary = np.ones(len(order), dtype=bool)
+    boundary[1:] = (keys[1:] != keys[:-1]) | (np.diff(times) > max_gap_ns)
+    run_starts = np.flatnonzero(boundary)
+    return order, run_starts, np.cumsum(boundary) - 1
+
+
+def summarize_runs(order: np.ndarray, run_starts: np.ndarray, run_id: np.ndarray,
+                   keys: np.ndarray, times: np.ndarray, scores: np.ndarray) -> Dict[str, np.ndarray]:
+    """Per-run key, start/end/peak time, peak/mean score and size, from find_runs() output."""
+    keys, times, scores = keys[order], times[order], scores[order]
+    counts = np.diff(np.append(run_starts, len(order)))
+    peak_score = np.maximum.reduceat(scores, run_starts)
+    # First row of each run that reaches the run's peak score
+    at_peak = np.flatnonzero(scores == np.repeat(peak_score, counts))
+    first = np.ones(len(at_peak), dtype=bool)
+    first[1:] = run_id[at_peak][1:] != run_id[at_peak][:-1]
+    peak = at_peak[first]
+    return {
+        'key': keys[run_starts],
+        'start': times[run_starts],
+        'end': times[run_starts + counts - 1],
+        'peak_time': times[peak],
+        'peak_score': peak_score,
+        'mean_score': np.add.reduceat(scores, run_starts) / counts,
+        'count': counts
+    }
+
+
+def build_incidents(flagged: pd.DataFrame, max_gap: str = DEFAULT_MAX_GAP,
+                    min_transformer_meters: int = MIN_TRANSFORMER_METERS) -> pd.DataFrame:
+    """
+    Group flagged readings into meter and transformer incidents.
+
+    Args:
+        flagged: Flagged readings with meter_id, reading_time, anomaly_score and
+            optionally transformer_id (rows without one only form meter incidents)
+        max_gap: Largest time step between consecutive readings of one incident
+        min_transformer_meters: Meters a transformer run needs to become a
+            transformer incident
+
+    Returns one row per incident with INCIDENT_COLUMNS, ordered by start time.
+    """
+    if flagged.empty:
+        return pd.DataFrame(columns=INCIDENT_COLUMNS)
+
+    reading_time = pd.to_datetime(flagged['reading_time'])
+    times = reading_time.to_numpy().view(np.int64) if reading_time.dt.tz is None else \
+        reading_time.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy().view(np.int64)
+    meters = flagged['meter_id'].to_numpy(dtype=np.int64)
+    scores = flagged['anomaly_score'].to_numpy(dtype=float)
+    max_gap_ns = pd.Timedelta(max_gap).value
+
+    order, run_starts, run_id = find_runs(meters, times, max_gap_ns)
+    meter_runs = summarize_runs(order, run_starts, run_id, meters, times, scores)
+    meter_runs['meters'] = np.ones(len(run_starts), dtype=np.int64)
+    absorbed = np.zeros(len(run_starts), dtype=bool)
+
+    transformer_runs = None
+    if 'transformer_id' in flagged.columns:
+        transformer = flagged['transformer_id'].to_numpy(dtype=float)
+        known = np.flatnonzero(~np.isnan(transformer))
+        if len(known):
+            t_keys = transformer[known].astype(np.int64)
+            t_order, t_starts, t_run = find_runs(t_keys, times[known], max_gap_ns)
+            transformer_runs = summarize_runs(t_order, t_starts, t_run, t_keys, times[known], scores[known])
+
+            # Distinct meters per transformer run
+            run_meters = meters[known][t_order]
+            by_meter = np.argsort(run_meters, kind='stable')
+            by_meter = by_meter[np.argsort(t_run[by_meter], kind='stable')]
+            first = np.ones(len(by_meter), dtype=bool)
+            first[1:] = (t_run[by_meter][1:] != t_run[by_meter][:-1]) | (run_meters[by_meter][1:] != run_meters[by_meter][:-1])
+            transformer_runs['meters'] = np.bincount(t_run[by_meter][first], minlength=len(t_starts))
+            storm = transformer_runs['meters'] >= min_transformer_meters
+
+            # A meter run lies inside one transformer run; absorb it when that run is a storm
+            run_of_row = np.empty(len(known), dtype=np.int64)
+            run_of_row[t_order] = t_run
+            transformer_run_of_row = np.full(len(flagged), -1)
+            transformer_run_of_row[known] = run_of_row
+            parent = transformer_run_of_row[order[run_starts]]
+            absorbed = (parent >= 0) & storm[np.maximum(parent, 0)]
+            transformer_runs = {k: v[storm] for k, v in transformer_runs.items()}
+
+    parts = [_incident_frame('smart_meter', {k: v[~absorbed] for k, v in meter_runs.items()}, reading_time)]
+    if transformer_runs is not None:
+        parts.append(_incident_frame('transformer', transformer_runs, reading_time))
+    incidents = pd.concat(parts, ignore_index=True)
+    return incidents.sort_values(['start_time', 'asset_type', 'asset_id'], ignore_index=True)
+
+
+def _incident_frame(asset_type: str, runs: Dict[str, np.ndarray], reading_time: pd.Series) -> pd.DataFrame:
+    def as_time(values):
+        stamps = pd.to_datetime(values)
+        return stamps.tz_localize('UTC').tz_convert(reading_time.dt.tz) if reading_time.dt.tz is not None else stamps
+
+    return pd.DataFrame({
+        'asset_type': asset_type,
+        'asset_id': runs['key'],
+        'start_time': as_time(runs['start']),
+        'end_time': as_time(runs['end']),
+        'peak_time': as_time(runs['peak_time']),
+        'peak_score': runs['peak_score'],
+        'mean_score': runs['mean_score'],
+        'reading_count': runs['count'],
+        'meter_count': runs['meters']
+    }, columns=INCIDENT_COLUMNS)
+
+
+def incidents_from_scores(results: pd.DataFrame, max_gap: str = DEFAULT_MAX_GAP,
+                          meter_map: pd.DataFrame = None, **options) -> pd.DataFrame:
+    """Incidents from scored readings (is_anomaly, anomaly_score), optionally mapping meters to transformers."""
+    flagged = results[results['is_anomaly'].to_numpy(dtype=bool)]
+    if meter_map is not None and 'transformer_id' not in flagged.columns:
+        mapping = meter_map.rename(columns={'id': 'meter_id'}) if 'meter_id' not in meter_map.columns else meter_map
+        transformer = mapping.drop_duplicates('meter_id', keep='last').set_index('meter_id')['transformer_id']
+        flagged = flagged.assign(transformer_id=transformer.reindex(flagged['meter_id']).to_numpy())
+    return build_incidents(flagged, max_gap, **options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Group scored readings into anomaly incidents')
+    parser.add_argument('scored', help='Parquet or CSV with meter_id, reading_time, anomaly_score, is_anomaly')
+    parser.add_argument('--meter-map', help='CSV with meter_id/id and transformer_id columns')
+    parser.add_argument('--max-gap', default=DEFAULT_MAX_GAP)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.scored):
+        print(f"❌ File not found: {args.scored}")
+        exit(1)
+    scored = pd.read_parquet(args.scored) if args.scored.endswith('.parquet') else pd.read_csv(args.scored)
+    meter_map = pd.read_csv(args.meter_map) if args.meter_map else None
+
+    incidents = incidents_from_scores(scored, args.max_gap, meter_map)
+    print(f"   {int(scored['is_anomaly'].sum()):,} flagged readings -> {len(incidents):,} incidents")
+    print(incidents.to_string(index=False, float_format=lambda v: f'{v:.3f}'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Stage-level instrumentation for model train/predict paths.
+
+Models wrap each stage (feature prep, scaling, fit, inference) in
+``stage(model, name, rows)``. Every stage records wall time, row count and
+RSS delta into a process-wide registry that can be exported as Prometheus
+text or JSON, written to a file, or served over HTTP.
+
+Environment variables:
+    REDMETERS_METRICS_PATH   Write metrics here at process exit (.json or .prom)
+    REDMETERS_PROFILE        'cprofile' to profile each stage with cProfile,
+                             'pyspy' to name the running thread after the
+                             current stage so py-spy dump/top shows it
+    REDMETERS_PROFILE_DIR    Where cProfile stats are dumped (default: ./profiles)
+"""
+
+import atexit
+import cProfile
+import json
+import os
+import platform
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+PROFILE_MODES = ('cprofile', 'pyspy')
+
+
+def current_rss_bytes() -> int:
+    """Current resident set size; falls back to peak RSS where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if platform.system() == 'Darwin' else peak * 1024
+
+
+class Instrumentation:
+    """Process-wide registry of per-stage timings, row counts and memory deltas."""
+
+    def __init__(self, profile_mode: Optional[str] = None, profile_dir: str = 'profiles'):
+        if profile_mode is not None and profile_mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{profile_mode}', expected one of {PROFILE_MODES}")
+        self.profile_mode = profile_mode
+        self.profile_dir = profile_dir
+        self.stats: Dict[tuple, Dict[str, float]] = {}
+        self._profilers: Dict[tuple, cProfile.Profile] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def from_env(cls) -> 'Instrumentation':
+        return cls(
+            profile_mode=os.environ.get('REDMETERS_PROFILE') or None,
+            profile_dir=os.environ.get('REDMETERS_PROFILE_DIR', 'profiles')
+        )
+
+    @contextmanager
+    def stage(self, model: str, name: str, rows: Optional[int] = None):
+        """
+        Time one stage of a model's train/predict path.
+        Yields a dict; set its 'rows' key inside the block if the count is only known later.
+        """
+        key = (model, name)
+        record = {'rows': rows}
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+
+        # Only the outermost stage is profiled, since cProfile cannot nest
+        profiler = self._start_profile(key) if depth == 0 else None
+        thread = threading.current_thread()
+        thread_name = thread.name
+        if self.profile_mode == 'pyspy':
+            thread.name = f'{model}:{name}'
+
+        rss_before = current_rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            rss_delta = current_rss_bytes() - rss_before
+            if profiler is not None:
+                profiler.disable()
+            thread.name = thread_name
+            self._local.depth = depth
+            self._record(key, elapsed, record['rows'], rss_delta)
+
+    def _start_profile(self, key: tuple) -> Optional[cProfile.Profile]:
+        if self.profile_mode != 'cprofile':
+            return None
+        with self._lock:
+            profiler = self._profilers.setdefault(key, cProfile.Profile())
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (e.g. an outer cProfile run) is already active
+            return None
+        return profiler
+
+    def _record(self, key: tuple, elapsed: float, rows: Optional[int], rss_delta: int) -> None:
+        with self._lock:
+            stat = self.stats.setdefault(key, {
+                'calls': 0, 'seconds_total': 0.0, 'seconds_max': 0.0, 'rows_total': 0,
+                'last_seconds': 0.0, 'last_rows': 0, 'last_memory_delta_bytes': 0,
+                'memory_delta_max_bytes': 0
+            })
+            stat['calls'] += 1
+            stat['seconds_total'] += elapsed
+            stat['seconds_max'] = max(stat['seconds_max'], elapsed)
+            stat['last_seconds'] = elapsed
+            stat['last_rows'] = rows or 0
+            stat['rows_total'] += rows or 0
+            stat['last_memory_delta_bytes'] = rss_delta
+            stat['memory_delta_max_bytes'] = max(stat['memory_delta_max_bytes'], rss_delta)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stats.clear()
+            self._profilers.clear()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Return one record per (model, stage) with its accumulated stats."""
+        with self._lock:
+            return [
+                {'model': model, 'stage': name, **stat}
+                for (model, name), stat in sorted(self.stats.items())
+            ]
+
+    def to_json(self) -> str:
+        return json.dumps({'generated_at': datetime.now().isoformat(), 'stages': self.snapshot()}, indent=2)
+
+    def to_prometheus(self) -> str:
+        """Render stats in the Prometheus text exposition format."""
+        metrics = [
+            ('redmeters_stage_calls_total', 'counter', 'Number of stage executions', 'calls'),
+            ('redmeters_stage_seconds_total', 'counter', 'Total wall time spent in stage', 'seconds_total'),
+            ('redmeters_stage_rows_total', 'counter', 'Total rows processed by stage', 'rows_total'),
+            ('redmeters_stage_last_seconds', 'gauge', 'Wall time of the most recent execution', 'last_seconds'),
+            ('redmeters_stage_seconds_max', 'gauge', 'Slowest execution of the stage', 'seconds_max'),
+            ('redmeters_stage_memory_delta_bytes', 'gauge', 'RSS change during the most recent execution',
+             'last_memory_delta_bytes'),
+        ]
+        snapshot = self.snapshot()
+        lines = []
+        for metric, kind, help_text, field in metrics:
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for record in snapshot:
+                labels = f'model="{record["model"]}",stage="{record["stage"]}"'
+                lines.append(f'{metric}{{{labels}}} {record[field]}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str) -> None:
+        """Write metrics to a file; '.prom' gets Prometheus text, anything else JSON."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(self.to_prometheus() if path.endswith('.prom') else self.to_json())
+
+    def dump_profiles(self) -> List[str]:
+        """Write accumulated cProfile stats, one .prof file per stage."""
+        paths = []
+        with self._lock:
+            profilers = dict(self._profilers)
+        if profilers:
+            os.makedirs(self.profile_dir, exist_ok=True)
+        for (model, name), profiler in profilers.items():
+            path = os.path.join(self.profile_dir, f'{model}.{name}.prof')
+            profiler.dump_stats(path)
+            paths.append(path)
+        return paths
+
+    def serve(self, port: int = 9464, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """Serve /metrics (Prometheus text) and /metrics.json from a background thread."""
+        instrumentation = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = instrumentation.to_prometheus(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, content_type = instrumentation.to_json(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                payload = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+        return server
+
+
+instrumentation = Instrumentation.from_env()
+stage = instrumentation.stage
+
+
+def _export_at_exit() -> None:
+    path = os.environ.get('REDMETERS_METRICS_PATH')
+    if path and instrumentation.stats:
+        instrumentation.write(path)
+    if instrumentation.profile_mode == 'cprofile':
+        instrumentation.dump_profiles()
+
+
+atexit.register(_export_at_exit)
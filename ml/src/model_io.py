@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Input readers for model scoring entry points.
+
+Arrow IPC (Feather v2 files or IPC streams) is the fast path: files are
+memory-mapped and converted to DataFrames without copying numeric columns.
+JSON records remain supported for callers that cannot produce Arrow.
+"""
+
+import io
+import json
+import sys
+from typing import BinaryIO, Union
+
+import pandas as pd
+import pyarrow as pa
+
+ARROW_FILE_MAGIC = b'ARROW1'
+ARROW_STREAM_CONTINUATION = b'\xff\xff\xff\xff'
+
+FORMATS = ('auto', 'arrow', 'arrow-stream', 'json')
+
+
+def table_to_frame(table: pa.Table) -> pd.DataFrame:
+    """
+    Convert an Arrow table to pandas, reusing Arrow buffers where possible.
+    Numeric and timestamp columns without nulls become zero-copy views.
+    """
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def detect_format(head: bytes) -> str:
+    if head.startswith(ARROW_FILE_MAGIC):
+        return 'arrow'
+    if head.startswith(ARROW_STREAM_CONTINUATION):
+        return 'arrow-stream'
+    return 'json'
+
+
+def read_arrow_file(path: str, memory_map: bool = True) -> pd.DataFrame:
+    """Read an Arrow IPC / Feather v2 file, memory-mapped by default."""
+    source = pa.memory_map(path, 'r') if memory_map else pa.OSFile(path, 'rb')
+    with source:
+        table = pa.ipc.open_file(source).read_all()
+    return table_to_frame(table)
+
+
+def read_arrow_stream(stream: Union[BinaryIO, pa.NativeFile]) -> pd.DataFrame:
+    """Read an Arrow IPC stream (e.g. piped through stdin)."""
+    return table_to_frame(pa.ipc.open_stream(stream).read_all())
+
+
+def read_json_records(stream: BinaryIO) -> pd.DataFrame:
+    """Read a JSON array of row objects."""
+    return pd.DataFrame(json.load(stream))
+
+
+def read_frame(source: str = '-', fmt: str = 'auto', memory_map: bool = True) -> pd.DataFrame:
+    """
+    Read a scoring batch from a file path or '-' (stdin).
+
+    Args:
+        source: File path, or '-' for stdin
+        fmt: 'arrow' (IPC file / Feather), 'arrow-stream', 'json' or 'auto'
+             to detect from the first bytes
+        memory_map: Memory-map Arrow files instead of reading them into memory
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown input format '{fmt}', expected one of {FORMATS}")
+
+    if source == '-':
+        stream = sys.stdin.buffer
+        if fmt == 'auto':
+            # Peek without consuming so the reader sees the whole stream
+            stream = io.BufferedReader(stream) if not hasattr(stream, 'peek') else stream
+            fmt = detect_format(stream.peek(len(ARROW_FILE_MAGIC)))
+        if fmt == 'arrow':
+            # IPC files need random access, so buffer stdin first
+            return table_to_frame(pa.ipc.open_file(pa.BufferReader(stream.read())).read_all())
+        if fmt == 'arrow-stream':
+            return read_arrow_stream(stream)
+        return read_json_records(stream)
+
+    if fmt == 'auto':
+        with open(source, 'rb') as f:
+            fmt = detect_format(f.read(len(ARROW_FILE_MAGIC)))
+    if fmt == 'arrow':
+        return read_arrow_file(source, memory_map=memory_map)
+    with open(source, 'rb') as f:
+        if fmt == 'arrow-stream':
+            return read_arrow_stream(pa.PythonFile(f, mode='r'))
+        return read_json_records(f)
+
+
+def write_arrow_file(df: pd.DataFrame, path: str) -> None:
+    """Write a DataFrame as an uncompressed Arrow IPC file for memory-mapped reads."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Startup profiling and model warmup for Red Energy Meters ML serving.
+
+Model modules import their heavy dependencies (sklearn estimators, xgboost,
+prophet) on first use, so a process only pays for the models it loads.
+This script reports where startup time goes and pre-loads models so a
+serving process can report ready only once every model has scored a batch.
+
+Usage:
+    python src/model_warmup.py                 # load + test-score all models
+    python src/model_warmup.py --profile       # also time imports per module
+    python src/model_warmup.py --models anomaly_detector --json
+"""
+
+if __name__ == '__main__':
+    # Export thread limits before numpy/sklearn/xgboost load their native pools
+    from resource_governor import configure_from_env
+    configure_from_env()
+
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from resource_governor import governor
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(SRC_DIR, '..', 'models')
+
+# Artifact name -> (module, class)
+MODEL_ARTIFACTS = {
+    'anomaly_detector': ('anomaly_detector', 'AnomalyDetector'),
+    'customer_segmenter': ('customer_segmenter', 'CustomerSegmenter'),
+    'failure_predictor': ('failure_predictor', 'FailurePredictor'),
+    'demand_forecaster': ('demand_forecaster', 'DemandForecaster'),
+}
+
+# Third-party dependencies first, then the project modules that use them
+PROFILED_MODULES = [
+    'numpy', 'pandas', 'joblib', 'sklearn', 'xgboost', 'prophet',
+    'anomaly_detector', 'customer_segmenter', 'failure_predictor',
+    'demand_forecaster', 'train_all_models',
+]
+
+
+def profile_imports(modules: List[str] = None) -> Dict[str, Optional[float]]:
+    """
+    Time a cold import of each module in a fresh interpreter.
+    Returns seconds per module, or None if the module is not installed.
+    """
+    timings = {}
+    for module in modules or PROFILED_MODULES:
+        code = (
+            "import sys, time\n"
+            f"sys.path.insert(0, {SRC_DIR!r})\n"
+            "start = time.perf_counter()\n"
+            f"import {module}\n"
+            "print(time.perf_counter() - start)\n"
+        )
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+        timings[module] = float(result.stdout.strip()) if result.returncode == 0 else None
+    return timings
+
+
+def sample_readings(num_meters: int = 2) -> pd.DataFrame:
+    """Build one full day of 30-minute readings per meter for test scoring."""
+    times = pd.date_range('2025-01-06', periods=48, freq='30min')
+    n = num_meters * len(times)
+    hours = np.tile(times.hour.to_numpy(), num_meters)
+    consumption = 0.2 + 0.1 * np.sin(2 * np.pi * hours / 24) + 0.1
+    return pd.DataFrame({
+        'meter_id': np.repeat(np.arange(1, num_meters + 1), len(times)),
+        'reading_time': np.tile(times, num_meters),
+        'consumption_kwh': consumption,
+        'demand_kw': consumption * 2,
+        'voltage': np.full(n, 230.0),
+        'power_factor': np.full(n, 0.95),
+        'quality_flag': 'normal'
+    })
+
+
+def sample_equipment(num_transformers: int = 2) -> pd.DataFrame:
+    """Build a minimal transformer batch for test scoring."""
+    return pd.DataFrame({
+        'id': np.arange(1, num_transformers + 1),
+        'capacity_kva': np.full(num_transformers, 500),
+        'age_years': np.full(num_transformers, 10.0)
+    })
+
+
+def test_score(name: str, model: Any) -> None:
+    """Run one small batch through a loaded model."""
+    if name == 'demand_forecaster':
+        model.forecast(periods=1)
+    elif name == 'failure_predictor':
+        model.score(sample_equipment())
+    else:
+        model.score(sample_readings())
+
+
+def load_model(name: str, models_dir: str = MODELS_DIR) -> Tuple[Any, float]:
+    """Import a model's module, load its artifact and return (model, seconds)."""
+    module_name, class_name = MODEL_ARTIFACTS[name]
+    start = time.perf_counter()
+    model_class = getattr(importlib.import_module(module_name), class_name)
+    model = model_class.load(os.path.join(models_dir, f'{name}.joblib'))
+    return model, time.perf_counter() - start
+
+
+def warmup_models(models_dir: str = MODELS_DIR, names: List[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Load and test-score models before a serving process reports ready.
+
+    Returns:
+        (models, report) where models maps artifact name to loaded model and
+        report holds load/first-score timings and whether all models are ready.
+    """
+    models = {}
+    report = {'models': {}, 'ready': True}
+
+    for name in names or list(MODEL_ARTIFACTS):
+        path = os.path.join(models_dir, f'{name}.joblib')
+        if not os.path.exists(path):
+            report['models'][name] = {'status': 'missing', 'path': path}
+            report['ready'] = False
+            continue
+
+        try:
+            model, load_seconds = load_model(name, models_dir)
+            start = time.perf_counter()
+            with governor.task(f'{name}.warmup'):
+                test_score(name, model)
+            score_seconds = time.perf_counter() - start
+        except Exception as e:
+            report['models'][name] = {'status': 'error', 'error': str(e)}
+            report['ready'] = False
+            continue
+
+        models[name] = model
+        report['models'][name] = {
+            'status': 'ready',
+            'load_seconds': round(load_seconds, 4),
+            'first_score_seconds': round(score_seconds, 4),
+            'size_mb': round(os.path.getsize(path) / (1024 * 1024), 2)
+        }
+
+    return models, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile ML startup and warm up models')
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--models', nargs='+', choices=list(MODEL_ARTIFACTS), help='Models to warm up (default: all)')
+    parser.add_argument('--profile', action='store_true', help='Also time cold imports per module')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    report = {}
+    if args.profile:
+        report['import_seconds'] = profile_imports()
+
+    _, warmup = warmup_models(args.models_dir, args.models)
+    report.update(warmup)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        sys.exit(0 if report['ready'] else 1)
+
+    print("=" * 60)
+    print("ML STARTUP PROFILE")
+    print("=" * 60)
+
+    if 'import_seconds' in report:
+        print("\n⏱️  Cold import time per module:")
+        for module, seconds in report['import_seconds'].items():
+            timing = f"{seconds:.3f}s" if seconds is not None else "not installed"
+            print(f"   {module}: {timing}")
+
+    print("\n📦 Model warmup:")
+    for name, info in report['models'].items():
+        if info['status'] == 'ready':
+            print(f"   ✅ {name}: load {info['load_seconds']:.3f}s, "
+                  f"first score {info['first_score_seconds']:.3f}s ({info['size_mb']:.2f} MB)")
+        elif info['status'] == 'missing':
+            print(f"   ⚠️  {name}: artifact not found at {info['path']}")
+        else:
+            print(f"   ❌ {name}: {info['error']}")
+
+    print(f"\n{'✅ Ready' if report['ready'] else '❌ Not ready'}")
+    sys.exit(0 if report['ready'] else 1)
+
+
+if __name__ == '__main__':
+    main()
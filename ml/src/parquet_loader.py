@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Streaming Parquet-to-database bulk loader for meter readings.
+Reads Parquet row groups in batches and loads them with PostgreSQL COPY,
+skipping readings that already exist for the same (meter_id, reading_time).
+
+A SQLite database can stand in for PostgreSQL (sqlite:///path.db), which
+keeps the loader testable without a database server.
+
+Usage:
+    python src/parquet_loader.py data/sample/meter_readings.parquet
+    python src/parquet_loader.py readings.parquet --database-url sqlite:///local.db --json
+"""
+
+import argparse
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+from typing import Dict, Any, Iterator
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+READING_COLUMNS = [
+    'meter_id', 'reading_time', 'consumption_kwh', 'demand_kw',
+    'voltage', 'power_factor', 'quality_flag'
+]
+DEDUPE_KEY = ['meter_id', 'reading_time']
+STAGING_TABLE = 'meter_readings_staging'
+
+
+def connect(database_url: str):
+    """Open a PostgreSQL connection, or SQLite for sqlite:/// URLs."""
+    if database_url.startswith('sqlite:///'):
+        return sqlite3.connect(database_url[len('sqlite:///'):])
+    import psycopg2
+    return psycopg2.connect(database_url)
+
+
+class ParquetBulkLoader:
+    """Loads meter readings from Parquet into the meter_readings table in batches."""
+
+    def __init__(self, connection, table: str = 'meter_readings', batch_rows: int = 100_000):
+        self.connection = connection
+        self.table = table
+        self.batch_rows = batch_rows
+        self.is_sqlite = isinstance(connection, sqlite3.Connection)
+
+    def iter_batches(self, path: str) -> Iterator[pd.DataFrame]:
+        """Stream the Parquet file batch by batch without materializing it."""
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=self.batch_rows, columns=READING_COLUMNS):
+            yield batch.to_pandas()
+
+    def _create_staging(self, cursor) -> None:
+        columns = (
+            'meter_id BIGINT, reading_time TIMESTAMP, consumption_kwh NUMERIC, demand_kw NUMERIC, '
+            'voltage NUMERIC, power_factor NUMERIC, quality_flag VARCHAR(20)'
+        )
+        cursor.execute(f'CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} ({columns})')
+        cursor.execute(f'DELETE FROM {STAGING_TABLE}')
+
+    def _stage(self, cursor, batch: pd.DataFrame) -> None:
+        """Copy one batch into the staging table."""
+        if self.is_sqlite:
+            placeholders = ', '.join('?' for _ in READING_COLUMNS)
+            records = batch.astype({'reading_time': str}).astype(object).where(batch.notna(), None)
+            cursor.executemany(
+                f'INSERT INTO {STAGING_TABLE} ({", ".join(READING_COLUMNS)}) VALUES ({placeholders})',
+                records.itertuples(index=False, name=None)
+            )
+        else:
+            buffer = io.StringIO()
+            batch.to_csv(buffer, index=False, header=False, date_format='%Y-%m-%d %H:%M:%S')
+            buffer.seek(0)
+            cursor.copy_expert(
+                f'COPY {STAGING_TABLE} ({", ".join(READING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+
+    def _merge(self, cursor) -> int:
+        """Insert staged rows that are not already in the target table; returns rows inserted."""
+        columns = ', '.join(READING_COLUMNS)
+        staged = ', '.join(f's.{c}' for c in READING_COLUMNS)
+        cursor.execute(f"""
+            INSERT INTO {self.table} ({columns})
+            SELECT {staged} FROM {STAGING_TABLE} s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {self.table} m
+                WHERE m.meter_id = s.meter_id AND m.reading_time = s.reading_time
+            )
+        """)
+        inserted = cursor.rowcount
+        cursor.execute(f'DELETE FROM {STAGING_TABLE}')
+        return inserted
+
+    def load(self, path: str, progress: bool = True) -> Dict[str, Any]:
+        """
+        Load a Parquet file, committing after every batch.
+
+        Returns:
+            Summary with rows read, inserted, duplicates skipped and rows/sec
+        """
+        start = time.perf_counter()
+        rows_read = rows_inserted = 0
+        cursor = self.connection.cursor()
+        self._create_staging(cursor)
+
+        for batch in self.iter_batches(path):
+            rows_read += len(batch)
+            batch = batch.drop_duplicates(DEDUPE_KEY, keep='last')
+            batch['reading_time'] = pd.to_datetime(batch['reading_time'])
+
+            self._stage(cursor, batch)
+            rows_inserted += self._merge(cursor)
+            self.connection.commit()
+
+            if progress:
+                elapsed = time.perf_counter() - start
+                print(f"  Loaded {rows_read:,} readings ({rows_inserted:,} new, "
+                      f"{rows_read / elapsed:,.0f} rows/sec)", file=sys.stderr)
+
+        cursor.close()
+        elapsed = time.perf_counter() - start
+        return {
+            'success': True,
+            'source': path,
+            'rows_read': rows_read,
+            'rows_inserted': rows_inserted,
+            'duplicates_skipped': rows_read - rows_inserted,
+            'seconds': round(elapsed, 3),
+            'rows_per_sec': round(rows_read / elapsed, 1) if elapsed > 0 else None
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk load meter readings from Parquet')
+    parser.add_argument('path', help='Parquet file of meter readings')
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'),
+                        help='PostgreSQL URL or sqlite:///path (default: $DATABASE_URL)')
+    parser.add_argument('--table', default='meter_readings')
+    parser.add_argument('--batch-rows', type=int, default=100_000)
+    parser.add_argument('--json', action='store_true', help='Print only the JSON summary on stdout')
+    args = parser.parse_args()
+
+    if not args.database_url:
+        print("❌ DATABASE_URL not set - pass --database-url", file=sys.stderr)
+        sys.exit(1)
+    if not os.path.exists(args.path):
+        print(f"❌ Data file not found: {args.path}", file=sys.stderr)
+        sys.exit(1)
+
+    connection = connect(args.database_url)
+    try:
+        summary = ParquetBulkLoader(connection, args.table, args.batch_rows).load(args.path)
+    finally:
+        connection.close()
+
+    if args.json:
+        print(json.dumps(summary))
+        return
+
+    print(f"\n✅ Loaded {summary['rows_inserted']:,} new readings from {summary['source']}")
+    print(f"   Duplicates skipped: {summary['duplicates_skipped']:,}")
+    print(f"   Throughput: {summary['rows_per_sec']:,.0f} rows/sec ({summary['seconds']:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
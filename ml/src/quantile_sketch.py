@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Mergeable streaming quantile sketches for meter and transformer readings.
+
+Each sketch is a log-bucketed histogram (DDSketch style): a value v falls in
+bucket ceil(log_gamma(v)), so every quantile estimate is within a fixed
+relative error of the true value. Buckets for many keys are held in flat,
+sorted (key, bucket, count) arrays, which makes update, merge and query
+vectorized numpy operations and keeps the store small - a meter contributes
+one entry per distinct bucket, not per reading.
+
+Sketches are kept per time slot (daily by default); queries merge the most
+recent window of slots, and older slots are dropped as new ones arrive.
+Stores built by different workers merge exactly by adding counts.
+
+Usage:
+    python src/quantile_sketch.py update data/sample/meter_readings.parquet --meter-map data/sample/customers.csv
+    python src/quantile_sketch.py query --level transformer --metric demand_kw
+"""
+
+import argparse
+import os
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+
+SKETCH_PATH = os.path.join(os.path.dirname(__file__), '..', 'models', 'quantile_sketches.joblib')
+
+LEVELS = ('meter', 'transformer', 'fleet')
+KEY_COLUMNS = {'meter': 'meter_id', 'transformer': 'transformer_id', 'fleet': None}
+METRICS = ('consumption_kwh', 'demand_kw')
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+class LogBucketMapping:
+    """Maps non-negative values to log-spaced buckets with bounded relative error."""
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-3):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(self.gamma)
+
+    def index(self, values: np.ndarray) -> np.ndarray:
+        """Bucket index per value; values below min_value share the lowest bucket."""
+        clipped = np.maximum(np.asarray(values, dtype=float), self.min_value)
+        return np.ceil(np.log(clipped) / self._log_gamma).astype(np.int32)
+
+    def value(self, index: np.ndarray) -> np.ndarray:
+        """Representative value of each bucket (relative error <= relative_accuracy)."""
+        return 2 * np.power(self.gamma, index.astype(float)) / (self.gamma + 1)
+
+
+class QuantileSketch:
+    """
+    Quantile sketches for many keys, stored as (key, bucket, count) arrays
+    sorted by key then bucket with no repeated (key, bucket) pairs.
+    """
+
+    def __init__(self, keys: np.ndarray = None, buckets: np.ndarray = None, counts: np.ndarray = None):
+        self.keys = np.empty(0, dtype=np.int64) if keys is None else keys
+        self.buckets = np.empty(0, dtype=np.int32) if buckets is None else buckets
+        self.counts = np.empty(0, dtype=np.int64) if counts is None else counts
+
+    @classmethod
+    def _combine(cls, keys: np.ndarray, buckets: np.ndarray, counts: np.ndarray) -> 'QuantileSketch':
+        """Sort entries and add the counts of repeated (key, bucket) pairs."""
+        if len(keys) == 0:
+            return cls()
+        order = np.lexsort((buckets, keys))
+        keys, buckets, counts = keys[order], buckets[order], counts[order]
+        starts = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]) | (buckets[1:] != buckets[:-1])])
+        return cls(keys[starts], buckets[starts], np.add.reduceat(counts, starts))
+
+    @classmethod
+    def from_values(cls, keys: np.ndarray, values: np.ndarray, mapping: LogBucketMapping) -> 'QuantileSketch':
+        values = np.asarray(values, dtype=float)
+        valid = np.isfinite(values)
+        keys = np.asarray(keys, dtype=np.int64)[valid]
+        return cls._combine(keys, mapping.index(values[valid]), np.ones(len(keys), dtype=np.int64))
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        return self._combine(
+            np.concatenate([self.keys, other.keys]),
+            np.concatenate([self.buckets, other.buckets]),
+            np.concatenate([self.counts, other.counts])
+        )
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def quantiles(self, qs: Sequence[float], mapping: LogBucketMapping) -> pd.DataFrame:
+        """
+        Quantile estimates for every key.
+
+        Returns:
+            DataFrame indexed by key with a 'count' column and one 'p<q>' column
+            per quantile (e.g. p50, p90, p99)
+        """
+        columns = ['count'] + [quantile_column(q) for q in qs]
+        if len(self) == 0:
+            return pd.DataFrame(columns=columns, index=pd.Index([], name='key'))
+
+        starts = np.flatnonzero(np.r_[True, self.keys[1:] != self.keys[:-1]])
+        totals = np.add.reduceat(self.counts, starts)
+        cumulative = np.cumsum(self.counts)
+        base = np.r_[0, cumulative[starts[1:] - 1]]
+
+        result = {'count': totals}
+        for q in qs:
+            # First bucket whose cumulative count exceeds rank q * (n - 1)
+            rank = base + np.floor(q * (totals - 1))
+            position = np.searchsorted(cumulative, rank, side='right')
+            result[quantile_column(q)] = mapping.value(self.buckets[position])
+        return pd.DataFrame(result, index=pd.Index(self.keys[starts], name='key'))[columns]
+
+
+def quantile_column(q: float) -> str:
+    return f'p{q * 100:g}'.replace('.', '_')
+
+
+class QuantileSketchStore:
+    """Sliding-window quantile sketches per (level, metric, time slot)."""
+
+    def __init__(self, slot_seconds: int = 24 * 60 * 60, window_slots: int = 7,
+                 relative_accuracy: float = 0.01, meter_map: pd.DataFrame = None):
+        """
+        Args:
+            slot_seconds: Width of each time slot (default one day)
+            window_slots: Slots kept and merged by queries (default 7 = one week)
+            relative_accuracy: Relative error bound of quantile estimates
+            meter_map: Optional meter_id -> transformer_id mapping for
+                readings without a transformer_id column
+        """
+        self.slot_seconds = slot_seconds
+        self.window_slots = window_slots
+        self.mapping = LogBucketMapping(relative_accuracy)
+        self.meter_map = None
+        self.set_meter_map(meter_map)
+        self.slots: Dict[Tuple[str, str], Dict[int, QuantileSketch]] = {}
+
+    def set_meter_map(self, meter_map: pd.DataFrame) -> None:
+        """Replace the meter_id -> transformer_id mapping (ignored without a transformer_id column)."""
+        if meter_map is not None and 'transformer_id' in meter_map.columns:
+            mapping = meter_map.rename(columns={'id': 'meter_id'}) if 'meter_id' not in meter_map.columns else meter_map
+            self.meter_map = mapping.drop_duplicates('meter_id', keep='last').set_index('meter_id')['transformer_id']
+
+    def _slot_index(self, times) -> np.ndarray:
+        ns = pd.to_datetime(times).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        return ns // (np.int64(self.slot_seconds) * 1_000_000_000)
+
+    @property
+    def latest_slot(self) -> Optional[int]:
+        slots = [s for series in self.slots.values() for s in series]
+        return max(slots) if slots else None
+
+    def add(self, level: str, metric: str, keys: np.ndarray, times, values: np.ndarray) -> None:
+        """Add observations for one level and metric."""
+        slots = self._slot_index(times)
+        series = self.slots.setdefault((level, metric), {})
+        for slot in np.unique(slots):
+            mask = slots == slot
+            sketch = QuantileSketch.from_values(keys[mask], values[mask], self.mapping)
+            series[int(slot)] = series[int(slot)].merge(sketch) if int(slot) in series else sketch
+
+    def update(self, readings: pd.DataFrame) -> 'QuantileSketchStore':
+        """Add a batch of raw readings to the meter and transformer sketches."""
+        level_keys = {'meter': readings['meter_id'].to_numpy()}
+        if 'transformer_id' in readings.columns:
+            level_keys['transformer'] = readings['transformer_id'].to_numpy()
+        elif self.meter_map is not None:
+            level_keys['transformer'] = self.meter_map.reindex(readings['meter_id']).to_numpy()
+
+        for level, keys in level_keys.items():
+            known = ~pd.isna(keys)
+            for metric in METRICS:
+                self.add(level, metric, keys[known].astype(np.int64), readings['reading_time'][known],
+                         readings[metric].to_numpy(dtype=float)[known])
+        self.evict()
+        return self
+
+    def update_fleet_peaks(self, hourly: pd.DataFrame) -> 'QuantileSketchStore':
+        """
+        Add fleet hourly peak demand, either a fleet hourly rollup
+        (bucket_start, demand_kw_max) or DemandForecaster.prepare_data output (ds, y).
+        """
+        if 'bucket_start' in hourly.columns:
+            times, values = hourly['bucket_start'], hourly['demand_kw_max']
+        else:
+            times, values = hourly['ds'], hourly['y']
+        self.add('fleet', 'demand_kw', np.zeros(len(hourly), dtype=np.int64), times, values.to_numpy(dtype=float))
+        self.evict()
+        return self
+
+    def evict(self) -> int:
+        """Drop slots that fell out of the window; returns slots removed."""
+        latest = self.latest_slot
+        if latest is None:
+            return 0
+        removed = 0
+        for series in self.slots.values():
+            for slot in [s for s in series if s <= latest - self.window_slots]:
+                del series[slot]
+                removed += 1
+        return removed
+
+    def merge(self, other: 'QuantileSketchStore') -> 'QuantileSketchStore':
+        """Merge another store (e.g. from a parallel worker) into this one."""
+        if (other.slot_seconds, other.mapping.gamma) != (self.slot_seconds, self.mapping.gamma):
+            raise ValueError("Cannot merge sketch stores with different slot width or accuracy")
+        for key, series in other.slots.items():
+            target = self.slots.setdefault(key, {})
+            for slot, sketch in series.items():
+                target[slot] = target[slot].merge(sketch) if slot in target else sketch
+        self.evict()
+        return self
+
+    def window(self, level: str, metric: str, slots: int = None) -> QuantileSketch:
+        """Merged sketch over the most recent `slots` slots (default: whole window)."""
+        series = self.slots.get((level, metric), {})
+        latest = self.latest_slot
+        if latest is None:
+            return QuantileSketch()
+        first = latest - (slots or self.window_slots) + 1
+        parts = [sketch for slot, sketch in series.items() if slot >= first]
+        if not parts:
+            return QuantileSketch()
+        return QuantileSketch._combine(
+            np.concatenate([p.keys for p in parts]),
+            np.concatenate([p.buckets for p in parts]),
+            np.concatenate([p.counts for p in parts])
+        )
+
+    def quantiles(self, level: str, metric: str, qs: Iterable[float] = DEFAULT_QUANTILES,
+                  slots: int = None) -> pd.DataFrame:
+        """Per-key quantiles over the window, with the key column named after the level."""
+        table = self.window(level, metric, slots).quantiles(list(qs), self.mapping)
+        if KEY_COLUMNS[level] is None:
+            return table.reset_index(drop=True)
+        return table.rename_axis(KEY_COLUMNS[level]).reset_index()
+
+    def thresholds(self, level: str, metric: str, q: float, slots: int = None) -> pd.Series:
+        """Quantile q per key, as a Series indexed by key."""
+        return self.window(level, metric, slots).quantiles([q], self.mapping)[quantile_column(q)]
+
+    def threshold(self, level: str, metric: str, q: float, key: int = 0, slots: int = None) -> Optional[float]:
+        """Quantile q for one key (fleet sketches use key 0)."""
+        thresholds = self.thresholds(level, metric, q, slots)
+        return float(thresholds[key]) if key in thresholds.index else None
+
+    def exceedances(self, readings: pd.DataFrame, metric: str, q: float = 0.99) -> np.ndarray:
+        """Flag readings above their meter's windowed quantile q (False for unknown meters)."""
+        limits = self.thresholds('meter', metric, q).reindex(readings['meter_id']).to_numpy()
+        with np.errstate(invalid='ignore'):
+            return readings[metric].to_numpy(dtype=float) > limits
+
+    def memory_bytes(self) -> int:
+        return sum(s.keys.nbytes + s.buckets.nbytes + s.counts.nbytes
+                   for series in self.slots.values() for s in series.values())
+
+    def save(self, path: str = SKETCH_PATH) -> None:
+        """Save sketches to disk."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        joblib.dump({
+            'slot_seconds': self.slot_seconds,
+            'window_slots': self.window_slots,
+            'relative_accuracy': self.mapping.relative_accuracy,
+            'meter_map': self.meter_map,
+            # Plain arrays, so stores written by this module's CLI (run as __main__) load anywhere
+            'slots': {key: {slot: (sk.keys, sk.buckets, sk.counts) for slot, sk in series.items()}
+                      for key, series in self.slots.items()}
+        }, path)
+        print(f"✅ Quantile sketches saved to {path}")
+
+    @classmethod
+    def load(cls, path: str = SKETCH_PATH) -> 'QuantileSketchStore':
+        """Load sketches from disk."""
+        data = joblib.load(path)
+        store = cls(data['slot_seconds'], data['window_slots'], data['relative_accuracy'])
+        store.meter_map = data['meter_map']
+        store.slots = {key: {slot: sk if isinstance(sk, QuantileSketch) else QuantileSketch(*sk)
+                             for slot, sk in series.items()}
+                       for key, series in data['slots'].items()}
+        return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain per-meter quantile sketches')
+    parser.add_argument('command', choices=['update', 'query'])
+    parser.add_argument('readings', nargs='?', help='Parquet or CSV file of readings (update)')
+    parser.add_argument('--path', default=SKETCH_PATH)
+    parser.add_argument('--meter-map', help='CSV with meter_id/id and transformer_id columns')
+    parser.add_argument('--level', default='meter', choices=LEVELS)
+    parser.add_argument('--metric', default='demand_kw', choices=METRICS)
+    args = parser.parse_args()
+
+    if args.command == 'update':
+        if not args.readings or not os.path.exists(args.readings):
+            print(f"❌ Readings file not found: {args.readings}")
+            exit(1)
+        store = QuantileSketchStore.load(args.path) if os.path.exists(args.path) else QuantileSketchStore()
+        if args.meter_map:
+            store.set_meter_map(pd.read_csv(args.meter_map))
+
+        print(f"Loading readings from {args.readings}...")
+        readings = pd.read_parquet(args.readings) if args.readings.endswith('.parquet') else pd.read_csv(args.readings)
+        print(f"   Loaded {len(readings):,} readings")
+
+        store.update(readings)
+        store.save(args.path)
+        print(f"   Sketch memory: {store.memory_bytes() / 1024:,.0f} KB")
+        return
+
+    if not os.path.exists(args.path):
+        print(f"❌ Sketch store not found: {args.path}")
+        exit(1)
+    table = QuantileSketchStore.load(args.path).quantiles(args.level, args.metric)
+    print(table.to_string(index=False, float_format=lambda v: f'{v:,.3f}'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Compressed archive format for historical meter readings.
+
+Readings are sorted by (meter_id, reading_time) and split into blocks of
+whole meters. Within a block every column is encoded as one stream:
+
+    reading_time     delta-of-delta of UTC epoch ticks from the block's first
+                     reading (zero for a regular cadence), in the coarsest
+                     unit (s, ms, us, ns) that holds every timestamp exactly;
+                     the input timezone is kept in the archive metadata
+    measurements     scaled integers (value * 10^decimals, smallest exact
+                     decimals) as deltas or as offsets from the block minimum,
+                     or XOR of consecutive float64 bit patterns when no exact
+                     decimal scale exists; missing values in a null bitmap
+    quality_flag     category codes
+
+Signed streams are zigzag encoded, narrowed to the smallest integer width
+that holds them, byte-shuffled and zlib compressed. This keeps the
+Gorilla idea (small deltas and XORs compress well) but stays byte aligned,
+so decoding is a handful of vectorized NumPy operations (cumsum, XOR
+accumulate) straight into arrays ready for training.
+
+Usage:
+    python src/reading_archive.py pack data/sample/meter_readings.parquet data/archive/readings.rma
+    python src/reading_archive.py unpack data/archive/readings.rma readings.parquet
+    python src/reading_archive.py info data/archive/readings.rma
+"""
+
+import argparse
+import json
+import os
+import struct
+import zlib
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+MAGIC = b'RMARC1'
+HEADER = struct.Struct('<6sQ')  # magic, metadata length
+
+TIME_COLUMN = 'reading_time'
+MEASUREMENT_COLUMNS = ['consumption_kwh', 'demand_kw', 'voltage', 'power_factor']
+CATEGORY_COLUMNS = ['quality_flag']
+MAX_DECIMALS = 6
+COMPRESSION_LEVEL = 1  # higher levels save ~3% on disk for twice the write time
+# Time units tried coarsest first, with nanoseconds per tick
+TIME_UNITS = [('s', 10 ** 9), ('ms', 10 ** 6), ('us', 10 ** 3), ('ns', 1)]
+
+
+# =========================================================================
+# Stream codecs
+# =========================================================================
+
+def zigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def unzigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.uint64)
+    return ((values >> np.uint64(1)).view(np.int64)) ^ -(values & np.uint64(1)).view(np.int64)
+
+
+def pack_unsigned(values: np.ndarray) -> Dict[str, Any]:
+    """Narrow, byte-shuffle and compress an unsigned stream."""
+    top = int(values.max()) if len(values) else 0
+    dtype = next(d for d in (np.uint8, np.uint16, np.uint32, np.uint64) if top <= np.iinfo(d).max)
+    narrow = values.astype(dtype)
+    # Byte planes: all low bytes, then all next bytes, ... (high planes are mostly zero)
+    shuffled = narrow.view(np.uint8).reshape(-1, narrow.itemsize).T.tobytes()
+    return {'dtype': np.dtype(dtype).str, 'payload': zlib.compress(shuffled, COMPRESSION_LEVEL)}
+
+
+def unpack_unsigned(stream: Dict[str, Any], payload: bytes, count: int) -> np.ndarray:
+    dtype = np.dtype(stream['dtype'])
+    planes = np.frombuffer(zlib.decompress(payload), dtype=np.uint8).reshape(dtype.itemsize, count)
+    return np.ascontiguousarray(planes.T).view(dtype).ravel().astype(np.uint64)
+
+
+def exact_decimals(values: np.ndarray) -> Optional[int]:
+    """Smallest number of decimals at which values round-trip exactly through integers."""
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10.0 ** decimals
+        scaled = np.round(values * scale)
+        if np.abs(scaled).max(initial=0) < 2 ** 52 and np.array_equal(scaled / scale, values):
+            return decimals
+    return None
+
+
+def encode_time(nanoseconds: np.ndarray) -> Dict[str, Any]:
+    """Encode epoch nanoseconds in the coarsest unit that loses nothing."""
+    unit, per_tick = next((u, n) for u, n in TIME_UNITS if not (nanoseconds % n).any())
+    ticks = nanoseconds // per_tick
+    base = int(ticks[0]) if len(ticks) else 0
+    delta = np.diff(ticks - base, prepend=0)
+    return {'codec': 'delta_of_delta', 'unit': unit, 'base': base,
+            **pack_unsigned(zigzag(np.diff(delta, prepend=0)))}
+
+
+def decode_time(stream: Dict[str, Any], payload: bytes, count: int) -> np.ndarray:
+    """Decode to datetime64 (UTC) in the stream's unit; archives before units were stored hold seconds."""
+    ticks = np.cumsum(np.cumsum(unzigzag(unpack_unsigned(stream, payload, count)))) + stream.get('base', 0)
+    return ticks.astype(f"datetime64[{stream.get('unit', 's')}]")
+
+
+def encode_measurement(values: np.ndarray) -> Dict[str, Any]:
+    """
+    Encode a float column. Missing values are kept in a separate bitmap so
+    they do not force the lossless XOR fallback on the whole block.
+    """
+    values = values.astype(np.float64)
+    nulls = np.isnan(values)
+    stream = {}
+    if nulls.any():
+        stream['null_payload'] = zlib.compress(np.packbits(nulls).tobytes(), COMPRESSION_LEVEL)
+        values = np.where(nulls, 0.0, values)
+
+    decimals = exact_decimals(values) if np.isfinite(values).all() else None
+    if decimals is None:
+        bits = values.view(np.uint64)
+        previous = np.concatenate([np.zeros(1, dtype=np.uint64), bits[:-1]])
+        return {'codec': 'xor', **stream, **pack_unsigned(np.bitwise_xor(bits, previous))}
+
+    scaled = np.round(values * 10.0 ** decimals).astype(np.int64)
+    deltas = np.diff(scaled, prepend=scaled[:1])
+    # Deltas suit smooth series; noisy ones compress better as offsets from the minimum
+    if deltas.std() < scaled.std():
+        return {'codec': 'scaled_delta', 'decimals': decimals, 'base': int(scaled[0]),
+                **stream, **pack_unsigned(zigzag(deltas))}
+    base = int(scaled.min())
+    return {'codec': 'scaled_offset', 'decimals': decimals, 'base': base,
+            **stream, **pack_unsigned((scaled - base).view(np.uint64))}
+
+
+def decode_measurement(stream: Dict[str, Any], payload: bytes, count: int, null_payload: bytes = None) -> np.ndarray:
+    raw = unpack_unsigned(stream, payload, count)
+    if stream['codec'] == 'scaled_delta':
+        values = (np.cumsum(unzigzag(raw)) + stream['base']) / 10.0 ** stream['decimals']
+    elif stream['codec'] == 'scaled_offset':
+        values = (raw.view(np.int64) + stream['base']) / 10.0 ** stream['decimals']
+    else:
+        values = np.bitwise_xor.accumulate(raw).view(np.float64)
+    if null_payload is not None:
+        nulls = np.unpackbits(np.frombuffer(zlib.decompress(null_payload), dtype=np.uint8), count=count)
+        values[nulls.astype(bool)] = np.nan
+    return values
+
+
+def encode_category(values: np.ndarray) -> Dict[str, Any]:
+    categorical = pd.Categorical(values)
+    return {'codec': 'category', 'categories': [str(c) for c in categorical.categories],
+            **pack_unsigned(categorical.codes.astype(np.int64).view(np.uint64) + np.uint64(1))}
+
+
+def decode_category(stream: Dict[str, Any], payload: bytes, count: int) -> pd.Categorical:
+    codes = unpack_unsigned(stream, payload, count).astype(np.int64) - 1  # -1 = missing
+    return pd.Categorical.from_codes(codes, categories=stream['categories'])
+
+
+# =========================================================================
+# Archive files
+# =========================================================================
+
+def write_archive(readings: pd.DataFrame, path: str, block_rows: int = 1_000_000) -> Dict[str, Any]:
+    """
+    Write readings as a compressed archive.
+
+    Args:
+        readings: meter_id, reading_time and any of the measurement/category columns
+        path: Output file
+        block_rows: Target rows per block; blocks always hold whole meters
+
+    Returns:
+        Archive metadata (rows, blocks, per-column codecs and sizes)
+    """
+    readings = readings.sort_values(['meter_id', TIME_COLUMN], kind='stable')
+    measurements = [c for c in MEASUREMENT_COLUMNS if c in readings.columns]
+    categories = [c for c in CATEGORY_COLUMNS if c in readings.columns]
+
+    meter_ids = readings['meter_id'].to_numpy(dtype=np.int64)
+    times = pd.to_datetime(readings[TIME_COLUMN])
+    if times.isna().any():
+        raise ValueError(f"{TIME_COLUMN} has missing values; every archived reading needs a timestamp")
+    tz = str(times.dt.tz) if times.dt.tz is not None else None
+    if tz is not None:
+        times = times.dt.tz_convert('UTC').dt.tz_localize(None)
+    nanoseconds = times.to_numpy(dtype='datetime64[ns]').view(np.int64)
+    values = {c: readings[c].to_numpy() for c in measurements + categories}
+    starts = np.flatnonzero(np.r_[True, meter_ids[1:] != meter_ids[:-1]])
+    ends = np.r_[starts[1:], len(meter_ids)]
+
+    blocks, payloads, offset = [], [], 0
+    block_start = 0
+    while block_start < len(starts):
+        # Take whole meters until the block reaches block_rows
+        first_row = int(starts[block_start])
+        block_end = int(np.searchsorted(ends, first_row + block_rows, side='right'))
+        block_end = max(block_end, block_start + 1)
+        rows = slice(first_row, int(ends[block_end - 1]))
+
+        streams = {TIME_COLUMN: encode_time(nanoseconds[rows])}
+        for column in measurements:
+            streams[column] = encode_measurement(values[column][rows])
+        for column in categories:
+            streams[column] = encode_category(values[column][rows])
+
+        for stream in streams.values():
+            for key, prefix in (('payload', ''), ('null_payload', 'null_')):
+                if key in stream:
+                    payload = stream.pop(key)
+                    stream.update({f'{prefix}offset': offset, f'{prefix}length': len(payload)})
+                    payloads.append(payload)
+                    offset += len(payload)
+
+        block_meters = meter_ids[starts[block_start:block_end]]
+        blocks.append({
+            'rows': rows.stop - rows.start,
+            'meter_ids': block_meters.tolist(),
+            'meter_rows': (ends[block_start:block_end] - starts[block_start:block_end]).tolist(),
+            'streams': streams
+        })
+        block_start = block_end
+
+    metadata = {
+        'format': MAGIC.decode(),
+        'rows': len(readings),
+        'columns': ['meter_id', TIME_COLUMN] + measurements + categories,
+        'tz': tz,
+        'blocks': blocks
+    }
+    encoded = json.dumps(metadata, separators=(',', ':')).encode()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(encoded)))
+        f.write(encoded)
+        for payload in payloads:
+            f.write(payload)
+    return metadata
+
+
+def read_metadata(path: str) -> Dict[str, Any]:
+    with open(path, 'rb') as f:
+        magic, length = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a reading archive")
+        return json.loads(f.read(length))
+
+
+def read_arrays(path: str, columns: Sequence[str] = None, meter_ids: Sequence[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Decode an archive into NumPy arrays.
+
+    Args:
+        columns: Columns to decode (default: all); meter_id is always returned
+        meter_ids: Only decode blocks holding these meters, and keep only their rows
+
+    Returns:
+        Dict of column -> array; reading_time is naive UTC datetime64 (the input
+        timezone is read_metadata()['tz']), quality_flag a Categorical
+    """
+    with open(path, 'rb') as f:
+        magic, length = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a reading archive")
+        metadata = json.loads(f.read(length))
+        data = memoryview(f.read())
+
+    wanted = [c for c in metadata['columns'] if c != 'meter_id' and (columns is None or c in columns)]
+    selected = None if meter_ids is None else np.unique(np.asarray(meter_ids, dtype=np.int64))
+
+    parts: Dict[str, List] = {'meter_id': [], **{c: [] for c in wanted}}
+    for block in metadata['blocks']:
+        block_meters = np.asarray(block['meter_ids'], dtype=np.int64)
+        if selected is not None and not np.isin(block_meters, selected).any():
+            continue
+        count = block['rows']
+        ids = np.repeat(block_meters, block['meter_rows'])
+        keep = np.isin(ids, selected) if selected is not None else slice(None)
+        parts['meter_id'].append(ids[keep])
+
+        for column in wanted:
+            stream = block['streams'][column]
+            payload = data[stream['offset']:stream['offset'] + stream['length']]
+            if stream['codec'] == 'delta_of_delta':
+                values = decode_time(stream, payload, count)
+            elif stream['codec'] == 'category':
+                values = decode_category(stream, payload, count)
+            else:
+                nulls = None
+                if 'null_offset' in stream:
+                    nulls = data[stream['null_offset']:stream['null_offset'] + stream['null_length']]
+                values = decode_measurement(stream, payload, count, nulls)
+            parts[column].append(values[keep])
+
+    arrays = {}
+    for column, chunks in parts.items():
+        if column in CATEGORY_COLUMNS:
+            arrays[column] = union_categoricals(chunks) if chunks else pd.Categorical([])
+        else:
+            arrays[column] = np.concatenate(chunks) if chunks else np.array([])
+    return arrays
+
+
+def read_archive(path: str, columns: Sequence[str] = None, meter_ids: Sequence[int] = None) -> pd.DataFrame:
+    """Decode an archive into a readings DataFrame sorted by meter and time."""
+    arrays = read_arrays(path, columns, meter_ids)
+    frame = pd.DataFrame(arrays)
+    if TIME_COLUMN in frame.columns:
+        frame[TIME_COLUMN] = frame[TIME_COLUMN].astype('datetime64[ns]')
+        tz = read_metadata(path).get('tz')
+        if tz:
+            frame[TIME_COLUMN] = frame[TIME_COLUMN].dt.tz_localize('UTC').dt.tz_convert(tz)
+    return frame
+
+
+def archive_info(path: str) -> Dict[str, Any]:
+    """Rows, blocks, file size and compressed bytes/codec per column."""
+    metadata = read_metadata(path)
+    columns = {}
+    for block in metadata['blocks']:
+        for column, stream in block['streams'].items():
+            info = columns.setdefault(column, {'bytes': 0, 'codecs': set()})
+            info['bytes'] += stream['length'] + stream.get('null_length', 0)
+            info['codecs'].add(stream['codec'] + (f"({stream['decimals']})" if 'decimals' in stream else ''))
+    return {
+        'rows': metadata['rows'],
+        'blocks': len(metadata['blocks']),
+        'file_bytes': os.path.getsize(path),
+        'columns': {c: {'bytes': i['bytes'], 'codecs': sorted(i['codecs'])} for c, i in columns.items()}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack meter readings into a compressed archive')
+    parser.add_argument('command', choices=['pack', 'unpack', 'info'])
+    parser.add_argument('source', help='Readings file (pack) or archive (unpack/info)')
+    parser.add_argument('target', nargs='?', help='Archive (pack) or Parquet/CSV file (unpack)')
+    parser.add_argument('--block-rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"❌ File not found: {args.source}")
+        exit(1)
+
+    if args.command == 'pack':
+        if not args.target:
+            parser.error('pack needs a target archive path')
+        print(f"Loading readings from {args.source}...")
+        readings = pd.read_parquet(args.source) if args.source.endswith('.parquet') else pd.read_csv(args.source)
+        write_archive(readings, args.target, args.block_rows)
+        source_size, archive_size = os.path.getsize(args.source), os.path.getsize(args.target)
+        print(f"✅ Archived {len(readings):,} readings to {args.target}")
+        print(f"   {source_size / 1e6:,.1f} MB -> {archive_size / 1e6:,.1f} MB ({source_size / archive_size:.1f}x smaller)")
+    elif args.command == 'unpack':
+        if not args.target:
+            parser.error('unpack needs a target file')
+        readings = read_archive(args.source)
+        if args.target.endswith('.parquet'):
+            readings.to_parquet(args.target, index=False)
+        else:
+            readings.to_csv(args.target, index=False)
+        print(f"✅ Unpacked {len(readings):,} readings to {args.target}")
+    else:
+        info = archive_info(args.source)
+        print(f"{info['rows']:,} readings in {info['blocks']} block(s), {info['file_bytes'] / 1e6:,.2f} MB")
+        for column, details in info['columns'].items():
+            print(f"   {column:<18} {details['bytes'] / 1e6:>9.2f} MB  {', '.join(details['codecs'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Reading-quality stage: gap detection and imputation for meter series.
+
+Meters report every half hour, but comms outages leave holes. Readings are
+mapped to integer interval slots and sorted by (meter, slot); a gap is any
+step of more than one slot between consecutive readings of the same meter.
+Everything runs on flat NumPy arrays (factorize, argsort, diff, repeat), so
+the stage keeps up with fleet-sized batches.
+
+Missing intervals are imputed from per-meter hour-of-day profiles (the
+meter's mean for that hour, falling back to the meter's overall mean and
+then the fleet's mean for that hour), and imputed rows are flagged so
+models can tell them apart. Per-meter gap statistics are available as
+features.
+
+Usage:
+    python src/reading_quality.py report data/sample/meter_readings.parquet
+    python src/reading_quality.py fill data/sample/meter_readings.parquet readings_filled.parquet
+"""
+
+import argparse
+import os
+from typing import Dict, Sequence
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+
+INTERVAL = '30min'
+MEASUREMENT_COLUMNS = ['consumption_kwh', 'demand_kw', 'voltage', 'power_factor']
+# Per-meter attributes copied onto inserted rows
+STATIC_COLUMNS = ['transformer_id']
+# Outages longer than this are reported but not filled in (7 days of half-hours)
+MAX_FILL_SLOTS = 7 * 48
+
+GAP_FEATURES = ['missing_fraction', 'gap_count', 'longest_gap_hours']
+
+
+def slot_index(readings: pd.DataFrame, interval: str = INTERVAL) -> Dict[str, np.ndarray]:
+    """
+    Meter codes and interval slots of each reading, with the (meter, slot) sort order.
+    Each reading goes to the nearest interval boundary, so a few seconds of
+    clock jitter does not shift it into a neighbouring slot. Slots count
+    intervals from the UTC epoch-aligned boundary at or before the batch's
+    first reading ('tz' keeps the input's timezone for building new timestamps).
+    """
+    codes, meters = pd.factorize(readings['meter_id'].to_numpy(), sort=True)
+    reading_time = pd.to_datetime(readings['reading_time'])
+    times = reading_time.to_numpy(dtype='datetime64[ns]').view(np.int64)
+    step = pd.Timedelta(interval).value
+    origin = times.min() // step * step if len(times) else 0
+    slots = (times - origin + step // 2) // step
+
+    key = codes.astype(np.int64) * (slots.max(initial=0) + 1) + slots
+    order = np.arange(len(key)) if np.all(key[1:] >= key[:-1]) else np.argsort(key, kind='stable')
+    return {'codes': codes, 'meters': np.asarray(meters), 'slots': slots, 'order': order,
+            'origin': origin, 'step': step, 'tz': reading_time.dt.tz}
+
+
+def slot_times(index: Dict[str, np.ndarray], slots: np.ndarray) -> pd.DatetimeIndex:
+    """Start time of each slot, in the timezone of the readings slot_index() was built from."""
+    times = pd.to_datetime(index['origin'] + slots * index['step'])
+    return times.tz_localize('UTC').tz_convert(index['tz']) if index.get('tz') is not None else times
+
+
+def find_gaps(readings: pd.DataFrame, interval: str = INTERVAL, index: Dict[str, np.ndarray] = None) -> pd.DataFrame:
+    """
+    Missing intervals between consecutive readings of each meter.
+    Returns one row per gap: meter_id, gap_start (first missing interval), missing_slots.
+    """
+    index = index or slot_index(readings, interval)
+    codes, slots = index['codes'][index['order']], index['slots'][index['order']]
+    step = np.diff(slots)
+    is_gap = (codes[1:] == codes[:-1]) & (step > 1)
+    before = np.flatnonzero(is_gap)
+    return pd.DataFrame({
+        'meter_id': index['meters'][codes[before]],
+        'gap_start': slot_times(index, slots[before] + 1),
+        'missing_slots': step[is_gap] - 1
+    })
+
+
+def gap_statistics(readings: pd.DataFrame, interval: str = INTERVAL, index: Dict[str, np.ndarray] = None) -> pd.DataFrame:
+    """
+    Per-meter completeness over each meter's own first-to-last reading span.
+    Columns: expected_slots, observed_slots, missing_fraction, gap_count, longest_gap_hours.
+    """
+    index = index or slot_index(readings, interval)
+    codes, slots = index['codes'][index['order']], index['slots'][index['order']]
+    n_meters = len(index['meters'])
+
+    first = np.ones(len(codes), dtype=bool)
+    first[1:] = codes[1:] != codes[:-1]
+    distinct = first.copy()
+    distinct[1:] |= slots[1:] != slots[:-1]
+    starts = np.flatnonzero(first)
+    ends = np.append(starts[1:], len(codes)) - 1
+
+    expected = np.zeros(n_meters, dtype=np.int64)
+    expected[codes[starts]] = slots[ends] - slots[starts] + 1
+    observed = np.bincount(codes[distinct], minlength=n_meters)
+
+    missing = np.diff(slots) - 1
+    is_gap = ~first[1:] & (missing > 0)
+    gap_count = np.bincount(codes[1:][is_gap], minlength=n_meters)
+    longest = np.zeros(n_meters, dtype=np.int64)
+    np.maximum.at(longest, codes[1:][is_gap], missing[is_gap])
+
+    return pd.DataFrame({
+        'expected_slots': expected,
+        'observed_slots': observed,
+        'missing_fraction': 1 - observed / np.maximum(expected, 1),
+        'gap_count': gap_count,
+        'longest_gap_hours': longest * index['step'] / pd.Timedelta('1h').value
+    }, index=pd.Index(index['meters'], name='meter_id'))
+
+
+def hourly_profiles(codes: np.ndarray, hours: np.ndarray, values: np.ndarray, n_meters: int) -> np.ndarray:
+    """
+    (meters x 24) mean of values per meter and hour of day, ignoring NaNs.
+    Empty cells fall back to the meter's mean, then to the fleet's hourly mean.
+    """
+    valid = ~np.isnan(values)
+    bins = codes[valid] * 24 + hours[valid]
+    sums = np.bincount(bins, weights=values[valid], minlength=n_meters * 24).reshape(n_meters, 24)
+    counts = np.bincount(bins, minlength=n_meters * 24).reshape(n_meters, 24)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        profile = sums / counts
+        meter_mean = sums.sum(axis=1) / counts.sum(axis=1)
+        fleet_hour = sums.sum(axis=0) / counts.sum(axis=0)
+    profile = np.where(counts > 0, profile, meter_mean[:, None])
+    return np.where(np.isnan(profile), fleet_hour[None, :], profile)
+
+
+def fill_gaps(readings: pd.DataFrame, interval: str = INTERVAL, columns: Sequence[str] = None,
+              max_fill_slots: int = MAX_FILL_SLOTS, index: Dict[str, np.ndarray] = None) -> pd.DataFrame:
+    """
+    Insert rows for missing intervals and impute missing measurements.
+
+    Gaps of up to max_fill_slots intervals get one row per missing interval;
+    those rows and any NaN measurements of existing rows are imputed from
+    hour-of-day profiles. Returns readings sorted by (meter_id, reading_time)
+    with a boolean 'imputed' column.
+    """
+    columns = [c for c in (columns or MEASUREMENT_COLUMNS) if c in readings.columns]
+    with stage('reading_quality', 'fill_gaps', len(readings)):
+        index = index or slot_index(readings, interval)
+        order = index['order']
+        codes, slots = index['codes'][order], index['slots'][order]
+
+        step = np.diff(slots)
+        is_gap = (codes[1:] == codes[:-1]) & (step > 1) & (step - 1 <= max_fill_slots)
+        lengths = step[is_gap] - 1
+        total = int(lengths.sum())
+        # One new slot per missing interval: gap start + 0, 1, ... length-1
+        offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        new_codes = np.repeat(codes[:-1][is_gap], lengths)
+        new_slots = np.repeat(slots[:-1][is_gap] + 1, lengths) + offsets
+
+        new_rows = pd.DataFrame({
+            'meter_id': index['meters'][new_codes],
+            'reading_time': slot_times(index, new_slots)
+        })
+        if 'quality_flag' in readings.columns:
+            new_rows['quality_flag'] = 'imputed'
+        for column in STATIC_COLUMNS:
+            if column in readings.columns:
+                new_rows[column] = readings[column].to_numpy()[order[np.searchsorted(codes, new_codes)]]
+
+        # Each gap's rows go straight after the reading that precedes it, so no re-sort is needed
+        n = len(codes)
+        inserted_after = np.zeros(n, dtype=np.int64)
+        inserted_after[:-1][is_gap] = lengths
+        position = np.arange(n) + np.cumsum(inserted_after) - inserted_after
+        source = np.empty(n + total, dtype=np.int64)
+        is_new = np.ones(n + total, dtype=bool)
+        is_new[position] = False
+        source[position] = order
+        source[is_new] = n + np.arange(total)
+        row_codes = np.empty(n + total, dtype=np.int64)
+        row_codes[position] = codes
+        row_codes[is_new] = new_codes
+
+        # One take from the unsorted input plus the new rows
+        filled = pd.concat([readings.assign(reading_time=pd.to_datetime(readings['reading_time'])), new_rows],
+                           ignore_index=True).take(source)
+        filled.index = pd.RangeIndex(len(filled))
+        imputed = is_new.copy()
+
+        if index.get('tz') is None:
+            times = filled['reading_time'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+            hours = (times // pd.Timedelta('1h').value) % 24
+        else:
+            # Profiles follow local hour of day
+            hours = filled['reading_time'].dt.hour.to_numpy()
+        for column in columns:
+            values = filled[column].to_numpy(dtype=float, copy=True)
+            missing = np.isnan(values)
+            if missing.any():
+                profile = hourly_profiles(row_codes, hours, values, len(index['meters']))
+                values[missing] = profile[row_codes[missing], hours[missing]]
+                filled[column] = values
+                imputed |= missing
+        filled['imputed'] = imputed
+    return filled
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find and fill gaps in meter reading series')
+    parser.add_argument('command', choices=['report', 'fill'])
+    parser.add_argument('readings', help='Parquet or CSV file of readings')
+    parser.add_argument('output', nargs='?', help='Output Parquet file (fill)')
+    parser.add_argument('--interval', default=INTERVAL)
+    parser.add_argument('--max-fill-slots', type=int, default=MAX_FILL_SLOTS)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.readings):
+        print(f"❌ Readings file not found: {args.readings}")
+        exit(1)
+    readings = pd.read_parquet(args.readings) if args.readings.endswith('.parquet') else pd.read_csv(args.readings)
+    print(f"   Loaded {len(readings):,} readings")
+    index = slot_index(readings, args.interval)
+
+    if args.command == 'report':
+        stats = gap_statistics(readings, args.interval, index)
+        gaps = find_gaps(readings, args.interval, index)
+        print(f"   {len(gaps):,} gaps, {int(gaps['missing_slots'].sum()):,} missing intervals across "
+              f"{int((stats['gap_count'] > 0).sum()):,} of {len(stats):,} meters")
+        print(f"   Fleet completeness: {stats['observed_slots'].sum() / max(stats['expected_slots'].sum(), 1):.2%}")
+        worst = stats.sort_values('missing_fraction', ascending=False).head(10)
+        print(worst.to_string(float_format=lambda v: f'{v:.3f}'))
+        return
+
+    if not args.output:
+        parser.error('fill needs an output path')
+    filled = fill_gaps(readings, args.interval, max_fill_slots=args.max_fill_slots, index=index)
+    filled.to_parquet(args.output, index=False)
+    print(f"✅ Wrote {len(filled):,} readings ({int(filled['imputed'].sum()):,} imputed) to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+CPU thread budgets for concurrent model workloads.
+
+IsolationForest, KMeans, XGBoost, Prophet/cmdstan and the BLAS/OpenMP
+libraries under numpy each default to using every core. When training and
+scoring share a machine they oversubscribe it. The governor hands each task
+a thread budget out of the process's CPU allowance:
+
+    with governor.task('anomaly_detector.train') as threads:
+        IsolationForest(n_jobs=threads)
+
+Models read their budget with current_threads() for n_jobs / nthread.
+Native thread pools (BLAS, OpenMP) are process-wide, so while tasks overlap
+they are capped with threadpoolctl at the smallest running task's budget.
+
+Separate processes (a training job next to a serving process) divide the
+machine with REDMETERS_THREADS; configure_process() also exports the usual
+OMP/MKL/OpenBLAS/Stan variables so child processes such as cmdstan inherit
+the same limit. The train_all_models, score_cli and model_warmup entry
+points call configure_from_env() before numpy is first imported.
+
+Environment variables:
+    REDMETERS_THREADS   Threads this process may use (default: all available CPUs)
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+THREAD_ENV_VARS = (
+    'OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS', 'STAN_NUM_THREADS',
+)
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (respects affinity masks and cgroup cpusets)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def configure_process(threads: int) -> None:
+    """
+    Export thread limits for native libraries and child processes.
+    Call before numpy/sklearn are imported for the limits to apply at startup.
+    """
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    os.environ['REDMETERS_THREADS'] = str(threads)
+
+
+def configure_from_env() -> int:
+    """
+    Apply this process's allowance (REDMETERS_THREADS, else all available CPUs)
+    with configure_process(); entry points call it before importing numpy.
+    """
+    threads = int(os.environ.get('REDMETERS_THREADS') or available_cpus())
+    configure_process(threads)
+    return threads
+
+
+class ResourceGovernor:
+    """Assigns thread budgets to concurrent tasks within one process."""
+
+    def __init__(self, total_threads: int = None):
+        self.total_threads = max(1, total_threads or available_cpus())
+        self.tasks: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._next_id = 0
+        self._limiter = None
+        self._native_limit = None
+
+    @classmethod
+    def from_env(cls) -> 'ResourceGovernor':
+        threads = os.environ.get('REDMETERS_THREADS')
+        return cls(int(threads) if threads else None)
+
+    @property
+    def threads_in_use(self) -> int:
+        return sum(task['threads'] for task in self.tasks.values())
+
+    def current_threads(self) -> int:
+        """Budget of the innermost task on this thread, or the process allowance outside tasks."""
+        stack = getattr(self._local, 'stack', None)
+        return stack[-1] if stack else self.total_threads
+
+    def _allocate(self, requested: Optional[int]) -> int:
+        free = self.total_threads - self.threads_in_use
+        # Every task gets at least one thread, even on a saturated machine
+        return max(1, min(requested or self.total_threads, free))
+
+    @contextmanager
+    def task(self, name: str, threads: int = None):
+        """
+        Run a block with a thread budget; yields the number of threads granted.
+
+        Args:
+            name: Task label shown by snapshot()
+            threads: Threads wanted (default: whatever is free). Nested tasks
+                stay within their parent's budget.
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        if stack:
+            # Nested: reuse the parent's reservation, never exceed it
+            granted = min(threads or stack[-1], stack[-1])
+            stack.append(granted)
+            try:
+                yield granted
+            finally:
+                stack.pop()
+            return
+
+        with self._lock:
+            granted = self._allocate(threads)
+            task_id = self._next_id
+            self._next_id += 1
+            self.tasks[task_id] = {'name': name, 'threads': granted}
+            self._apply_native_limit()
+        stack.append(granted)
+        try:
+            yield granted
+        finally:
+            stack.pop()
+            with self._lock:
+                del self.tasks[task_id]
+                self._apply_native_limit()
+
+    def _apply_native_limit(self) -> None:
+        """Cap BLAS/OpenMP pools at the smallest running budget; lift the cap when idle."""
+        from threadpoolctl import threadpool_limits
+
+        limit = min((task['threads'] for task in self.tasks.values()), default=None)
+        if limit == self._native_limit:
+            return
+        if self._limiter is not None:
+            self._limiter.restore_original_limits()
+            self._limiter = None
+        if limit is not None:
+            self._limiter = threadpool_limits(limits=limit)
+        self._native_limit = limit
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'total_threads': self.total_threads,
+                'threads_in_use': self.threads_in_use,
+                'native_limit': self._native_limit,
+                'tasks': [dict(task) for task in self.tasks.values()]
+            }
+
+
+governor = ResourceGovernor.from_env()
+task = governor.task
+current_threads = governor.current_threads
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Multi-resolution rollup cubes for meter readings.
+
+Maintains 30-minute, hourly and daily aggregates per meter, per transformer,
+per customer segment and fleet-wide as month-partitioned Parquet files.
+Every stored measure is a sum, count, min or max, so new readings are merged
+into existing buckets incrementally and only the affected months are rewritten.
+
+Feed each reading to update() once: merging is additive, so re-delivering a
+batch double counts it. Use rebuild() to recompute from scratch.
+
+Usage:
+    python src/rollup_builder.py update data/sample/meter_readings.parquet --meter-map data/sample/customers.csv
+    python src/rollup_builder.py rebuild data/sample/meter_readings.parquet
+    python src/rollup_builder.py summary
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+import numpy as np
+import pandas as pd
+
+ROLLUP_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'processed', 'rollups')
+SUMMARY_FILE = 'analytics_summary.json'
+
+LEVELS = ('meter', 'transformer', 'segment', 'fleet')
+KEY_COLUMNS = {'meter': 'meter_id', 'transformer': 'transformer_id', 'segment': 'segment_id', 'fleet': None}
+RESOLUTIONS = {'30min': 30 * 60, 'hourly': 60 * 60, 'daily': 24 * 60 * 60}
+
+# Stored measures and how partial aggregates for the same bucket combine
+MEASURES = {
+    'reading_count': 'sum',
+    'anomaly_count': 'sum',
+    'consumption_kwh_sum': 'sum',
+    'demand_kw_sum': 'sum',
+    'demand_kw_max': 'max',
+    'voltage_sum': 'sum',
+    'voltage_min': 'min',
+    'voltage_max': 'max',
+    'power_factor_sum': 'sum',
+}
+
+
+def bucket_starts(reading_time: pd.Series, seconds: int) -> np.ndarray:
+    """Floor timestamps to fixed-width buckets with integer arithmetic."""
+    ns = pd.to_datetime(reading_time).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    step = np.int64(seconds) * 1_000_000_000
+    return ((ns // step) * step).astype('datetime64[ns]')
+
+
+class RollupBuilder:
+    """Builds and reads rollup cubes stored under a root directory."""
+
+    def __init__(self, root: str = ROLLUP_DIR, meter_map: pd.DataFrame = None):
+        """
+        Args:
+            root: Directory holding the rollup partitions
+            meter_map: Optional meter_id -> transformer_id / segment_id mapping.
+                A customers.csv style frame ('id', 'segment_id') is accepted too.
+        """
+        self.root = root
+        self.meter_map = self._normalize_map(meter_map)
+
+    @staticmethod
+    def _normalize_map(meter_map: pd.DataFrame) -> Optional[pd.DataFrame]:
+        if meter_map is None:
+            return None
+        mapping = meter_map.copy()
+        if 'meter_id' not in mapping.columns and 'id' in mapping.columns:
+            mapping = mapping.rename(columns={'id': 'meter_id'})
+        columns = [c for c in ('transformer_id', 'segment_id') if c in mapping.columns]
+        return mapping.drop_duplicates('meter_id', keep='last').set_index('meter_id')[columns]
+
+    def _partition_dir(self, level: str, resolution: str) -> str:
+        return os.path.join(self.root, f'{level}_{resolution}')
+
+    def _level_keys(self, readings: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """Key array for every level that can be derived from these readings."""
+        keys = {'meter': readings['meter_id'].to_numpy(), 'fleet': np.zeros(len(readings), dtype=np.int8)}
+        for level in ('transformer', 'segment'):
+            column = KEY_COLUMNS[level]
+            if column in readings.columns:
+                keys[level] = readings[column].to_numpy()
+            elif self.meter_map is not None and column in self.meter_map.columns:
+                keys[level] = self.meter_map[column].reindex(readings['meter_id']).to_numpy()
+        return keys
+
+    @staticmethod
+    def _measures(readings: pd.DataFrame) -> pd.DataFrame:
+        """Per-reading measure columns, ready to be summed/min/maxed per bucket."""
+        quality = readings['quality_flag'] if 'quality_flag' in readings.columns else pd.Series('normal', index=readings.index)
+        return pd.DataFrame({
+            'reading_count': np.ones(len(readings), dtype=np.int64),
+            'anomaly_count': (quality == 'anomaly').to_numpy().astype(np.int64),
+            'consumption_kwh_sum': readings['consumption_kwh'].to_numpy(dtype=float),
+            'demand_kw_sum': readings['demand_kw'].to_numpy(dtype=float),
+            'demand_kw_max': readings['demand_kw'].to_numpy(dtype=float),
+            'voltage_sum': readings['voltage'].to_numpy(dtype=float),
+            'voltage_min': readings['voltage'].to_numpy(dtype=float),
+            'voltage_max': readings['voltage'].to_numpy(dtype=float),
+            'power_factor_sum': readings['power_factor'].to_numpy(dtype=float),
+        })
+
+    @staticmethod
+    def _combine(frame: pd.DataFrame) -> pd.DataFrame:
+        """Merge rows that share (key, bucket_start) using each measure's combiner."""
+        return frame.groupby(['key', 'bucket_start'], sort=True, dropna=True).agg(MEASURES).reset_index()
+
+    def aggregate(self, readings: pd.DataFrame) -> Dict[tuple, pd.DataFrame]:
+        """Compute partial rollups for a batch of readings, keyed by (level, resolution)."""
+        measures = self._measures(readings)
+        buckets = {r: bucket_starts(readings['reading_time'], s) for r, s in RESOLUTIONS.items()}
+        cubes = {}
+        for level, keys in self._level_keys(readings).items():
+            for resolution in RESOLUTIONS:
+                frame = measures.assign(key=keys, bucket_start=buckets[resolution])
+                cubes[(level, resolution)] = self._combine(frame)
+        return cubes
+
+    def _write_partitions(self, level: str, resolution: str, cube: pd.DataFrame, merge: bool) -> int:
+        directory = self._partition_dir(level, resolution)
+        os.makedirs(directory, exist_ok=True)
+        months = cube['bucket_start'].dt.strftime('%Y-%m')
+
+        for month, part in cube.groupby(months.to_numpy()):
+            path = os.path.join(directory, f'month={month}.parquet')
+            if merge and os.path.exists(path):
+                part = self._combine(pd.concat([pd.read_parquet(path), part], ignore_index=True))
+            part.to_parquet(path, index=False)
+        return months.nunique()
+
+    def update(self, readings: pd.DataFrame) -> Dict[str, int]:
+        """Merge new readings into the stored rollups; returns partitions rewritten per cube."""
+        written = {}
+        for (level, resolution), cube in self.aggregate(readings).items():
+            written[f'{level}_{resolution}'] = self._write_partitions(level, resolution, cube, merge=True)
+        return written
+
+    def rebuild(self, readings: pd.DataFrame) -> Dict[str, int]:
+        """Discard stored rollups and recompute them from readings."""
+        for level in LEVELS:
+            for resolution in RESOLUTIONS:
+                shutil.rmtree(self._partition_dir(level, resolution), ignore_errors=True)
+        written = {}
+        for (level, resolution), cube in self.aggregate(readings).items():
+            written[f'{level}_{resolution}'] = self._write_partitions(level, resolution, cube, merge=False)
+        return written
+
+    def exists(self, level: str, resolution: str) -> bool:
+        return bool(glob.glob(os.path.join(self._partition_dir(level, resolution), '*.parquet')))
+
+    def stale_reason(self, level: str, resolution: str, readings: pd.DataFrame,
+                     source_path: str = None) -> Optional[str]:
+        """
+        Why a stored cube cannot stand in for readings, or None if it can.
+        The cube must cover the readings' time range, hold at least as many
+        readings inside it, and be newer than source_path (when given).
+        """
+        paths = glob.glob(os.path.join(self._partition_dir(level, resolution), '*.parquet'))
+        if not paths:
+            return 'no rollups stored'
+        if source_path is not None and os.path.exists(source_path) and \
+                max(os.path.getmtime(p) for p in paths) < os.path.getmtime(source_path):
+            return f'rollups are older than {os.path.basename(source_path)}'
+        if len(readings) == 0:
+            return None
+
+        buckets = bucket_starts(readings['reading_time'], RESOLUTIONS[resolution])
+        first, last = pd.Timestamp(buckets.min()), pd.Timestamp(buckets.max())
+        cube = self.read(level, resolution, start=first, end=last + pd.Timedelta(seconds=RESOLUTIONS[resolution]))
+        if cube.empty or cube['bucket_start'].min() > first or cube['bucket_start'].max() < last:
+            return f'rollups do not cover {first} to {last}'
+        if cube['reading_count'].sum() < len(readings):
+            return f"rollups hold {int(cube['reading_count'].sum()):,} of {len(readings):,} readings in that range"
+        return None
+
+    def read(self, level: str, resolution: str, start=None, end=None) -> pd.DataFrame:
+        """
+        Read a rollup cube with derived means and anomaly rate.
+        The key column is named after the level (meter_id, transformer_id,
+        segment_id); fleet rollups have no key column.
+        """
+        paths = sorted(glob.glob(os.path.join(self._partition_dir(level, resolution), '*.parquet')))
+        if start is not None or end is not None:
+            lo = pd.Timestamp(start).strftime('%Y-%m') if start is not None else ''
+            hi = pd.Timestamp(end).strftime('%Y-%m') if end is not None else '9999-99'
+            paths = [p for p in paths if lo <= os.path.basename(p)[len('month='):-len('.parquet')] <= hi]
+
+        if not paths:
+            return pd.DataFrame(columns=['key', 'bucket_start', *MEASURES])
+
+        cube = pd.concat([pd.read_parquet(p) for p in paths], ignore_index=True)
+        if start is not None:
+            cube = cube[cube['bucket_start'] >= pd.Timestamp(start)]
+        if end is not None:
+            cube = cube[cube['bucket_start'] < pd.Timestamp(end)]
+
+        counts = cube['reading_count'].clip(lower=1)
+        cube = cube.assign(
+            demand_kw_mean=cube['demand_kw_sum'] / counts,
+            voltage_mean=cube['voltage_sum'] / counts,
+            power_factor_mean=cube['power_factor_sum'] / counts,
+            anomaly_rate=cube['anomaly_count'] / counts
+        )
+        if KEY_COLUMNS[level] is None:
+            return cube.drop(columns='key').reset_index(drop=True)
+        return cube.rename(columns={'key': KEY_COLUMNS[level]}).reset_index(drop=True)
+
+    def summary(self, now: datetime = None) -> Dict[str, Any]:
+        """Dashboard aggregates for the analytics endpoints, computed from fleet rollups."""
+        now = pd.Timestamp(now or datetime.now())
+        daily = self.read('fleet', 'daily')
+        # Last hour is approximated by the 30-minute buckets starting in it
+        recent = self.read('fleet', '30min', start=now.floor('30min') - pd.Timedelta(minutes=60), end=now)
+
+        readings = int(recent['reading_count'].sum())
+        last_hour = {
+            'readings': readings,
+            'avg_voltage': round(float(recent['voltage_sum'].sum() / readings), 2) if readings else None,
+            'voltage_min': float(recent['voltage_min'].min()) if readings else None,
+            'voltage_max': float(recent['voltage_max'].max()) if readings else None,
+            'avg_power_factor': round(float(recent['power_factor_sum'].sum() / readings), 4) if readings else None,
+            'total_consumption_kwh': round(float(recent['consumption_kwh_sum'].sum()), 2),
+            'total_demand_kw': round(float(recent['demand_kw_sum'].sum()), 2),
+            'anomaly_rate': round(float(recent['anomaly_count'].sum() / readings * 100), 2) if readings else 0
+        }
+
+        return {
+            'generated_at': datetime.now().isoformat(),
+            'as_of': now.isoformat(),
+            'total_readings': int(daily['reading_count'].sum()),
+            'readings_today': int(daily.loc[daily['bucket_start'] == now.normalize(), 'reading_count'].sum()),
+            'last_hour': last_hour
+        }
+
+    def write_summary(self, now: datetime = None) -> str:
+        path = os.path.join(self.root, SUMMARY_FILE)
+        os.makedirs(self.root, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.summary(now), f, indent=2)
+        return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build rollup cubes from meter readings')
+    parser.add_argument('command', choices=['update', 'rebuild', 'summary'])
+    parser.add_argument('readings', nargs='?', help='Parquet or CSV file of readings (update/rebuild)')
+    parser.add_argument('--root', default=ROLLUP_DIR)
+    parser.add_argument('--meter-map', help='CSV with meter_id and transformer_id/segment_id columns')
+    args = parser.parse_args()
+
+    meter_map = pd.read_csv(args.meter_map) if args.meter_map else None
+    builder = RollupBuilder(args.root, meter_map)
+
+    if args.command in ('update', 'rebuild'):
+        if not args.readings or not os.path.exists(args.readings):
+            print(f"❌ Readings file not found: {args.readings}")
+            exit(1)
+        print(f"Loading readings from {args.readings}...")
+        readings = pd.read_parquet(args.readings) if args.readings.endswith('.parquet') else pd.read_csv(args.readings)
+        print(f"   Loaded {len(readings):,} readings")
+
+        written = builder.update(readings) if args.command == 'update' else builder.rebuild(readings)
+        print(f"\n✅ Rollups {'updated' if args.command == 'update' else 'rebuilt'} in {os.path.abspath(args.root)}")
+        for cube, partitions in sorted(written.items()):
+            print(f"   {cube}: {partitions} partition(s) written")
+
+    path = builder.write_summary()
+    print(f"📊 Analytics summary written to {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Command-line scoring entry point used by the Ruby services.
+
+Reads a batch from a file or stdin (Arrow IPC file, Arrow IPC stream or JSON
+records), scores it with a saved model and prints JSON results. With --drift
+the scaled features also feed the model's persisted drift monitor. With
+--incidents (anomaly only) the output is {"results": [...], "incidents": [...]},
+flagged readings grouped per meter and transformer by incident_builder.
+When quantile sketches have been built (train_all_models), anomaly results
+also flag readings above their meter's historical p99 demand.
+
+Usage:
+    python src/score_cli.py anomaly --input readings.arrow
+    cat readings.json | python src/score_cli.py anomaly --input - --format json --drift
+    cat readings.json | python src/score_cli.py anomaly --input - --format json --incidents
+"""
+
+if __name__ == '__main__':
+    # Export thread limits before numpy/sklearn/xgboost load their native pools
+    from resource_governor import configure_from_env
+    configure_from_env()
+
+import argparse
+import importlib
+import os
+import sys
+
+import pandas as pd
+
+from model_io import FORMATS, read_frame
+from model_warmup import MODEL_ARTIFACTS
+from drift_monitor import DRIFT_DIR
+from incident_builder import DEFAULT_MAX_GAP, build_incidents
+from quantile_sketch import QuantileSketchStore
+from resource_governor import governor
+
+MODELS_DIR = os.environ.get('ML_MODELS_PATH', os.path.join(os.path.dirname(__file__), '..', 'models'))
+SKETCH_ARTIFACT = 'quantile_sketches.joblib'
+# Per-meter demand quantile that anomaly results are compared against
+METER_DEMAND_QUANTILE = 0.99
+
+# Drift statistics forget older batches so that recent data dominates
+DRIFT_HALF_LIFE_ROWS = 200_000
+# Rows the forgetting state must hold before recommending a retrain: enough to
+# span the daily load cycle, so a few batches from one time of day do not count as drift
+DRIFT_MIN_ROWS = DRIFT_HALF_LIFE_ROWS // 2
+
+
+def _timestamps_as_text(values: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.strftime('%Y-%m-%dT%H:%M:%S')
+    return values.astype(str)
+
+
+def score_anomalies(detector, df: pd.DataFrame) -> pd.DataFrame:
+    results = detector.score(df)
+    return pd.DataFrame({
+        'meter_id': df['meter_id'].astype(int).to_numpy(),
+        'reading_time': _timestamps_as_text(df['reading_time']).to_numpy(),
+        'anomaly_score': results['anomaly_score'],
+        'is_anomaly': results['is_anomaly'],
+        'detection_method': 'ml_model'
+    })
+
+
+def meter_exceedances(sketches: QuantileSketchStore, df: pd.DataFrame):
+    """True where demand is above the meter's historical p99 (False for meters without history)."""
+    return sketches.exceedances(df, 'demand_kw', METER_DEMAND_QUANTILE)
+
+
+def anomaly_incidents(df: pd.DataFrame, results: pd.DataFrame, max_gap: str) -> pd.DataFrame:
+    """Group flagged readings into incidents; transformer_id in the input enables transformer incidents."""
+    # UTC handles inputs with mixed offsets (e.g. across a DST change); naive times are taken as UTC
+    reading_time = pd.to_datetime(df['reading_time'], utc=True)
+    flagged = pd.DataFrame({
+        'meter_id': results['meter_id'],
+        'reading_time': reading_time.to_numpy(),
+        'anomaly_score': results['anomaly_score']
+    })
+    if 'transformer_id' in df.columns:
+        flagged['transformer_id'] = pd.to_numeric(df['transformer_id'], errors='coerce').to_numpy()
+    incidents = build_incidents(flagged[results['is_anomaly'].to_numpy()], max_gap)
+    for column in ('start_time', 'end_time', 'peak_time'):
+        incidents[column] = incidents[column].map(pd.Timestamp.isoformat)
+    return incidents
+
+
+def score_segments(segmenter, df: pd.DataFrame) -> pd.DataFrame:
+    results = segmenter.score(df)
+    return pd.DataFrame({k: results[k] for k in ('meter_id', 'cluster', 'segment_id')})
+
+
+def score_failures(predictor, df: pd.DataFrame) -> pd.DataFrame:
+    results = predictor.score(df)
+    equipment_id = df['id'].to_numpy() if 'id' in df.columns else range(len(df))
+    return pd.DataFrame({'equipment_id': equipment_id, **results})
+
+
+# Command -> (scoring function, artifact name)
+SCORERS = {
+    'anomaly': (score_anomalies, 'anomaly_detector'),
+    'segment': (score_segments, 'customer_segmenter'),
+    'failure': (score_failures, 'failure_predictor'),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a batch with a saved model')
+    parser.add_argument('model', choices=list(SCORERS))
+    parser.add_argument('--input', default='-', help="Input file, or '-' for stdin (default)")
+    parser.add_argument('--format', default='auto', choices=FORMATS)
+    parser.add_argument('--no-mmap', action='store_true', help='Read Arrow files without memory-mapping')
+    parser.add_argument('--model-path', help='Model artifact (default: $ML_MODELS_PATH/<model>.joblib)')
+    parser.add_argument('--drift', action='store_true', help='Update the persisted drift monitor for this model')
+    parser.add_argument('--drift-dir', default=DRIFT_DIR)
+    parser.add_argument('--incidents', action='store_true', help='Also group flagged readings into incidents (anomaly)')
+    parser.add_argument('--incident-gap', default=DEFAULT_MAX_GAP, help='Largest gap between readings of one incident')
+    parser.add_argument('--sketch-path', help=f'Quantile sketches (default: $ML_MODELS_PATH/{SKETCH_ARTIFACT})')
+    args = parser.parse_args()
+    if args.incidents and args.model != 'anomaly':
+        parser.error('--incidents is only available for the anomaly model')
+
+    score, artifact = SCORERS[args.model]
+    model_path = args.model_path or os.path.join(MODELS_DIR, f'{artifact}.joblib')
+
+    df = read_frame(args.input, args.format, memory_map=not args.no_mmap)
+    if df.empty:
+        print('{"results": [], "incidents": []}' if args.incidents else '[]')
+        return
+
+    module_name, class_name = MODEL_ARTIFACTS[artifact]
+    model = getattr(importlib.import_module(module_name), class_name).load(model_path)
+    if args.drift:
+        # Observes this batch only; commit() merges it into the persisted state under a lock
+        monitor = model.monitor_drift(half_life_rows=DRIFT_HALF_LIFE_ROWS, min_rows=DRIFT_MIN_ROWS)
+
+    with governor.task(f'{artifact}.score'):
+        results = score(model, df)
+    sketch_path = args.sketch_path or os.path.join(MODELS_DIR, SKETCH_ARTIFACT)
+    if args.model == 'anomaly' and os.path.exists(sketch_path):
+        results['above_meter_p99'] = meter_exceedances(QuantileSketchStore.load(sketch_path), df)
+    if args.incidents:
+        incidents = anomaly_incidents(df, results, args.incident_gap)
+        sys.stdout.write('{"results": %s, "incidents": %s}' % (
+            results.to_json(orient='records'), incidents.to_json(orient='records')))
+    else:
+        sys.stdout.write(results.to_json(orient='records'))
+    sys.stdout.write('\n')
+
+    if args.drift:
+        report = monitor.commit(args.drift_dir)
+        if report['retrain_recommended']:
+            print(f"Feature drift detected for {artifact}: {', '.join(report['drifted_features'])}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
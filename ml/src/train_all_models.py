@@ -4,6 +4,11 @@ Train all ML models for Red Energy Meters platform.
 Runs the complete ML training pipeline for Phase 3.
 """
 
+if __name__ == '__main__':
+    # Export thread limits before numpy/sklearn/xgboost load their native pools
+    from resource_governor import configure_from_env
+    configure_from_env()
+
 import os
 import sys
 import pandas as pd
@@ -16,6 +21,10 @@ from anomaly_detector import AnomalyDetector
 from customer_segmenter import CustomerSegmenter
 from failure_predictor import FailurePredictor
 from demand_forecaster import DemandForecaster
+from equipment_store import EquipmentAttributeStore
+from rollup_builder import RollupBuilder
+from quantile_sketch import QuantileSketchStore
+from resource_governor import governor
 
 
 def main():
@@ -33,6 +42,7 @@ def main():
     readings_path = os.path.join(data_dir, 'meter_readings.parquet')
     customers_path = os.path.join(data_dir, 'customers.csv')
     transformers_path = os.path.join(data_dir, 'transformers.csv')
+    attributes_path = os.path.join(data_dir, 'equipment_attributes.csv')
     
     # Check for data
     if not os.path.exists(readings_path):
@@ -64,6 +74,12 @@ def main():
         transformers = pd.read_csv(transformers_path)
         print(f"   ✅ Loaded {len(transformers):,} transformers")
     
+    attribute_store = None
+    if os.path.exists(attributes_path):
+        print(f"\nLoading equipment attributes from {attributes_path}...")
+        attribute_store = EquipmentAttributeStore.load(attributes_path)
+        print(f"   ✅ Loaded attributes for {len(attribute_store):,} transformers")
+    
     # =========================================================================
     # MODEL 1: Anomaly Detection (Isolation Forest)
     # =========================================================================
@@ -73,7 +89,8 @@ def main():
     
     model_start = time.time()
     anomaly = AnomalyDetector()
-    anomaly.train(readings)
+    with governor.task('anomaly_detector.train'):
+        anomaly.train(readings)
     anomaly.save(os.path.join(models_dir, 'anomaly_detector.joblib'))
     print(f"   ⏱️  Training time: {time.time() - model_start:.1f} seconds")
     
@@ -86,7 +103,8 @@ def main():
     
     model_start = time.time()
     segmenter = CustomerSegmenter(n_clusters=12)
-    segmenter.train(readings)
+    with governor.task('customer_segmenter.train'):
+        segmenter.train(readings)
     segmenter.save(os.path.join(models_dir, 'customer_segmenter.joblib'))
     print(f"   ⏱️  Training time: {time.time() - model_start:.1f} seconds")
     
@@ -99,8 +117,9 @@ def main():
     
     if transformers is not None:
         model_start = time.time()
-        predictor = FailurePredictor()
-        predictor.train(transformers, readings)
+        predictor = FailurePredictor(attribute_store)
+        with governor.task('failure_predictor.train'):
+            predictor.train(transformers, readings)
         predictor.save(os.path.join(models_dir, 'failure_predictor.joblib'))
         print(f"   ⏱️  Training time: {time.time() - model_start:.1f} seconds")
     else:
@@ -115,10 +134,39 @@ def main():
     
     model_start = time.time()
     forecaster = DemandForecaster()
-    forecaster.train(readings)
-    forecaster.save(os.path.join(models_dir, 'demand_forecaster.joblib'))
+    rollups = RollupBuilder()
+    hourly = None
+    if rollups.exists('fleet', 'hourly'):
+        # Stale rollups would silently train on data other than the readings just loaded
+        stale = rollups.stale_reason('fleet', 'hourly', readings, readings_path)
+        if stale:
+            print(f"   ⚠️  Ignoring fleet hourly rollups: {stale}")
+        else:
+            print("   Using fleet hourly rollups")
+            hourly = rollups.read('fleet', 'hourly')
+    if hourly is None:
+        hourly = forecaster.prepare_data(readings)
+    with governor.task('demand_forecaster.train'):
+        forecaster.train(hourly)
     print(f"   ⏱️  Training time: {time.time() - model_start:.1f} seconds")
     
+    # =========================================================================
+    # Quantile sketches (per-meter/transformer percentiles, fleet peak threshold)
+    # =========================================================================
+    print("\n" + "=" * 70)
+    print("STEP 6: Building Quantile Sketches")
+    print("=" * 70)
+    
+    model_start = time.time()
+    sketches = QuantileSketchStore(meter_map=customers)
+    sketches.update(readings).update_fleet_peaks(hourly)
+    sketches.save(os.path.join(models_dir, 'quantile_sketches.joblib'))
+    print(f"   Sketch memory: {sketches.memory_bytes() / 1024:,.0f} KB")
+    # Peak hours are judged against the historical p90 rather than each forecast's own top 10%
+    forecaster.peak_threshold = sketches.threshold('fleet', 'demand_kw', 0.9)
+    forecaster.save(os.path.join(models_dir, 'demand_forecaster.joblib'))
+    print(f"   ⏱️  Build time: {time.time() - model_start:.1f} seconds")
+    
     # =========================================================================
     # Summary
     # =========================================================================
@@ -171,6 +219,8 @@ def main():
     forecast = forecaster.forecast(periods=24)
     print(f"   24-hour forecast generated")
     print(f"   Peak demand: {max(forecast['predicted_demand_kw']):.2f} kW")
+    peaks = forecaster.predict_peak_hours(24)
+    print(f"   Hours above historical p90 ({forecaster.peak_threshold:.2f} kW): {len(peaks)}")
     
     print("\n" + "=" * 70)
     print("   ALL MODELS TRAINED AND VALIDATED SUCCESSFULLY! 🎉")